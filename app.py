@@ -8,44 +8,52 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
-# Importar componentes
+# Importar componentes livianos (solo dependen de streamlit)
 from components.layout import crear_sidebar, aplicar_estilos_globales
 from components.header import mostrar_barra_usuario
 
 # Importar módulos existentes
 from auth.login import mostrar_login
-from components.dashboard import mostrar_dashboard, inicializar_sistema
-from components.reports import mostrar_reportes_graficos
-from components.records import mostrar_registros
-from components.config import mostrar_configuracion
+from auth.sesion import restaurar_sesion, guardar_estado_sesion
+
+# Las páginas y sus dependencias pesadas (pandas, scikit-learn, plotly)
+# se importan dentro de main() la primera vez que se navega a ellas
 
 def main():
     # Aplicar estilos globales
     aplicar_estilos_globales()
     
-    # Verificar si el usuario está logueado
-    if not st.session_state.get('logged_in'):
+    # Verificar si el usuario está logueado (o si trae un token de sesión válido)
+    if not st.session_state.get('logged_in') and not restaurar_sesion():
         mostrar_login()
         return
     
-    # Inicializar sistema
-    inicializar_sistema()
-    
     # Mostrar barra de usuario (tu función original mejorada)
     mostrar_barra_usuario()
     
     # Sidebar
     opcion_seleccionada = crear_sidebar()
     
+    # Inicializar sistema (tras una recarga el estado ya viene restaurado)
+    from data.loader import inicializar_sistema, inicializar_resultados
+    inicializar_sistema()
+    inicializar_resultados()
+    guardar_estado_sesion()
+    
     # Navegación
     if opcion_seleccionada == "dashboard":
+        from components.dashboard import mostrar_dashboard
         mostrar_dashboard()
+        guardar_estado_sesion()
     elif opcion_seleccionada == "reportes":
+        from components.reports import mostrar_reportes_graficos
         mostrar_reportes_graficos()
     elif opcion_seleccionada == "registros":
+        from components.records import mostrar_registros
         mostrar_registros()
     elif opcion_seleccionada == "configuracion":
+        from components.config import mostrar_configuracion
         mostrar_configuracion()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
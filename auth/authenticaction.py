@@ -1,56 +1,158 @@
 import streamlit as st
 import hashlib
+import hmac
 import json
 import os
-import pandas as pd
+import sqlite3
+from datetime import datetime
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+
+# Factor de trabajo del hash de contraseñas ('pbkdf2_sha256' o 'scrypt')
+ALGORITMO_HASH = 'pbkdf2_sha256'
+ITERACIONES_PBKDF2 = 600_000
+SCRYPT_N, SCRYPT_R, SCRYPT_P = 2 ** 14, 8, 1
+
+# Pool compartido: una ráfaga de logins no compite por todos los núcleos a la vez
+POOL_VERIFICACION = ThreadPoolExecutor(max_workers=4, thread_name_prefix="verificacion")
 
 class SistemaAutenticacion:
-    def __init__(self):
+    def __init__(self, algoritmo=ALGORITMO_HASH, iteraciones=ITERACIONES_PBKDF2):
         self.archivo_usuarios = "usuarios.json"
-        self.cargar_usuarios()
+        self.archivo_db = "usuarios.db"
+        self.algoritmo = algoritmo
+        self.iteraciones = iteraciones
+        self.inicializar_base()
     
-    def cargar_usuarios(self):
-        """Cargar usuarios desde archivo JSON"""
+    @contextmanager
+    def conectar(self):
+        """Abrir una transacción sobre la base de usuarios (una conexión por operación)"""
+        conexion = sqlite3.connect(self.archivo_db, timeout=30)
         try:
-            if os.path.exists(self.archivo_usuarios):
-                with open(self.archivo_usuarios, 'r') as f:
-                    st.session_state.usuarios = json.load(f)
-            else:
-                st.session_state.usuarios = {}
-        except:
-            st.session_state.usuarios = {}
+            conexion.execute("PRAGMA journal_mode=WAL")
+            with conexion:
+                yield conexion
+        finally:
+            conexion.close()
     
-    def guardar_usuarios(self):
-        """Guardar usuarios en archivo JSON"""
+    def inicializar_base(self):
+        """Crear la tabla de usuarios e importar el antiguo usuarios.json una sola vez"""
         try:
-            with open(self.archivo_usuarios, 'w') as f:
-                json.dump(st.session_state.usuarios, f)
-        except Exception as e:
-            st.error(f"Error guardando usuarios: {e}")
+            with self.conectar() as conexion:
+                # username es PRIMARY KEY: las búsquedas usan su índice
+                conexion.execute("""
+                    CREATE TABLE IF NOT EXISTS usuarios (
+                        username TEXT PRIMARY KEY,
+                        password TEXT NOT NULL,
+                        email TEXT,
+                        fecha_registro TEXT
+                    )
+                """)
+                vacia = conexion.execute("SELECT COUNT(*) FROM usuarios").fetchone()[0] == 0
+                if vacia:
+                    self.migrar_desde_json(conexion)
+        except sqlite3.Error as e:
+            st.error(f"Error inicializando usuarios: {e}")
+    
+    def migrar_desde_json(self, conexion):
+        """Importar los usuarios del archivo JSON heredado"""
+        try:
+            if not os.path.exists(self.archivo_usuarios):
+                return
+            with open(self.archivo_usuarios, 'r') as f:
+                usuarios = json.load(f)
+        except:
+            return
+        
+        conexion.executemany(
+            "INSERT OR IGNORE INTO usuarios (username, password, email, fecha_registro) VALUES (?, ?, ?, ?)",
+            [
+                (username, datos['password'], datos.get('email'), datos.get('fecha_registro'))
+                for username, datos in usuarios.items()
+            ]
+        )
+    
+    def obtener_usuario(self, username):
+        """Cargar solo el registro del usuario solicitado"""
+        with self.conectar() as conexion:
+            fila = conexion.execute(
+                "SELECT password, email, fecha_registro FROM usuarios WHERE username = ?",
+                (username,)
+            ).fetchone()
+        if fila is None:
+            return None
+        return {'password': fila[0], 'email': fila[1], 'fecha_registro': fila[2]}
     
     def hash_password(self, password):
-        """Hashear contraseña para seguridad básica"""
-        return hashlib.sha256(password.encode()).hexdigest()
+        """Hashear contraseña con sal aleatoria y el factor de trabajo configurado"""
+        sal = os.urandom(16)
+        if self.algoritmo == 'scrypt':
+            derivado = hashlib.scrypt(password.encode(), salt=sal, n=SCRYPT_N, r=SCRYPT_R, p=SCRYPT_P)
+            return f"scrypt${SCRYPT_N}${SCRYPT_R}${SCRYPT_P}${sal.hex()}${derivado.hex()}"
+        derivado = hashlib.pbkdf2_hmac('sha256', password.encode(), sal, self.iteraciones)
+        return f"pbkdf2_sha256${self.iteraciones}${sal.hex()}${derivado.hex()}"
+    
+    def verificar_hash(self, password, hash_guardado):
+        """Comparar la contraseña con el hash guardado (PBKDF2, scrypt o SHA-256 heredado)"""
+        partes = hash_guardado.split('$')
+        if partes[0] == 'pbkdf2_sha256':
+            iteraciones, sal, esperado = int(partes[1]), bytes.fromhex(partes[2]), partes[3]
+            derivado = hashlib.pbkdf2_hmac('sha256', password.encode(), sal, iteraciones).hex()
+        elif partes[0] == 'scrypt':
+            n, r, p = int(partes[1]), int(partes[2]), int(partes[3])
+            sal, esperado = bytes.fromhex(partes[4]), partes[5]
+            derivado = hashlib.scrypt(password.encode(), salt=sal, n=n, r=r, p=p).hex()
+        else:
+            # Hash SHA-256 sin sal de versiones anteriores
+            esperado = hash_guardado
+            derivado = hashlib.sha256(password.encode()).hexdigest()
+        return hmac.compare_digest(derivado, esperado)
+    
+    def requiere_actualizacion(self, hash_guardado):
+        """Indicar si el hash es heredado o usa un factor de trabajo distinto al actual"""
+        partes = hash_guardado.split('$')
+        if self.algoritmo == 'scrypt':
+            return partes[0] != 'scrypt' or partes[1:4] != [str(SCRYPT_N), str(SCRYPT_R), str(SCRYPT_P)]
+        return partes[0] != 'pbkdf2_sha256' or int(partes[1]) != self.iteraciones
+    
+    def actualizar_hash(self, username, password):
+        """Reemplazar el hash guardado por uno con el algoritmo y factor actuales"""
+        with self.conectar() as conexion:
+            conexion.execute(
+                "UPDATE usuarios SET password = ? WHERE username = ?",
+                (self.hash_password(password), username)
+            )
     
     def registrar_usuario(self, username, password, email):
         """Registrar nuevo usuario"""
-        if username in st.session_state.usuarios:
+        try:
+            # La transacción y la clave primaria evitan registros perdidos o duplicados
+            with self.conectar() as conexion:
+                conexion.execute(
+                    "INSERT INTO usuarios (username, password, email, fecha_registro) VALUES (?, ?, ?, ?)",
+                    (
+                        username,
+                        self.hash_password(password),
+                        email,
+                        datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                    )
+                )
+        except sqlite3.IntegrityError:
             return False, "El usuario ya existe"
-        
-        st.session_state.usuarios[username] = {
-            'password': self.hash_password(password),
-            'email': email,
-            'fecha_registro': pd.Timestamp.now().strftime("%Y-%m-%d %H:%M:%S")
-        }
-        self.guardar_usuarios()
+        except sqlite3.Error as e:
+            return False, f"Error guardando usuario: {e}"
         return True, "Usuario registrado exitosamente"
     
     def verificar_login(self, username, password):
         """Verificar credenciales de usuario"""
-        if username not in st.session_state.usuarios:
+        usuario = self.obtener_usuario(username)
+        if usuario is None:
             return False, "Usuario no encontrado"
         
-        if st.session_state.usuarios[username]['password'] == self.hash_password(password):
+        valido = POOL_VERIFICACION.submit(self.verificar_hash, password, usuario['password']).result()
+        if valido:
+            if self.requiere_actualizacion(usuario['password']):
+                POOL_VERIFICACION.submit(self.actualizar_hash, username, password).result()
             return True, "Login exitoso"
         else:
-            return False, "Contraseña incorrecta"
\ No newline at end of file
+            return False, "Contraseña incorrecta"
@@ -1,5 +1,6 @@
 import streamlit as st
 from auth.authenticaction import SistemaAutenticacion
+from auth.sesion import iniciar_sesion
 
 def mostrar_login():
     # CSS personalizado para hacer el login responsive
@@ -63,8 +64,7 @@ def mostrar_login():
                             with st.spinner("Verificando credenciales..."):
                                 success, message = st.session_state.auth_system.verificar_login(username, password)
                                 if success:
-                                    st.session_state.logged_in = True
-                                    st.session_state.username = username
+                                    iniciar_sesion(username)
                                     st.success(f"¡Bienvenido {username}!")
                                     st.rerun()
                                 else:
@@ -125,8 +125,7 @@ def mostrar_login():
                                 if success:
                                     st.success("✅ " + message)
                                     # Auto-login después del registro
-                                    st.session_state.logged_in = True
-                                    st.session_state.username = new_user
+                                    iniciar_sesion(new_user)
                                     st.rerun()
                                 else:
                                     st.error(f"❌ {message}")
@@ -0,0 +1,173 @@
+import streamlit as st
+import base64
+import copy
+import hashlib
+import hmac
+import os
+import time
+from collections import OrderedDict
+
+ARCHIVO_SECRETO = ".session_secret"
+DURACION_SESION_HORAS = 12
+PARAMETRO_TOKEN = "sesion"
+
+# Usuarios cuyo estado (kardex, predictor, resultados) se conserva en memoria; se descarta el menos reciente
+MAX_ESTADOS_SESION = 20
+
+# Estado que se reasocia al usuario tras recargar la página
+CLAVES_ESTADO_SESION = [
+    'datos_cargados', 'datos_automaticos', 'huella_dataset', 'predictor', 'df_preparado',
+    'resultados', 'resultados_trimestrales', 'resultados_anuales', 'backtesting',
+    'base_politica', 'politica_compra', 'riesgo_quiebre'
+]
+
+# Cachés derivadas del estado anterior: se rehacen solas, pero no deben pasar a otro usuario
+CACHES_DERIVADAS_SESION = [
+    'datos_reportes', 'indice_registros', 'simulador_politicas', 'escenarios_calculados',
+    'cubo_reportes', 'dataset_mensual', 'series_registros', 'archivo_politicas_leido'
+]
+
+@st.cache_resource
+def obtener_secreto():
+    """Leer (o crear una sola vez) la clave con la que se firman los tokens"""
+    secreto = os.environ.get("SESSION_SECRET")
+    if secreto:
+        return secreto.encode()
+    if not os.path.exists(ARCHIVO_SECRETO):
+        # Solo el dueño del proceso puede leer la clave
+        descriptor = os.open(ARCHIVO_SECRETO, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        with os.fdopen(descriptor, 'wb') as f:
+            f.write(os.urandom(32))
+    elif os.stat(ARCHIVO_SECRETO).st_mode & 0o077:
+        os.chmod(ARCHIVO_SECRETO, 0o600)
+    with open(ARCHIVO_SECRETO, 'rb') as f:
+        return f.read()
+
+@st.cache_resource
+def obtener_registro_sesiones():
+    """Estado por usuario compartido por el proceso: sobrevive a la recarga del navegador.
+    
+    'estados': usuario -> {'estado', 'expira'} en orden de uso; 'revocados':
+    token -> expiración (pasada la expiración el token ya no valida solo).
+    """
+    return {'estados': OrderedDict(), 'revocados': {}}
+
+def purgar_registro(registro, ahora=None):
+    """Descartar los estados de tokens vencidos, los revocados que ya expiraron y el exceso sobre el tope"""
+    ahora = time.time() if ahora is None else ahora
+    for username in [u for u, guardado in registro['estados'].items() if guardado['expira'] < ahora]:
+        del registro['estados'][username]
+    for token in [t for t, expira in registro['revocados'].items() if expira < ahora]:
+        del registro['revocados'][token]
+    while len(registro['estados']) > MAX_ESTADOS_SESION:
+        registro['estados'].popitem(last=False)
+
+def firmar(contenido):
+    """Firmar el contenido del token con HMAC-SHA256"""
+    return hmac.new(obtener_secreto(), contenido.encode(), hashlib.sha256).hexdigest()
+
+def emitir_token(username):
+    """Emitir un token firmado que expira tras DURACION_SESION_HORAS"""
+    expira = int(time.time() + DURACION_SESION_HORAS * 3600)
+    contenido = base64.urlsafe_b64encode(f"{username}:{expira}".encode()).decode()
+    return f"{contenido}.{firmar(contenido)}"
+
+def leer_token(token):
+    """Usuario y expiración del token si la firma es válida; None si no"""
+    try:
+        contenido, firma = token.rsplit('.', 1)
+        if not hmac.compare_digest(firma, firmar(contenido)):
+            return None
+        username, expira = base64.urlsafe_b64decode(contenido.encode()).decode().rsplit(':', 1)
+        return username, int(expira)
+    except Exception:
+        return None
+
+def validar_token(token):
+    """Devolver el usuario del token si la firma es válida y no ha expirado"""
+    leido = leer_token(token)
+    if leido is None or leido[1] < time.time():
+        return None
+    if token in obtener_registro_sesiones()['revocados']:
+        return None
+    return leido[0]
+
+def iniciar_sesion(username):
+    """Marcar al usuario como logueado y dejar el token en la URL para futuras recargas"""
+    st.session_state.logged_in = True
+    st.session_state.username = username
+    st.session_state.token_sesion = emitir_token(username)
+    st.experimental_set_query_params(**{PARAMETRO_TOKEN: st.session_state.token_sesion})
+    restaurar_estado_sesion(username)
+
+def restaurar_sesion():
+    """Restaurar el login y el estado del usuario a partir del token de la URL"""
+    token = st.experimental_get_query_params().get(PARAMETRO_TOKEN, [None])[0]
+    if not token:
+        return False
+
+    username = validar_token(token)
+    if username is None:
+        st.experimental_set_query_params()
+        return False
+
+    st.session_state.logged_in = True
+    st.session_state.username = username
+    st.session_state.token_sesion = token
+    restaurar_estado_sesion(username)
+    return True
+
+def cerrar_sesion():
+    """Revocar el token actual y olvidar el estado del usuario, también el de esta pestaña"""
+    token = st.session_state.get('token_sesion')
+    leido = leer_token(token) if token else None
+    if leido is not None:
+        registro = obtener_registro_sesiones()
+        registro['revocados'][token] = leido[1]
+        purgar_registro(registro)
+    descartar_estado_sesion(st.session_state.get('username'))
+    # restaurar_estado_sesion solo completa claves ausentes: otro usuario en la pestaña heredaría estas
+    for clave in CLAVES_ESTADO_SESION + CACHES_DERIVADAS_SESION:
+        st.session_state.pop(clave, None)
+    st.experimental_set_query_params()
+    st.session_state.logged_in = False
+    st.session_state.username = None
+    st.session_state.token_sesion = None
+
+def guardar_estado_sesion():
+    """Guardar datos, predictor y resultados del usuario actual en el registro del proceso.
+    
+    El estado vive hasta que vence el token de la sesión o hasta que salga
+    del tope de MAX_ESTADOS_SESION usuarios recientes.
+    """
+    username = st.session_state.get('username')
+    leido = leer_token(st.session_state.get('token_sesion') or '')
+    if not username or leido is None:
+        return
+    registro = obtener_registro_sesiones()
+    registro['estados'][username] = {
+        'estado': {
+            clave: st.session_state[clave]
+            for clave in CLAVES_ESTADO_SESION if clave in st.session_state
+        },
+        'expira': leido[1]
+    }
+    registro['estados'].move_to_end(username)
+    purgar_registro(registro)
+
+def restaurar_estado_sesion(username):
+    """Reasociar al usuario su dataset y sus predicciones ya calculadas"""
+    registro = obtener_registro_sesiones()
+    purgar_registro(registro)
+    guardado = registro['estados'].get(username)
+    if guardado is None:
+        return
+    registro['estados'].move_to_end(username)
+    for clave, valor in guardado['estado'].items():
+        if clave not in st.session_state:
+            # El predictor cambia (opciones, reentrenamiento): cada pestaña recibe el suyo
+            st.session_state[clave] = copy.deepcopy(valor) if clave == 'predictor' else valor
+
+def descartar_estado_sesion(username):
+    """Olvidar el estado guardado del usuario"""
+    obtener_registro_sesiones()['estados'].pop(username, None)
@@ -0,0 +1,129 @@
+"""Comparación de los backends de boosting del ensemble ('gb' y 'hist').
+
+Uso (desde la raíz del repositorio):
+
+    python -m benchmarks.benchmark_backends --skus 500,2000 --meses 24
+
+Para cada escala y backend se entrena con los meses anteriores a los
+últimos `--meses-prueba` y se evalúa en ellos. Se mide el ajuste del
+miembro de boosting por separado, el del ensemble completo y la predicción.
+El error se reporta sobre las filas que ambos backends pueden predecir
+(lags completos) y, aparte, la cobertura: 'hist' también predice las filas
+con lags vacíos de los primeros meses de cada SKU.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import warnings
+from datetime import datetime
+
+warnings.filterwarnings('ignore')
+
+import numpy as np
+import pandas as pd
+import sklearn
+
+from data.sintetico import generar_kardex_sintetico
+from utils.predictor import BACKENDS_GB, PredictorComprasMejorado, calcular_metricas, crear_boosting
+
+RUTA_RESULTADOS = os.path.join('benchmarks', 'resultados_backends.json')
+
+
+def medir_backend(backend_gb, df_mensual, meses_prueba):
+    """Entrenar y evaluar un backend con un corte temporal"""
+    predictor = PredictorComprasMejorado(use_log_transform=True, backend_gb=backend_gb)
+    predictor.trazador = None
+    df_preparado = predictor.preparar_features(df_mensual)
+    corte = np.sort(df_preparado['mes'].unique())[-meses_prueba]
+    df_train = df_preparado[df_preparado['mes'] < corte]
+    df_prueba = df_preparado[df_preparado['mes'] >= corte]
+
+    inicio = time.perf_counter()
+    predictor.ajustar_modelo(df_train)
+    tiempo_ensemble = time.perf_counter() - inicio
+
+    # El miembro de boosting solo, con la misma matriz que recibe dentro del ensemble
+    X = predictor.feature_scaler.transform(df_train[predictor.feature_columns])
+    y = np.asarray(predictor.transformar_target(df_train['consumo']))
+    inicio = time.perf_counter()
+    crear_boosting(predictor.parametros, backend_gb).fit(X, y)
+    tiempo_boosting = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    prediccion = predictor.pronosticar_consumo(df_prueba)
+    tiempo_prediccion = time.perf_counter() - inicio
+
+    return {
+        'filas_entrenamiento': len(df_train),
+        'tiempo_boosting_s': tiempo_boosting,
+        'tiempo_ensemble_s': tiempo_ensemble,
+        'tiempo_prediccion_s': tiempo_prediccion,
+        'prueba': df_prueba[['id_insumo', 'mes', 'consumo']].assign(prediccion=prediccion)
+    }
+
+
+def comparar_backends(n_skus, n_meses, meses_prueba):
+    """Medir todos los backends con el mismo dataset y las mismas filas de prueba"""
+    kardex = generar_kardex_sintetico(n_skus=n_skus, n_meses=n_meses)
+    df_mensual = PredictorComprasMejorado().crear_dataset_mensual(kardex)
+    mediciones = {backend: medir_backend(backend, df_mensual, meses_prueba) for backend in BACKENDS_GB}
+
+    # Filas que todos los backends predicen: la intersección por (SKU, mes)
+    comunes = None
+    for medicion in mediciones.values():
+        claves = medicion['prueba'].set_index(['id_insumo', 'mes']).index
+        comunes = claves if comunes is None else comunes.intersection(claves)
+
+    resultados = {}
+    for backend, medicion in mediciones.items():
+        prueba = medicion.pop('prueba').set_index(['id_insumo', 'mes'])
+        comun = prueba.loc[comunes]
+        metricas = calcular_metricas(comun['consumo'].to_numpy(), comun['prediccion'].to_numpy())
+        resultados[backend] = dict(
+            medicion,
+            mae=metricas['mae'],
+            rmse=metricas['rmse'],
+            sesgo=metricas['sesgo'],
+            filas_prueba=len(prueba),
+            skus_prueba=int(prueba.index.get_level_values('id_insumo').nunique())
+        )
+        print(
+            f"{n_skus:>6} SKUs  {backend:<5} boosting {medicion['tiempo_boosting_s']:7.2f} s  "
+            f"ensemble {medicion['tiempo_ensemble_s']:7.2f} s  predicción {medicion['tiempo_prediccion_s']:6.3f} s  "
+            f"MAE {metricas['mae']:7.3f}  RMSE {metricas['rmse']:7.3f}  "
+            f"filas {len(prueba)} (entrenamiento {medicion['filas_entrenamiento']})"
+        )
+    return resultados
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--skus', default='500,2000', help='Escalas a medir, separadas por coma')
+    parser.add_argument('--meses', type=int, default=24)
+    parser.add_argument('--meses-prueba', type=int, default=2, help='Últimos meses reservados para evaluar')
+    parser.add_argument('--salida', default=RUTA_RESULTADOS)
+    args = parser.parse_args()
+
+    escalas = {}
+    for n_skus in (int(valor) for valor in args.skus.split(',')):
+        escalas[str(n_skus)] = comparar_backends(n_skus, args.meses, args.meses_prueba)
+
+    with open(args.salida, 'w') as f:
+        json.dump({
+            'meta': {
+                'fecha': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                'meses': args.meses,
+                'meses_prueba': args.meses_prueba,
+                'pandas': pd.__version__,
+                'sklearn': sklearn.__version__,
+                'cpus': os.cpu_count()
+            },
+            'escalas': escalas
+        }, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,182 @@
+"""Benchmarks del pipeline de predicción sobre un kardex sintético.
+
+Uso (desde la raíz del repositorio):
+
+    python -m benchmarks.benchmark_pipeline --skus 500 --meses 24
+    python -m benchmarks.benchmark_pipeline --guardar-baseline
+    python -m benchmarks.benchmark_pipeline --comparar
+
+Los resultados se escriben en JSON; con --comparar se contrastan contra la
+baseline guardada y el proceso termina con código 1 si alguna etapa es más
+lenta que la tolerancia permitida. La baseline se graba con las versiones de
+requirements.txt: si Python o las librerías no coinciden con las de la
+baseline, los tiempos no son comparables y --comparar falla (o solo avisa con
+--permitir-otras-versiones).
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import warnings
+from datetime import datetime
+
+warnings.filterwarnings('ignore')
+
+import numpy as np
+import pandas as pd
+import scipy
+import sklearn
+
+from data.loader import leer_archivo_almacen, leer_kardex_por_bloques, tipar_kardex
+from data.sintetico import generar_kardex_sintetico
+from utils.predictor import PredictorComprasMejorado
+
+RUTA_BASELINE = os.path.join('benchmarks', 'baseline.json')
+RUTA_RESULTADOS = os.path.join('benchmarks', 'resultados.json')
+
+# Entre corridas idénticas la mediana de una etapa varía hasta ~50% en una máquina compartida
+TOLERANCIA_POR_DEFECTO = 0.75
+
+# Campos de 'meta' que deben coincidir para que los tiempos sean comparables
+CAMPOS_VERSIONES = ('python', 'pandas', 'numpy', 'scipy', 'sklearn')
+
+
+def medir(funcion, repeticiones):
+    """Ejecutar la función varias veces y devolver los tiempos y el último resultado"""
+    tiempos = []
+    resultado = None
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        resultado = funcion()
+        tiempos.append(time.perf_counter() - inicio)
+    return tiempos, resultado
+
+
+def ejecutar_benchmarks(n_skus, n_meses, movimientos_por_mes, repeticiones):
+    """Medir cada etapa del pipeline con datos sintéticos de la escala pedida"""
+    kardex = generar_kardex_sintetico(n_skus=n_skus, n_meses=n_meses, movimientos_por_mes=movimientos_por_mes)
+    predictor = PredictorComprasMejorado(use_log_transform=True)
+    predictor.trazador = None  # Sin instrumentación: se mide el costo puro de cada etapa
+    resultados = {}
+
+    def registrar(nombre, funcion, veces=repeticiones):
+        tiempos, salida = medir(funcion, veces)
+        resultados[nombre] = {
+            'mediana_s': statistics.median(tiempos),
+            'min_s': min(tiempos),
+            'repeticiones': veces
+        }
+        print(f"{nombre:<35} {statistics.median(tiempos):8.3f} s")
+        return salida
+
+    with tempfile.TemporaryDirectory() as carpeta:
+        ruta_csv = os.path.join(carpeta, 'ALM_SINTETICO.csv')
+        kardex.to_csv(ruta_csv, index=False)
+        registrar('loader_csv', lambda: tipar_kardex(leer_archivo_almacen(ruta_csv)))
+        registrar(
+            'crear_dataset_mensual_por_bloques',
+            lambda: predictor.crear_dataset_mensual_por_bloques(leer_kardex_por_bloques(ruta_csv, 50_000))
+        )
+
+    df_mensual = registrar('crear_dataset_mensual', lambda: predictor.crear_dataset_mensual(kardex))
+    df_preparado = registrar('preparar_features', lambda: predictor.preparar_features(df_mensual))
+    registrar('entrenar_modelo', lambda: predictor.entrenar_modelo(df_preparado))
+    registrar('calcular_cantidad_comprar', lambda: predictor.calcular_cantidad_comprar(df_preparado))
+    registrar('predecir_trimestral', lambda: predictor.predecir_trimestral(df_preparado), 1)
+    registrar('predecir_anual', lambda: predictor.predecir_anual(df_preparado), 1)
+
+    return {
+        'meta': {
+            'fecha': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            'skus': n_skus,
+            'meses': n_meses,
+            'movimientos_por_mes': movimientos_por_mes,
+            'filas_kardex': len(kardex),
+            'python': platform.python_version(),
+            'pandas': pd.__version__,
+            'numpy': np.__version__,
+            'scipy': scipy.__version__,
+            'sklearn': sklearn.__version__,
+            'cpus': os.cpu_count()
+        },
+        'resultados': resultados
+    }
+
+
+def diferencias_de_versiones(actual, baseline):
+    """Campos de versión de 'meta' que difieren entre la corrida actual y la baseline"""
+    return [
+        (campo, baseline['meta'].get(campo), actual['meta'].get(campo))
+        for campo in CAMPOS_VERSIONES
+        if baseline['meta'].get(campo) != actual['meta'].get(campo)
+    ]
+
+
+def comparar_con_baseline(actual, baseline, tolerancia):
+    """Listar las etapas cuya mediana supera la baseline más la tolerancia"""
+    regresiones = []
+    for nombre, medicion in actual['resultados'].items():
+        referencia = baseline['resultados'].get(nombre)
+        if referencia is None:
+            continue
+        limite = referencia['mediana_s'] * (1 + tolerancia)
+        if medicion['mediana_s'] > limite:
+            regresiones.append((nombre, referencia['mediana_s'], medicion['mediana_s']))
+    return regresiones
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--skus', type=int, default=500)
+    parser.add_argument('--meses', type=int, default=24)
+    parser.add_argument('--movimientos', type=int, default=4, help='Movimientos promedio por SKU y mes')
+    parser.add_argument('--repeticiones', type=int, default=3)
+    parser.add_argument('--salida', default=RUTA_RESULTADOS)
+    parser.add_argument('--baseline', default=RUTA_BASELINE)
+    parser.add_argument('--guardar-baseline', action='store_true', help='Guardar los resultados como nueva baseline')
+    parser.add_argument('--comparar', action='store_true', help='Fallar si hay regresiones frente a la baseline')
+    parser.add_argument('--tolerancia', type=float, default=TOLERANCIA_POR_DEFECTO,
+                        help='Regresión permitida (0.75 = 75%%)')
+    parser.add_argument('--permitir-otras-versiones', action='store_true',
+                        help='Comparar aunque las versiones de Python o las librerías difieran de la baseline')
+    args = parser.parse_args()
+
+    actual = ejecutar_benchmarks(args.skus, args.meses, args.movimientos, args.repeticiones)
+
+    with open(args.salida, 'w') as f:
+        json.dump(actual, f, indent=2)
+    if args.guardar_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(actual, f, indent=2)
+        print(f"Baseline guardada en {args.baseline}")
+
+    if args.comparar:
+        if not os.path.exists(args.baseline):
+            print(f"No existe la baseline {args.baseline}; ejecuta con --guardar-baseline")
+            return 1
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline['meta']['filas_kardex'] != actual['meta']['filas_kardex']:
+            print("Aviso: la baseline se generó con otra escala de datos")
+        versiones = diferencias_de_versiones(actual, baseline)
+        for campo, antes, ahora in versiones:
+            print(f"Aviso: {campo} {antes} en la baseline, {ahora} en esta corrida")
+        if versiones and not args.permitir_otras_versiones:
+            print("Las versiones no coinciden con las de la baseline; instala requirements.txt "
+                  "o usa --permitir-otras-versiones")
+            return 1
+        regresiones = comparar_con_baseline(actual, baseline, args.tolerancia)
+        for nombre, antes, ahora in regresiones:
+            print(f"REGRESIÓN {nombre}: {antes:.3f} s -> {ahora:.3f} s")
+        if regresiones:
+            return 1
+        print("Sin regresiones frente a la baseline")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,4 +1,5 @@
 import streamlit as st
+from auth.sesion import descartar_estado_sesion
 
 def mostrar_configuracion():
     st.header("⚙️ Configuración del Sistema")
@@ -14,6 +15,229 @@ def mostrar_configuracion():
         st.success(f"✅ Datos cargados: {len(datos):,} registros")
         st.success(f"✅ SKUs únicos: {datos['id_insumo'].nunique():,}")
     
+    mostrar_opciones_modelo()
+    mostrar_politica_compra()
+    mostrar_diagnostico_pipeline()
+    
     if st.button("🔄 Reiniciar Sistema", use_container_width=True):
+        descartar_estado_sesion(st.session_state.get('username'))
         st.session_state.clear()
-        st.rerun()
\ No newline at end of file
+        st.rerun()
+
+def mostrar_opciones_modelo():
+    """Opciones de entrenamiento; un cambio obliga a reentrenar en la próxima predicción"""
+    st.markdown("---")
+    st.subheader("🧠 Modelo")
+    
+    from data.loader import RUTA_MODELO, inicializar_predictor, leer_version_modelo
+    inicializar_predictor()
+    predictor = st.session_state.predictor
+    
+    segmentado = st.checkbox(
+        "Entrenar un modelo por segmento de demanda (suave, errático, intermitente, irregular)",
+        value=predictor.segmentado,
+        key="entrenamiento_segmentado",
+        help="Los SKUs se agrupan por frecuencia y variabilidad de su consumo; "
+             "cada segmento se entrena en paralelo con un modelo más pequeño"
+    )
+    if segmentado != predictor.segmentado:
+        predictor.segmentado = segmentado
+        st.session_state.reentrenar_modelo = True
+    from utils.predictor import BACKENDS_GB
+    backend_gb = st.selectbox(
+        "Backend del boosting",
+        BACKENDS_GB,
+        index=BACKENDS_GB.index(predictor.backend_gb),
+        format_func=lambda b: "Cortes exactos (GradientBoosting)" if b == 'gb' else "Histogramas (HistGradientBoosting)",
+        key="backend_gb",
+        help="Histogramas entrena en varios hilos y admite lags vacíos: "
+             "los SKUs con pocos meses de historia también reciben predicción"
+    )
+    if backend_gb != predictor.backend_gb:
+        predictor.backend_gb = backend_gb
+        st.session_state.reentrenar_modelo = True
+    if st.button("🔎 Buscar hiperparámetros en el próximo entrenamiento", key="boton_ajustar_hiperparametros"):
+        st.session_state.ajustar_hiperparametros = True
+        st.session_state.reentrenar_modelo = True
+    hay_modelo = predictor.model is not None or leer_version_modelo(RUTA_MODELO) is not None
+    if hay_modelo and st.button(
+        "➕ Actualizar el modelo con los meses nuevos", key="boton_actualizacion_incremental",
+        help="Agrega árboles y etapas de boosting entrenados con los meses recientes; "
+             "si el error en los meses nuevos creció demasiado, reentrena desde cero"
+    ):
+        st.session_state.actualizacion_incremental = True
+        st.session_state.reentrenar_modelo = True
+    if st.session_state.get('reentrenar_modelo'):
+        if st.session_state.get('ajustar_hiperparametros'):
+            accion = "buscará hiperparámetros y se reentrenará"
+        elif st.session_state.get('actualizacion_incremental'):
+            accion = "se actualizará con los meses nuevos"
+        else:
+            accion = "se reentrenará"
+        st.info(f"ℹ️ El modelo {accion} al generar predicciones")
+    
+    actualizacion = predictor.ultima_actualizacion
+    if actualizacion is not None:
+        if actualizacion['modo'] == 'incremental':
+            st.caption(
+                f"Última actualización incremental: {actualizacion['filas_nuevas']} filas nuevas "
+                f"en {actualizacion['tiempo_s']:.1f} s (deriva {actualizacion['deriva']:.2f})"
+            )
+        else:
+            st.caption(f"Última actualización: {actualizacion['modo']} ({actualizacion['motivo']})")
+    
+    if predictor.ajuste is not None:
+        with st.expander("Hiperparámetros ajustados"):
+            for nombre, detalle in predictor.ajuste['detalle'].items():
+                st.caption(
+                    f"{nombre.upper()}: MAE de validación {detalle['mae_validacion']:.4f} (escala transformada), "
+                    f"{detalle['candidatos']} candidatos en {detalle['rondas']} rondas, "
+                    f"{detalle['tiempo_busqueda_s']:.1f} s de búsqueda"
+                )
+                st.json(predictor.parametros[nombre])
+    
+    from utils.motores import MOTORES_INTERMITENTES, UMBRAL_INTERMITENCIA
+    opciones = [None] + list(MOTORES_INTERMITENTES)
+    motor = st.selectbox(
+        f"Motor para SKUs intermitentes (≥ {UMBRAL_INTERMITENCIA:.0%} de meses sin consumo)",
+        opciones,
+        index=opciones.index(predictor.motor_intermitente),
+        format_func=lambda m: "Ensemble para todos los SKUs" if m is None else m.upper(),
+        key="motor_intermitente",
+        help="Croston, SBA y TSB pronostican la demanda intermitente sin pasar por los árboles"
+    )
+    if motor != predictor.motor_intermitente:
+        predictor.motor_intermitente = motor
+        # Los resultados dependen del motor: se recalculan (o se recuperan del almacén)
+        for clave in ('resultados', 'resultados_trimestrales', 'resultados_anuales', 'base_politica'):
+            st.session_state.pop(clave, None)
+    
+    from utils.predictor import FUENTES_VARIABILIDAD
+    variabilidad = st.selectbox(
+        "Variabilidad para el stock de seguridad",
+        FUENTES_VARIABILIDAD,
+        index=FUENTES_VARIABILIDAD.index(predictor.variabilidad),
+        format_func=lambda v: {
+            'historica': "Histórica del SKU (desviación del consumo)",
+            'cuantiles': "Intervalo P10–P90 de los árboles del bosque"
+        }[v],
+        key="variabilidad_stock_seguridad",
+        help="Con cuantiles, cada predicción trae su intervalo P10/P50/P90 y el stock de seguridad sale de él"
+    )
+    if variabilidad != predictor.variabilidad:
+        predictor.variabilidad = variabilidad
+        for clave in ('resultados', 'resultados_trimestrales', 'resultados_anuales', 'base_politica'):
+            st.session_state.pop(clave, None)
+
+def mostrar_politica_compra():
+    """Política de compra general y por SKU; cambiarla recalcula las recomendaciones sin volver a predecir"""
+    st.markdown("---")
+    st.subheader("📦 Política de Compra")
+    
+    from data.loader import aplicar_politica_compra
+    from utils.politicas import COLUMNAS_POLITICA, POLITICA_POR_DEFECTO, leer_politicas
+    actual = st.session_state.get('politica_compra') or dict(POLITICA_POR_DEFECTO, politicas=None)
+    
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        lead_time = st.number_input("Lead time (días)", min_value=1, max_value=365,
+                                    value=int(actual['lead_time_dias']), key="politica_lead_time")
+    with col2:
+        nivel_servicio = st.slider("Nivel de servicio", min_value=0.50, max_value=0.999,
+                                   value=float(actual['nivel_servicio']), step=0.005, format="%.3f",
+                                   key="politica_nivel_servicio")
+    with col3:
+        moq = st.number_input("Compra mínima (MOQ)", min_value=0, value=int(actual['moq']), key="politica_moq")
+    with col4:
+        multiplo = st.number_input("Múltiplo de empaque", min_value=1, value=int(actual['multiplo']),
+                                   key="politica_multiplo")
+    
+    politicas = actual['politicas']
+    archivo = st.file_uploader(
+        f"Políticas por SKU (CSV o Excel con id_insumo y {', '.join(COLUMNAS_POLITICA)})",
+        type=['csv', 'xlsx', 'xls'],
+        key="archivo_politicas",
+        help="Los SKUs que no figuran, o las celdas vacías, usan los valores generales"
+    )
+    # El archivo subido sigue presente en cada recarga: solo se lee cuando cambia
+    if archivo is not None and st.session_state.get('archivo_politicas_leido') != (archivo.name, archivo.size):
+        try:
+            politicas = leer_politicas(archivo)
+            st.session_state.archivo_politicas_leido = (archivo.name, archivo.size)
+        except ValueError as e:
+            st.error(f"❌ {e}")
+    if politicas is not None:
+        st.caption(f"{politicas['id_insumo'].nunique():,} SKUs con política propia")
+        if st.button("Quitar políticas por SKU", key="quitar_politicas"):
+            politicas = None
+    
+    nueva = {
+        'politicas': politicas,
+        'lead_time_dias': lead_time,
+        'nivel_servicio': nivel_servicio,
+        'moq': moq,
+        'multiplo': multiplo
+    }
+    cambio = politicas is not actual['politicas'] or any(nueva[c] != actual[c] for c in POLITICA_POR_DEFECTO)
+    if cambio:
+        st.session_state.politica_compra = nueva
+        if aplicar_politica_compra():
+            st.success("✅ Recomendaciones recalculadas con la nueva política (sin volver a predecir)")
+
+def mostrar_diagnostico_pipeline():
+    """Panel con tiempos y memoria de las últimas ejecuciones del pipeline"""
+    st.markdown("---")
+    st.subheader("🩺 Diagnóstico del Pipeline")
+    
+    predictor = st.session_state.get('predictor')
+    trazador = getattr(predictor, 'trazador', None)
+    if trazador is not None:
+        trazador.medir_memoria = st.checkbox(
+            "Medir memoria por etapa con tracemalloc (la predicción tarda aprox. el doble)",
+            value=trazador.medir_memoria,
+            key="medir_memoria_pipeline"
+        )
+    
+    if trazador is None or trazador.ultima_ejecucion() is None:
+        st.info("ℹ️ Aún no hay ejecuciones registradas. Genera predicciones en el Dashboard.")
+        return
+    
+    ultima = trazador.ultima_ejecucion()
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("Tiempo total", f"{ultima['tiempo_s']:.2f} s")
+    with col2:
+        st.metric("Tiempo CPU", f"{ultima['cpu_s']:.2f} s")
+    with col3:
+        rss = ultima.get('rss_max_mb')
+        st.metric("RSS máximo", f"{rss:,.0f} MB" if rss is not None else "N/A")
+    
+    # Las etapas anidadas (p. ej. cada mes de la predicción trimestral) se sangran
+    etapas = [
+        {
+            'etapa': '↳ ' * etapa['nivel'] + etapa['etapa'],
+            'tiempo_s': round(etapa['tiempo_s'], 3),
+            'cpu_s': round(etapa['cpu_s'], 3),
+            'pico_memoria_mb': round(etapa.get('pico_memoria_mb', 0), 1),
+            'filas_entrada': etapa['filas_entrada'],
+            'filas_salida': etapa['filas_salida']
+        }
+        for etapa in ultima['etapas']
+    ]
+    st.caption(f"Última ejecución: {ultima['inicio']} ({ultima['estado']})")
+    st.dataframe(etapas, use_container_width=True)
+    
+    with st.expander(f"Historial ({len(trazador.historial)} ejecuciones)"):
+        st.dataframe(
+            [
+                {
+                    'inicio': ejecucion['inicio'],
+                    'estado': ejecucion['estado'],
+                    'tiempo_s': round(ejecucion['tiempo_s'], 2),
+                    'cpu_s': round(ejecucion['cpu_s'], 2),
+                    'rss_max_mb': ejecucion.get('rss_max_mb')
+                }
+                for ejecucion in reversed(trazador.historial)
+            ],
+            use_container_width=True
+        )
@@ -2,7 +2,9 @@ import streamlit as st
 import time
 import pandas as pd
 import numpy as np
-from data.loader import inicializar_sistema
+from data.loader import inicializar_predictor, RUTA_MODELO
+from auth.sesion import guardar_estado_sesion
+from utils.pipeline import ejecutar_pipeline
 
 
 # =====================================================
@@ -167,58 +169,61 @@ def generar_predicciones():
             predictor = st.session_state.predictor
             datos = st.session_state.datos_cargados
 
-            progress_bar = st.progress(0)
-            status_text = st.empty()
+            with predictor.trazador.ejecucion("generar_predicciones"):
+                ejecutar_pipeline_prediccion(predictor, datos)
 
-            progress_bar.progress(25)
-            status_text.text("🔄 Transformando datos a formato mensual...")
-            df_mensual = predictor.crear_dataset_mensual(datos)
+        except Exception as e:
+            mostrar_modal("error", f"Error en la predicción: {str(e)}")
 
-            if len(df_mensual) == 0:
-                mostrar_modal("error", "No se pudieron crear datos mensuales")
-                return
 
-            progress_bar.progress(50)
-            status_text.text("🎯 Creando características para el modelo...")
-            df_preparado = predictor.preparar_features(df_mensual)
+def ejecutar_pipeline_prediccion(predictor, datos):
+    """Ejecutar las etapas del pipeline de predicción mostrando el progreso"""
+    progress_bar = st.progress(0)
+    status_text = st.empty()
 
-            if len(df_preparado) == 0:
-                mostrar_modal("error", "No hay datos suficientes después de la preparación")
-                return
+    def mostrar_progreso(porcentaje, mensaje):
+        progress_bar.progress(porcentaje)
+        status_text.text(mensaje)
 
-            progress_bar.progress(75)
-            if predictor.model is None:
-                status_text.text("🤖 Entrenando modelo...")
-                predictor.entrenar_modelo(df_preparado)
-                predictor.guardar_modelo('modelo_compras/')
-
-            progress_bar.progress(90)
-            status_text.text("📊 Generando recomendaciones de compra...")
-            
-            # ✅ AQUÍ ESTÁN LAS 3 PREDICCIONES:
-            
-            # 1. Predicción mensual (la que ya tienes)
-            resultados_mensuales = predictor.calcular_cantidad_comprar(df_preparado)
-            st.session_state.resultados = resultados_mensuales
-            
-            # 2. Predicción trimestral (NUEVA - 3 meses)
-            resultados_trimestrales = predictor.predecir_trimestral(df_preparado)
-            st.session_state.resultados_trimestrales = resultados_trimestrales
-            
-            # 3. Predicción anual (NUEVA - 12 meses)  
-            resultados_anuales = predictor.predecir_anual(df_preparado)
-            st.session_state.resultados_anuales = resultados_anuales
-            
-            # Guardar también df_preparado y predictor para usar después
-            st.session_state.df_preparado = df_preparado
-            st.session_state.predictor = predictor  # 🆕 GUARDAR PREDICTOR
-
-            progress_bar.progress(100)
-            status_text.text("✅ ¡Listo!")
-            mostrar_modal("success", "Predicciones generadas exitosamente ✅")
-
-        except Exception as e:
-            mostrar_modal("error", f"Error en la predicción: {str(e)}")
+    try:
+        # Si el dataset y el modelo no cambiaron, el pipeline devuelve lo que ya está en el almacén
+        salida = ejecutar_pipeline(
+            predictor,
+            datos,
+            ruta_modelo=RUTA_MODELO,
+            reentrenar=st.session_state.get('reentrenar_modelo', False),
+            ajustar_hiperparametros=st.session_state.get('ajustar_hiperparametros', False),
+            incremental=st.session_state.get('actualizacion_incremental', False),
+            politica=st.session_state.get('politica_compra'),
+            progreso=mostrar_progreso,
+            huella=st.session_state.get('huella_dataset'),
+            metadatos={'origen': 'dashboard', 'filas_kardex': len(datos)}
+        )
+    except ValueError as e:
+        mostrar_modal("error", str(e))
+        return
+    st.session_state.pop('reentrenar_modelo', None)
+    st.session_state.pop('ajustar_hiperparametros', None)
+    st.session_state.pop('actualizacion_incremental', None)
+    
+    # ✅ LAS 3 PREDICCIONES: mensual, trimestral (3 meses) y anual (12 meses)
+    st.session_state.resultados = salida['resultados']
+    st.session_state.resultados_trimestrales = salida['resultados_trimestrales']
+    st.session_state.resultados_anuales = salida['resultados_anuales']
+    st.session_state.base_politica = salida.get('base_politica')
+    
+    # Guardar también df_preparado y predictor para usar después
+    if salida['df_preparado'] is not None:
+        st.session_state.df_preparado = salida['df_preparado']
+    st.session_state.predictor = predictor  # 🆕 GUARDAR PREDICTOR
+    guardar_estado_sesion()
+
+    progress_bar.progress(100)
+    status_text.text("✅ ¡Listo!")
+    if salida['df_preparado'] is None:
+        mostrar_modal("success", f"Predicciones recuperadas del {salida['metadatos']['fecha']} ✅")
+    else:
+        mostrar_modal("success", "Predicciones generadas exitosamente ✅")
 
 
 def mostrar_resultados_detallados():
@@ -314,6 +319,10 @@ def mostrar_resultados_detallados():
             'precio_unitario', 
             'monto_total'
         ])
+        # Intervalo de los árboles del bosque, cuando el stock de seguridad usa cuantiles
+        columnas_mostrar.extend(
+            c for c in ('consumo_p10', 'consumo_p50', 'consumo_p90') if c in resultados_filtrados.columns
+        )
         
         if 'recomendacion' in resultados_filtrados.columns:
             columnas_mostrar.append('recomendacion')
@@ -492,11 +501,233 @@ def mostrar_predicciones_anuales():
     )
 
 
+# =====================================================
+# 🧪 VALIDACIÓN TEMPORAL (BACKTESTING)
+# =====================================================
+def obtener_df_preparado(predictor):
+    """df_preparado de la sesión; si las predicciones vinieron del almacén, se recalcula una vez"""
+    if st.session_state.get('df_preparado') is None:
+        df_mensual = predictor.crear_dataset_mensual(st.session_state.datos_cargados)
+        st.session_state.df_preparado = predictor.preparar_features(df_mensual)
+    return st.session_state.df_preparado
+
+
+def mostrar_backtesting():
+    """Métricas de error con origen móvil: cada pliegue entrena solo con meses anteriores"""
+    from utils.backtesting import ejecutar_backtesting
+    
+    with st.expander("🧪 Validación temporal del modelo (backtesting)"):
+        col1, col2 = st.columns(2)
+        with col1:
+            n_pliegues = st.slider("Pliegues (meses de origen)", 2, 8, 4, key="backtesting_pliegues")
+        with col2:
+            horizonte = st.slider("Horizonte evaluado (meses)", 1, 3, 1, key="backtesting_horizonte")
+        
+        if st.button("▶️ Ejecutar backtesting", key="ejecutar_backtesting"):
+            predictor = st.session_state.predictor
+            with st.spinner("Entrenando un modelo por pliegue..."):
+                try:
+                    df_preparado = obtener_df_preparado(predictor)
+                    st.session_state.backtesting = ejecutar_backtesting(
+                        predictor, df_preparado, n_pliegues=n_pliegues, horizonte=horizonte
+                    )
+                except ValueError as e:
+                    st.error(f"❌ {e}")
+        
+        backtesting = st.session_state.get('backtesting')
+        if backtesting is None:
+            st.info("💡 Mide el error real del modelo entrenando solo con el pasado de cada mes evaluado")
+            return
+        
+        promedio = backtesting['promedio']
+        col1, col2, col3, col4 = st.columns(4)
+        with col1:
+            st.metric("MAE", f"{promedio['mae']:.2f}")
+        with col2:
+            st.metric("RMSE", f"{promedio['rmse']:.2f}")
+        with col3:
+            st.metric("MAPE", f"{promedio['mape']:.1f}%")
+        with col4:
+            st.metric("Dentro de ±20%", f"{promedio['dentro_20pct']:.1f}%")
+        
+        st.caption(
+            f"{len(backtesting['pliegues'])} pliegues, horizonte de {backtesting['horizonte']} mes(es), "
+            f"{backtesting['procesos']} proceso(s) en paralelo, {backtesting['tiempo_total_s']:.1f} s en total"
+        )
+        st.dataframe(backtesting['pliegues'].round(3), use_container_width=True, hide_index=True)
+
+
+# =====================================================
+# 🎛️ ESCENARIOS DE POLÍTICA (WHAT-IF)
+# =====================================================
+NIVELES_ESCENARIO = [0.90, 0.95, 0.99, 0.995]
+
+
+def obtener_simulador_politicas():
+    """SimuladorPoliticas de la base de la sesión, agrupado una sola vez por base"""
+    from utils.politicas import SimuladorPoliticas
+
+    base = st.session_state.get('base_politica')
+    if base is None:
+        return None
+    guardado = st.session_state.get('simulador_politicas')
+    if guardado is None or guardado[0] is not base:
+        guardado = (base, SimuladorPoliticas(base))
+        st.session_state.simulador_politicas = guardado
+        st.session_state.escenarios_calculados = {}
+    return guardado[1]
+
+
+def mostrar_escenarios_politica():
+    """Comparar políticas de compra lado a lado sobre las predicciones ya calculadas.
+
+    Cada escenario solo recalcula la política y las recomendaciones; el consumo
+    predicho y la variabilidad quedan agrupados en el simulador de la sesión, y
+    solo se recalcula el escenario cuyos valores cambiaron.
+    """
+    from data.loader import aplicar_politica_compra
+    from utils.politicas import POLITICA_POR_DEFECTO
+
+    with st.expander("🎛️ Escenarios de política (what-if)"):
+        simulador = obtener_simulador_politicas()
+        if simulador is None:
+            st.info("💡 Genera las predicciones para comparar políticas sin volver a predecir")
+            return
+
+        predictor = st.session_state.predictor
+        actual = st.session_state.get('politica_compra') or dict(POLITICA_POR_DEFECTO, politicas=None)
+        n_escenarios = st.slider("Escenarios", 2, len(NIVELES_ESCENARIO), 3, key="n_escenarios")
+        calculados = st.session_state.setdefault('escenarios_calculados', {})
+
+        filas = []
+        columnas = st.columns(n_escenarios)
+        for i, columna in enumerate(columnas):
+            with columna:
+                st.markdown(f"**Escenario {i + 1}**")
+                parametros = {
+                    'lead_time_dias': st.slider("Lead time (días)", 1, 180, int(actual['lead_time_dias']),
+                                                key=f"escenario_lead_time_{i}"),
+                    'nivel_servicio': st.slider("Nivel de servicio", 0.50, 0.999, NIVELES_ESCENARIO[i],
+                                                step=0.005, format="%.3f", key=f"escenario_nivel_{i}"),
+                    'moq': st.number_input("MOQ", min_value=0, value=int(actual['moq']),
+                                           key=f"escenario_moq_{i}"),
+                    'multiplo': st.number_input("Múltiplo", min_value=1, value=int(actual['multiplo']),
+                                                key=f"escenario_multiplo_{i}")
+                }
+
+                # Solo se recalcula el escenario cuyos valores (o tabla por SKU) cambiaron; la tabla
+                # se guarda y se compara por identidad (un id() puede reutilizarse tras liberarla)
+                guardado = calculados.get(i)
+                if (guardado is None or guardado[0] != tuple(parametros.values())
+                        or guardado[1] is not actual['politicas']):
+                    inicio = time.perf_counter()
+                    salida = predictor.aplicar_politica(simulador, actual['politicas'], **parametros)
+                    guardado = (tuple(parametros.values()), actual['politicas'], salida,
+                                (time.perf_counter() - inicio) * 1000)
+                    calculados[i] = guardado
+                _, _, salida, tiempo_ms = guardado
+
+                resultados = salida['resultados']
+                st.metric("Total a comprar (mes)", f"{resultados['cantidad_comprar'].sum():,.0f}")
+                st.caption(f"Recalculado en {tiempo_ms:.0f} ms")
+                if st.button("Aplicar este escenario", key=f"aplicar_escenario_{i}", use_container_width=True):
+                    st.session_state.politica_compra = dict(parametros, politicas=actual['politicas'])
+                    aplicar_politica_compra()
+                    st.rerun()
+
+                filas.append({
+                    'escenario': f"Escenario {i + 1}",
+                    **parametros,
+                    'skus_a_comprar': int((resultados['cantidad_comprar'] > 0).sum()),
+                    'prioridad_alta': int((resultados['prioridad'] == 'ALTA').sum()),
+                    'comprar_mes': resultados['cantidad_comprar'].sum(),
+                    'comprar_trimestre': salida['resultados_trimestrales']['cantidad_comprar_trimestral'].sum(),
+                    'comprar_anio': salida['resultados_anuales']['cantidad_comprar_anual'].sum()
+                })
+
+        comparacion = pd.DataFrame(filas).set_index('escenario')
+        st.dataframe(comparacion.round(3), use_container_width=True)
+        st.bar_chart(comparacion[['comprar_mes']])
+        st.caption(f"{len(simulador):,} SKUs; el consumo predicho se reutiliza, no se vuelve a predecir")
+
+
+# =====================================================
+# 🎲 RIESGO DE QUIEBRE (MONTE CARLO)
+# =====================================================
+def mostrar_riesgo_quiebre():
+    """Probabilidad de quiebre y faltante esperado por SKU, simulando la demanda predicha"""
+    from utils.simulacion import HORIZONTES_SIMULACION, simular_riesgo_quiebre
+
+    with st.expander("🎲 Riesgo de quiebre (simulación Monte Carlo)"):
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            n_trayectorias = st.select_slider("Trayectorias por SKU", [500, 1000, 2000, 5000], value=2000,
+                                              key="quiebre_trayectorias")
+        with col2:
+            horizontes = st.multiselect("Horizontes", list(HORIZONTES_SIMULACION),
+                                        default=['mensual', 'trimestral'], key="quiebre_horizontes")
+        with col3:
+            con_compra = st.checkbox("Después de comprar lo recomendado", key="quiebre_con_compra",
+                                     help="La compra del último mes, con la política vigente, llega cada mes")
+
+        if st.button("▶️ Simular", key="simular_quiebres", disabled=not horizontes):
+            predictor = st.session_state.predictor
+            # Con resultados del almacén el modelo aún no se cargó: la dispersión de los árboles lo necesita
+            if predictor.model is None and not predictor.cargar_modelo(RUTA_MODELO):
+                st.error("❌ No hay un modelo entrenado: genera las predicciones primero")
+                return
+            with st.spinner("Simulando trayectorias de demanda..."):
+                inicio = time.perf_counter()
+                politica = None
+                if con_compra:
+                    politica = st.session_state.get('politica_compra') or {}
+                st.session_state.riesgo_quiebre = {
+                    'tabla': simular_riesgo_quiebre(
+                        predictor,
+                        obtener_df_preparado(predictor),
+                        base=obtener_simulador_politicas(),
+                        politica=politica,
+                        horizontes={nombre: HORIZONTES_SIMULACION[nombre] for nombre in horizontes},
+                        n_trayectorias=n_trayectorias
+                    ),
+                    'horizontes': horizontes,
+                    'n_trayectorias': n_trayectorias,
+                    'con_compra': con_compra,
+                    'tiempo_s': time.perf_counter() - inicio
+                }
+
+        riesgo = st.session_state.get('riesgo_quiebre')
+        if riesgo is None:
+            st.info("💡 Estima la probabilidad de quedarse sin stock con la incertidumbre del modelo y de la demanda")
+            return
+
+        tabla = riesgo['tabla']
+        columnas = st.columns(len(riesgo['horizontes']))
+        for columna, nombre in zip(columnas, riesgo['horizontes']):
+            with columna:
+                st.metric(f"SKUs con riesgo ≥ 50% ({nombre})",
+                          f"{(tabla[f'prob_quiebre_{nombre}'] >= 0.5).sum():,}")
+                st.metric(f"Faltante esperado ({nombre})", f"{tabla[f'faltante_esperado_{nombre}'].sum():,.0f}")
+
+        st.caption(
+            f"{len(tabla):,} SKUs × {riesgo['n_trayectorias']:,} trayectorias "
+            f"{'con' if riesgo['con_compra'] else 'sin'} compra, {riesgo['tiempo_s']:.1f} s"
+        )
+        ultimo = riesgo['horizontes'][-1]
+        st.dataframe(
+            tabla.sort_values(f'prob_quiebre_{ultimo}', ascending=False).round(3),
+            use_container_width=True,
+            hide_index=True,
+            height=400
+        )
+
+
 # =====================================================
 # 📊 DASHBOARD PRINCIPAL
 # =====================================================
 def mostrar_dashboard():
     st.markdown("<h2 style='text-align: center;'>📊 Dashboard de Inventarios</h2>", unsafe_allow_html=True)
+    inicializar_predictor()
 
     if st.session_state.get('datos_cargados') is None:
         mostrar_modal("error", "No se pudieron cargar los datos automáticamente")
@@ -553,6 +784,11 @@ def mostrar_dashboard():
             mostrar_predicciones_trimestrales()
         elif opcion_prediccion == "🎯 Predicción Anual":
             mostrar_predicciones_anuales()
+        
+        mostrar_escenarios_politica()
+        mostrar_riesgo_quiebre()
             
     else:
-        st.info("💡 Haz clic en 'Generar Predicciones' para ver los resultados")
\ No newline at end of file
+        st.info("💡 Haz clic en 'Generar Predicciones' para ver los resultados")
+    
+    mostrar_backtesting()
\ No newline at end of file
@@ -1,5 +1,6 @@
 import streamlit as st
 import datetime
+from auth.sesion import cerrar_sesion
 
 def mostrar_barra_usuario():
     """Barra de usuario mejorada con HTML/CSS responsive"""
@@ -184,8 +185,7 @@ def mostrar_barra_usuario():
     col1, col2, col3 = st.columns([3, 1, 1])
     with col3:
         if st.button("🚪 **Cerrar Sesión**", use_container_width=True, key="logout_btn"):
-            st.session_state.logged_in = False
-            st.session_state.username = None
+            cerrar_sesion()
             st.rerun()
     
     st.markdown("---")
\ No newline at end of file
@@ -1,5 +1,159 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
+import plotly.graph_objects as go
+
+# Máximo de SKUs en el selector de historia: más allá se acota con la búsqueda
+MAX_OPCIONES_HISTORIA = 1000
+
+COLUMNAS_NUMERICAS_REGISTROS = ['canti salida', 'saldo final', 'canti entrada']
+
+def construir_indice_registros(datos):
+    """Precalcular columnas derivadas de búsqueda una sola vez por dataset.
+    
+    Las vistas filtradas se obtienen después por posiciones sobre el dataset
+    compartido, sin copiarlo en cada rerun.
+    """
+    indice = {'datos': datos}
+    
+    # Columnas de texto como categorías: la búsqueda recorre solo valores únicos
+    indice['id_texto'] = datos['id_insumo'].astype(str).astype('category')
+    if 'descripcion' in datos.columns:
+        indice['descripcion_texto'] = datos['descripcion'].astype(str).astype('category')
+    
+    # Columnas numéricas: se reutilizan tal cual si el cargador ya las tipó
+    for col in COLUMNAS_NUMERICAS_REGISTROS:
+        if col in datos.columns:
+            if pd.api.types.is_numeric_dtype(datos[col]):
+                indice[col] = datos[col]
+            else:
+                indice[col] = pd.to_numeric(datos[col], errors='coerce')
+    
+    indice['rango_fechas'] = None
+    if 'fecha' in datos.columns:
+        try:
+            # Reemplazar el patrón problemático de milisegundos
+            fechas_texto = datos['fecha'].astype(str).str.strip().str.replace(
+                r'(\d{2}:\d{2}:\d{2}):(\d{1,3})$', 
+                r'\1.\2', 
+                regex=True
+            )
+            fechas = pd.to_datetime(fechas_texto, format='%d/%m/%Y %H:%M:%S.%f', errors='coerce')
+            
+            # Filtrar solo fechas reales (a partir de 2024)
+            fechas_reales = fechas[fechas >= pd.Timestamp('2024-01-01')]
+            
+            if len(fechas_reales) > 0:
+                fecha_min = fechas_reales.min().strftime('%d/%m/%Y')
+                fecha_max = fechas_reales.max().strftime('%d/%m/%Y')
+                indice['rango_fechas'] = f"{fecha_min} a {fecha_max}"
+            else:
+                indice['rango_fechas'] = "No disponible"
+        except Exception:
+            indice['rango_fechas'] = "Error"
+    
+    indice['skus_unicos'] = datos['id_insumo'].nunique()
+    return indice
+
+def obtener_indice_registros(datos):
+    """Devolver el índice de registros del dataset actual, reconstruyéndolo si cambió"""
+    indice = st.session_state.get('indice_registros')
+    if indice is None or indice['datos'] is not datos:
+        indice = construir_indice_registros(datos)
+        st.session_state.indice_registros = indice
+    return indice
+
+def obtener_series_registros():
+    """Series por SKU de la historia mensual y del ajuste del modelo, construidas una vez.
+
+    La historia se rehace solo si cambia el dataset mensual; el ajuste, si
+    cambia la base de la política.
+    """
+    from data.loader import obtener_dataset_mensual
+    from utils.series import SeriesPorSku
+    
+    mensual = obtener_dataset_mensual()
+    base = st.session_state.get('base_politica')
+    series = st.session_state.get('series_registros') or {}
+    if series.get('mensual') is not mensual:
+        series = {'mensual': mensual, 'historia': SeriesPorSku(mensual)}
+    if series.get('base') is not base or 'ajuste' not in series:
+        series['base'] = base
+        series['ajuste'] = SeriesPorSku(base, ('consumo_predicho',)) if base is not None else None
+    st.session_state.series_registros = series
+    return series
+
+def _fechas_mes(meses):
+    """Meses AAAAMM como fechas (primer día del mes) para el eje del gráfico"""
+    return pd.to_datetime(pd.Series(meses).astype(str), format='%Y%m')
+
+def mostrar_historia_sku(ids_filtrados):
+    """Historia mensual de consumo y saldo de un SKU junto a su pronóstico"""
+    from utils.series import mes_siguiente
+    
+    st.subheader("📈 Historia y Pronóstico por SKU")
+    
+    series = obtener_series_registros()
+    historia = series['historia']
+    if len(historia) == 0:
+        st.info("No hay historia mensual disponible (se necesitan al menos dos meses por SKU)")
+        return
+    
+    # Las opciones salen de la búsqueda si la hay; el almacén responde solo por los SKUs que tiene
+    if st.session_state.get('buscar_texto'):
+        candidatos = [sku for sku in pd.unique(ids_filtrados) if sku in historia]
+    else:
+        candidatos = historia.ids
+    opciones = list(candidatos[:MAX_OPCIONES_HISTORIA])
+    if not opciones:
+        st.info("Ninguno de los SKUs filtrados tiene historia mensual")
+        return
+    if len(candidatos) > MAX_OPCIONES_HISTORIA:
+        st.caption(f"Se listan los primeros {MAX_OPCIONES_HISTORIA:,} SKUs; usa la búsqueda para acotar")
+    sku = st.selectbox("SKU", opciones, key="sku_historia")
+    
+    serie = historia.serie(sku)
+    fechas = _fechas_mes(serie['mes'])
+    fig = go.Figure()
+    fig.add_trace(go.Scatter(x=fechas, y=serie['consumo'], mode='lines+markers', name='Consumo real',
+                             line=dict(color='#3366CC')))
+    if 'saldo final' in serie.columns:
+        fig.add_trace(go.Scatter(x=fechas, y=serie['saldo final'], mode='lines', name='Saldo final',
+                                 line=dict(color='#00D4AA', dash='dot')))
+    
+    ajuste = series['ajuste']
+    if ajuste is not None and sku in ajuste:
+        serie_ajuste = ajuste.serie(sku)
+        fig.add_trace(go.Scatter(x=_fechas_mes(serie_ajuste['mes']), y=serie_ajuste['consumo_predicho'],
+                                 mode='lines', name='Ajuste del modelo', line=dict(color='#FFA500', dash='dash')))
+    
+    # Pronóstico del mes siguiente a la historia, con el intervalo P10–P90 si la predicción lo trae
+    resultados = st.session_state.get('resultados')
+    info = None
+    if resultados is not None:
+        fila = resultados[resultados['id_insumo'] == sku]
+        info = fila.iloc[0] if not fila.empty else None
+    if info is not None:
+        pronostico = dict(x=_fechas_mes([mes_siguiente(serie['mes'].iloc[-1])]), y=[info['consumo_predicho']],
+                          mode='markers', name='Pronóstico', marker=dict(color='#FF4B4B', size=12, symbol='diamond'))
+        if pd.notna(info.get('consumo_p10')) and pd.notna(info.get('consumo_p90')):
+            pronostico['error_y'] = dict(
+                type='data', symmetric=False,
+                array=[info['consumo_p90'] - info['consumo_predicho']],
+                arrayminus=[info['consumo_predicho'] - info['consumo_p10']]
+            )
+        fig.add_trace(go.Scatter(**pronostico))
+    
+    fig.update_layout(title=f"SKU {sku}", xaxis_title="Mes", yaxis_title="Unidades", hovermode='x unified')
+    st.plotly_chart(fig, use_container_width=True)
+    
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("Meses de historia", len(serie))
+    with col2:
+        st.metric("Consumo promedio", f"{serie['consumo'].mean():,.0f}")
+    with col3:
+        st.metric("Consumo predicho", f"{info['consumo_predicho']:,.0f}" if info is not None else "N/A")
 
 def mostrar_registros():
     st.header("🔍 Buscar Registros")
@@ -8,17 +162,9 @@ def mostrar_registros():
         st.error("No hay datos cargados en el sistema")
         return
     
-    datos = st.session_state.datos_cargados.copy()
-    
-    # ================== CONVERTIR DATOS NUMÉRICOS ==================
-    if 'canti salida' in datos.columns:
-        datos['canti salida'] = pd.to_numeric(datos['canti salida'], errors='coerce').fillna(0)
-    
-    if 'saldo final' in datos.columns:
-        datos['saldo final'] = pd.to_numeric(datos['saldo final'], errors='coerce').fillna(0)
-    
-    if 'canti entrada' in datos.columns:
-        datos['canti entrada'] = pd.to_numeric(datos['canti entrada'], errors='coerce').fillna(0)
+    # Dataset compartido: no se copia ni se modifica en esta página
+    datos = st.session_state.datos_cargados
+    indice = obtener_indice_registros(datos)
     
     # ================== BÚSQUEDA SIMPLE ==================
     st.subheader("Filtrar Registros")
@@ -35,23 +181,24 @@ def mostrar_registros():
     with col2:
         limite_registros = st.slider("Registros a mostrar", 10, 100, 50)
     
-    # Aplicar filtro de búsqueda
+    # Aplicar filtro de búsqueda como posiciones sobre el dataset compartido
     if buscar_texto:
-        mask_sku = datos['id_insumo'].astype(str).str.contains(buscar_texto, na=False, case=False)
-        mask_desc = pd.Series(False, index=datos.index)
-        if 'descripcion' in datos.columns:
-            mask_desc = datos['descripcion'].astype(str).str.contains(buscar_texto, na=False, case=False)
-        mask_total = mask_sku | mask_desc
-        datos_filtrados = datos[mask_total]
+        mask_total = indice['id_texto'].str.contains(buscar_texto, na=False, case=False).to_numpy(dtype=bool)
+        if 'descripcion_texto' in indice:
+            mask_total = mask_total | indice['descripcion_texto'].str.contains(buscar_texto, na=False, case=False).to_numpy(dtype=bool)
+        posiciones = np.flatnonzero(mask_total)
+        ids_filtrados = datos['id_insumo'].iloc[posiciones]
     else:
-        datos_filtrados = datos
+        posiciones = None
+        ids_filtrados = datos['id_insumo']
+    total_filtrados = len(ids_filtrados)
     
     # ================== ALERTAS DE PREDICCIÓN ==================
-    if st.session_state.get('resultados') is not None and len(datos_filtrados) > 0:
+    if st.session_state.get('resultados') is not None and total_filtrados > 0:
         st.subheader("🚨 Alertas de Predicción")
         
         resultados = st.session_state.resultados
-        skus_unicos = datos_filtrados['id_insumo'].unique()
+        skus_unicos = ids_filtrados.unique()
         
         alertas_encontradas = 0
         
@@ -113,19 +260,27 @@ def mostrar_registros():
             st.rerun()
     
     # ================== MOSTRAR RESULTADOS ==================
-    st.subheader(f"📊 Resultados ({len(datos_filtrados)} registros)")
+    st.subheader(f"📊 Resultados ({total_filtrados} registros)")
     
-    if len(datos_filtrados) > 0:
+    if total_filtrados > 0:
         # Seleccionar columnas a mostrar
         columnas_mostrar = ['id_insumo', 'fecha', 'canti salida', 'saldo final']
-        if 'descripcion' in datos_filtrados.columns:
+        if 'descripcion' in datos.columns:
             columnas_mostrar.append('descripcion')
-        if 'canti entrada' in datos_filtrados.columns:
+        if 'canti entrada' in datos.columns:
             columnas_mostrar.append('canti entrada')
         
+        # Solo se materializan las filas visibles
+        visibles = np.arange(min(limite_registros, len(datos))) if posiciones is None else posiciones[:limite_registros]
+        tabla = datos.iloc[visibles][[c for c in columnas_mostrar if c in datos.columns]]
+        tabla = tabla.assign(**{
+            col: indice[col].iloc[visibles].fillna(0).to_numpy()
+            for col in COLUMNAS_NUMERICAS_REGISTROS if col in tabla.columns
+        })
+        
         # Mostrar dataframe
         st.dataframe(
-            datos_filtrados[columnas_mostrar].head(limite_registros),
+            tabla,
             use_container_width=True,
             height=400
         )
@@ -134,18 +289,26 @@ def mostrar_registros():
         col1, col2, col3 = st.columns(3)
         
         with col1:
-            st.metric("SKUs únicos", datos_filtrados['id_insumo'].nunique())
+            skus_filtrados = indice['skus_unicos'] if posiciones is None else ids_filtrados.nunique()
+            st.metric("SKUs únicos", skus_filtrados)
         
         with col2:
             try:
-                total_consumo = datos_filtrados['canti salida'].sum()
+                salidas = indice['canti salida'].to_numpy()
+                if posiciones is not None:
+                    salidas = salidas[posiciones]
+                total_consumo = np.nansum(salidas)
                 st.metric("Total consumo", f"{total_consumo:,.0f}")
             except:
                 st.metric("Total consumo", "N/A")
         
         with col3:
             try:
-                stock_promedio = datos_filtrados['saldo final'].mean()
+                saldos = indice['saldo final'].to_numpy()
+                if posiciones is not None:
+                    saldos = saldos[posiciones]
+                # Los saldos vacíos cuentan como 0, igual que en el kardex
+                stock_promedio = np.nansum(saldos) / len(saldos)
                 st.metric("Stock promedio", f"{stock_promedio:.0f}")
             except:
                 st.metric("Stock promedio", "N/A")
@@ -156,12 +319,16 @@ def mostrar_registros():
             
             if len(datos) > 0:
                 with st.expander("Ver IDs disponibles como referencia"):
-                    skus_sample = datos['id_insumo'].astype(str).unique()[:10]
+                    skus_sample = indice['id_texto'].cat.categories[:10]
                     for sku in skus_sample:
                         st.write(f"- {sku}")
         else:
             st.info("Ingresa un término de búsqueda para filtrar los registros")
     
+    # ================== HISTORIA POR SKU ==================
+    st.markdown("---")
+    mostrar_historia_sku(ids_filtrados)
+    
     # ================== INFORMACIÓN GENERAL ==================
     st.markdown("---")
     st.subheader("📋 Información del Dataset")
@@ -172,35 +339,10 @@ def mostrar_registros():
         st.metric("Total registros", f"{len(datos):,}")
     
     with col2:
-        st.metric("SKUs únicos", f"{datos['id_insumo'].nunique():,}")
+        st.metric("SKUs únicos", f"{indice['skus_unicos']:,}")
         
     with col3:
-        if 'fecha' in datos.columns:
-            try:
-                # Limpiar y convertir a string
-                datos['fecha'] = datos['fecha'].astype(str).str.strip()
-                
-                # Reemplazar el patrón problemático de milisegundos
-                datos['fecha'] = datos['fecha'].str.replace(
-                    r'(\d{2}:\d{2}:\d{2}):(\d{1,3})$', 
-                    r'\1.\2', 
-                    regex=True
-                )
-                
-                # Parsear fechas con formato específico para milisegundos
-                fechas = pd.to_datetime(datos['fecha'], format='%d/%m/%Y %H:%M:%S.%f', errors='coerce')
-                
-                # Filtrar solo fechas reales (a partir de 2024)
-                fechas_reales = fechas[fechas >= pd.Timestamp('2024-01-01')]
-                
-                if len(fechas_reales) > 0:
-                    fecha_min = fechas_reales.min().strftime('%d/%m/%Y')
-                    fecha_max = fechas_reales.max().strftime('%d/%m/%Y')
-                    st.metric("📅 Rango de Fechas", f"{fecha_min} a {fecha_max}")
-                else:
-                    st.metric("📅 Rango de Fechas", "No disponible")
-                    
-            except Exception as e:
-                st.metric("📅 Rango de Fechas", "Error")
+        if indice['rango_fechas'] is not None:
+            st.metric("📅 Rango de Fechas", indice['rango_fechas'])
         else:
             st.metric("📅 Rango de Fechas", "N/A")
\ No newline at end of file
@@ -3,6 +3,42 @@ import pandas as pd
 import numpy as np
 import plotly.express as px
 import plotly.graph_objects as go
+from utils.reportes import (
+    calcular_datos_reporte, binear_histograma, muestrear_estratificado,
+    construir_indice_riesgo, clasificar_riesgo, DIAS_SOBRE_STOCK, DIAS_RIESGO_QUIEBRE
+)
+
+# Máximo de puntos que se envían al navegador en el gráfico de dispersión
+MAX_PUNTOS_DISPERSION = 5000
+
+# Nombre para mostrar de cada medida y dimensión del cubo
+NOMBRES_MEDIDAS = {
+    'consumo': 'Consumo real',
+    'saldo': 'Saldo',
+    'consumo_predicho': 'Consumo predicho',
+    'cantidad_comprar': 'Cantidad a comprar',
+    'costo_compra': 'Costo de compra'
+}
+
+NOMBRES_DIMENSIONES = {'familia': 'Familia', 'almacen': 'Almacén', 'periodo': 'Período', 'prioridad': 'Prioridad'}
+
+
+def obtener_datos_reportes(resultados, max_puntos=MAX_PUNTOS_DISPERSION):
+    """Devolver los datos de reportes de la predicción actual, calculándolos una sola vez"""
+    cache = st.session_state.get('datos_reportes')
+    if cache is None or cache['resultados'] is not resultados or cache['max_puntos'] != max_puntos:
+        datos = calcular_datos_reporte(resultados)
+        cache = {
+            'resultados': resultados,
+            'max_puntos': max_puntos,
+            'datos': datos,
+            'histograma_dias': binear_histograma(datos['dias_inventario'], nbins=20),
+            'dispersion': muestrear_estratificado(datos, max_puntos),
+            'indice_riesgo': construir_indice_riesgo(datos['dias_inventario'])
+        }
+        st.session_state.datos_reportes = cache
+    return cache
+
 
 def mostrar_reportes_graficos():
     st.header("📈 Reportes Gráficos Avanzados")
@@ -11,23 +47,33 @@ def mostrar_reportes_graficos():
         st.warning("⚠️ Primero genera predicciones en el Dashboard para ver los reportes")
         return
     
-    resultados = st.session_state.resultados
+    datos_reportes = obtener_datos_reportes(st.session_state.resultados)
+    resultados = datos_reportes['datos']
     
     # ================== ANÁLISIS DE RIESGOS ==================
     st.subheader("🚨 Análisis de Riesgos de Inventario")
     
-    # 1. DETECCIÓN DE SOBRE STOCK
-    st.markdown("### 📦 Análisis de Sobre Stock")
+    # Umbrales configurables: se reclasifica desde el índice ordenado, sin reescanear
+    col1, col2 = st.columns(2)
+    with col1:
+        dias_sobre_stock = st.slider(
+            "Días de inventario para Sobre Stock", 30, 365, DIAS_SOBRE_STOCK,
+            key="umbral_sobre_stock"
+        )
+    with col2:
+        dias_quiebre = st.slider(
+            "Días de inventario para Riesgo de Quiebre", 1, 60, DIAS_RIESGO_QUIEBRE,
+            key="umbral_quiebre"
+        )
+    if dias_quiebre >= dias_sobre_stock:
+        st.warning("⚠️ El límite de quiebre debe ser menor que el de sobre stock")
     
-    # Calcular días de inventario
-    resultados['dias_inventario'] = np.where(
-        resultados['consumo_predicho'] > 0,
-        (resultados['saldo final'] / resultados['consumo_predicho']) * 30,
-        0
-    )
+    grupos = clasificar_riesgo(datos_reportes['indice_riesgo'], dias_quiebre, dias_sobre_stock)
+    sobre_stock = resultados.iloc[grupos['sobre_stock']]
+    riesgo_quiebre = resultados.iloc[grupos['riesgo_quiebre']]
     
-    # Identificar sobre stock (más de 90 días de inventario)
-    sobre_stock = resultados[resultados['dias_inventario'] > 90]
+    # 1. DETECCIÓN DE SOBRE STOCK
+    st.markdown("### 📦 Análisis de Sobre Stock")
     
     col1, col2 = st.columns(2)
     
@@ -48,8 +94,9 @@ def mostrar_reportes_graficos():
     with col2:
         # Top SKUs con mayor sobre stock
         if not sobre_stock.empty:
-            top_sobre_stock = sobre_stock.nlargest(10, 'dias_inventario')[['id_insumo', 'dias_inventario', 'saldo final', 'consumo_predicho']]
-            top_sobre_stock['exceso_dias'] = top_sobre_stock['dias_inventario'] - 90
+            # El grupo ya viene ordenado de más a menos días de inventario
+            top_sobre_stock = sobre_stock.head(10)[['id_insumo', 'dias_inventario', 'saldo final', 'consumo_predicho']]
+            top_sobre_stock = top_sobre_stock.assign(exceso_dias=top_sobre_stock['dias_inventario'] - dias_sobre_stock)
             
             fig_top_sobre = px.bar(
                 top_sobre_stock,
@@ -66,10 +113,6 @@ def mostrar_reportes_graficos():
     # 2. DETECCIÓN DE QUIEBRES
     st.markdown("### ⚠️ Análisis de Riesgo de Quiebre")
     
-    # Calcular riesgo de quiebre (stock < 15 días de consumo)
-    resultados['riesgo_quiebre'] = resultados['dias_inventario'] < 15
-    riesgo_quiebre = resultados[resultados['riesgo_quiebre'] == True]
-    
     col1, col2 = st.columns(2)
     
     with col1:
@@ -89,7 +132,7 @@ def mostrar_reportes_graficos():
     with col2:
         # Top SKUs con mayor riesgo de quiebre
         if not riesgo_quiebre.empty:
-            top_riesgo = riesgo_quiebre.nsmallest(10, 'dias_inventario')[['id_insumo', 'dias_inventario', 'saldo final', 'consumo_predicho']]
+            top_riesgo = riesgo_quiebre.head(10)[['id_insumo', 'dias_inventario', 'saldo final', 'consumo_predicho']]
             
             fig_top_riesgo = px.bar(
                 top_riesgo,
@@ -109,28 +152,35 @@ def mostrar_reportes_graficos():
     col1, col2 = st.columns(2)
     
     with col1:
-        # Distribución de días de inventario
-        fig_distribucion_dias = px.histogram(
-            resultados,
-            x='dias_inventario',
-            nbins=20,
+        # Distribución de días de inventario (intervalos precalculados en el servidor)
+        histograma = datos_reportes['histograma_dias']
+        fig_distribucion_dias = px.bar(
+            histograma,
+            x='centro',
+            y='conteo',
             title="📊 Distribución de Días de Inventario",
-            labels={'dias_inventario': 'Días de Inventario'},
+            labels={'centro': 'Días de Inventario', 'conteo': 'count'},
             color_discrete_sequence=['#3366CC']
         )
-        fig_distribucion_dias.add_vline(x=90, line_dash="dash", line_color="red", annotation_text="Límite Sobre Stock")
-        fig_distribucion_dias.add_vline(x=15, line_dash="dash", line_color="orange", annotation_text="Límite Quiebre")
+        fig_distribucion_dias.update_traces(width=(histograma['fin'] - histograma['inicio']).to_numpy())
+        fig_distribucion_dias.update_layout(bargap=0)
+        fig_distribucion_dias.add_vline(x=dias_sobre_stock, line_dash="dash", line_color="red", annotation_text="Límite Sobre Stock")
+        fig_distribucion_dias.add_vline(x=dias_quiebre, line_dash="dash", line_color="orange", annotation_text="Límite Quiebre")
         st.plotly_chart(fig_distribucion_dias, use_container_width=True)
     
     with col2:
-        # Gráfico de dispersión: Stock vs Consumo Predicho
+        # Gráfico de dispersión: Stock vs Consumo Predicho (muestra por prioridad)
+        dispersion = datos_reportes['dispersion']
+        titulo_dispersion = "🎯 Relación: Consumo Predicho vs Stock Actual"
+        if len(dispersion) < len(resultados):
+            titulo_dispersion += f" (muestra de {len(dispersion):,} de {len(resultados):,} SKUs)"
         fig_dispersion = px.scatter(
-            resultados,
+            dispersion,
             x='consumo_predicho',
             y='saldo final',
             size='cantidad_comprar',
             color='prioridad',
-            title="🎯 Relación: Consumo Predicho vs Stock Actual",
+            title=titulo_dispersion,
             labels={'consumo_predicho': 'Consumo Predicho', 'saldo final': 'Stock Actual'},
             color_discrete_map={'ALTA': '#FF4B4B', 'MEDIA': '#FFA500', 'BAJA': '#00D4AA'},
             hover_data=['id_insumo']
@@ -145,7 +195,7 @@ def mostrar_reportes_graficos():
     with tab1:
         if not sobre_stock.empty:
             st.dataframe(
-                sobre_stock[['id_insumo', 'dias_inventario', 'saldo final', 'consumo_predicho', 'prioridad']].sort_values('dias_inventario', ascending=False),
+                sobre_stock[['id_insumo', 'dias_inventario', 'saldo final', 'consumo_predicho', 'prioridad']],
                 use_container_width=True
             )
             
@@ -163,7 +213,7 @@ def mostrar_reportes_graficos():
     with tab2:
         if not riesgo_quiebre.empty:
             st.dataframe(
-                riesgo_quiebre[['id_insumo', 'dias_inventario', 'saldo final', 'consumo_predicho', 'prioridad']].sort_values('dias_inventario'),
+                riesgo_quiebre[['id_insumo', 'dias_inventario', 'saldo final', 'consumo_predicho', 'prioridad']],
                 use_container_width=True
             )
             
@@ -192,7 +242,7 @@ def mostrar_reportes_graficos():
             st.metric("Riesgo Quiebre", f"{len(riesgo_quiebre):,}")
         
         with col4:
-            skus_optimos = len(resultados) - len(sobre_stock) - len(riesgo_quiebre)
+            skus_optimos = len(grupos['optimo'])
             st.metric("Inventario Óptimo", f"{skus_optimos:,}")
         
         # Gráfico de resumen general
@@ -204,4 +254,141 @@ def mostrar_reportes_graficos():
             color=['Sobre Stock', 'Riesgo Quiebre', 'Óptimo'],
             color_discrete_map={'Sobre Stock': '#FF6B6B', 'Riesgo Quiebre': '#FFA500', 'Óptimo': '#00D4AA'}
         )
-        st.plotly_chart(fig_resumen, use_container_width=True)
\ No newline at end of file
+        st.plotly_chart(fig_resumen, use_container_width=True)
+    
+    # ================== EXPLORACIÓN POR FAMILIA, ALMACÉN Y PERÍODO ==================
+    mostrar_exploracion_cubo()
+
+
+def obtener_cubo():
+    """Cubo de agregación de la predicción actual.
+
+    El dataset mensual por almacén y los atributos del kardex se calculan una vez por
+    dataset; el cubo, una vez por resultados (cambian al aplicar otra política).
+    """
+    from components.dashboard import obtener_simulador_politicas
+    from data.loader import obtener_dataset_mensual
+    from utils.cubo import atributos_kardex, construir_cubo
+    from utils.politicas import POLITICA_POR_DEFECTO
+    
+    resultados = st.session_state.get('resultados')
+    simulador = obtener_simulador_politicas()
+    if resultados is None or simulador is None:
+        return None
+    
+    datos = st.session_state.get('datos_cargados')
+    cache = st.session_state.get('cubo_reportes') or {}
+    if cache.get('datos') is not datos or 'atributos' not in cache:
+        atributos = atributos_kardex(datos) if datos is not None and len(datos) > 0 else None
+        cache = {'datos': datos, 'mensual': obtener_dataset_mensual(por_almacen=True), 'atributos': atributos}
+    
+    if cache.get('resultados') is not resultados:
+        politica = dict(st.session_state.get('politica_compra') or POLITICA_POR_DEFECTO)
+        cantidades = simulador.cantidades(politica.pop('politicas', None), **politica)
+        cache['cubo'] = construir_cubo(simulador, cantidades, resultados, cache['mensual'], cache['atributos'])
+        cache['resultados'] = resultados
+    st.session_state.cubo_reportes = cache
+    return cache['cubo']
+
+
+def mostrar_exploracion_cubo():
+    """Gráficos de drill-down por familia de SKU, almacén, período y prioridad desde el cubo"""
+    import time
+    from utils.cubo import SIN_ALMACEN
+    
+    st.markdown("### 🧭 Exploración por Familia, Almacén y Período")
+    
+    with st.spinner("Preparando el cubo de agregación..."):
+        cubo = obtener_cubo()
+    if cubo is None:
+        st.info("No hay base de predicción para agregar; genera predicciones en el Dashboard")
+        return
+    
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        medida = st.selectbox(
+            "Medida", list(NOMBRES_MEDIDAS), format_func=NOMBRES_MEDIDAS.get, key="cubo_medida"
+        )
+    with col2:
+        almacenes = st.multiselect("Almacenes", list(cubo.etiquetas['almacen']), key="cubo_almacenes")
+    with col3:
+        prioridades = st.multiselect("Prioridades", list(cubo.etiquetas['prioridad']), key="cubo_prioridades")
+    
+    # Bajar por la jerarquía de familias: cada nivel se elige dentro del anterior
+    familia, nivel_elegido = None, -1
+    columnas_familia = st.columns(len(cubo.niveles_familia))
+    for nivel, columna in enumerate(columnas_familia):
+        opciones = cubo.familias(nivel, familia) if nivel == nivel_elegido + 1 else []
+        with columna:
+            elegida = st.selectbox(
+                f"Familia nivel {nivel + 1} ({cubo.niveles_familia[nivel]} dígitos)",
+                ['Todas'] + opciones,
+                key=f"cubo_familia_{nivel}",
+                disabled=not opciones
+            )
+        if opciones and elegida != 'Todas':
+            familia, nivel_elegido = elegida, nivel
+    
+    filtros = {}
+    if familia is not None:
+        filtros['familia'] = familia
+    if almacenes:
+        filtros['almacen'] = almacenes
+    if prioridades:
+        filtros['prioridad'] = prioridades
+    
+    # Se desglosa por el nivel siguiente de familia, o por otra dimensión si ya no hay más niveles
+    dimensiones = [d for d in NOMBRES_DIMENSIONES if d != 'periodo']
+    if nivel_elegido == len(cubo.niveles_familia) - 1:
+        dimensiones.remove('familia')
+    desglose = st.radio(
+        "Desglosar por", dimensiones, format_func=NOMBRES_DIMENSIONES.get, horizontal=True, key="cubo_desglose"
+    )
+    nivel_desglose = min(nivel_elegido + 1, len(cubo.niveles_familia) - 1)
+    
+    inicio = time.perf_counter()
+    por_grupo = cubo.consultar((desglose,), nivel_familia=nivel_desglose, filtros=filtros,
+                               nivel_filtro=max(nivel_elegido, 0))
+    por_periodo = cubo.consultar(('periodo', 'prioridad'), filtros=filtros, nivel_filtro=max(nivel_elegido, 0))
+    milisegundos = (time.perf_counter() - inicio) * 1000
+    
+    if por_grupo.empty:
+        st.info("No hay datos para la selección")
+        return
+    
+    nombre_medida = NOMBRES_MEDIDAS[medida]
+    col1, col2 = st.columns(2)
+    with col1:
+        top_grupos = por_grupo.nlargest(20, medida).astype({desglose: str})
+        fig_grupos = px.bar(
+            top_grupos,
+            x=desglose,
+            y=medida,
+            title=f"📊 {nombre_medida} por {NOMBRES_DIMENSIONES[desglose].lower()}"
+                  + (f" (top 20 de {len(por_grupo):,})" if len(por_grupo) > 20 else ""),
+            labels={desglose: NOMBRES_DIMENSIONES[desglose], medida: nombre_medida},
+            color_discrete_sequence=['#3366CC']
+        )
+        fig_grupos.update_xaxes(type='category')
+        st.plotly_chart(fig_grupos, use_container_width=True)
+    
+    with col2:
+        por_periodo = por_periodo.assign(periodo=por_periodo['periodo'].astype(str))
+        fig_periodo = px.line(
+            por_periodo,
+            x='periodo',
+            y=medida,
+            color='prioridad',
+            markers=True,
+            title=f"📈 {nombre_medida} por período y prioridad",
+            labels={'periodo': 'Período', medida: nombre_medida, 'prioridad': 'Prioridad'},
+            color_discrete_map={'ALTA': '#FF4B4B', 'MEDIA': '#FFA500', 'BAJA': '#00D4AA'}
+        )
+        fig_periodo.update_xaxes(type='category')
+        st.plotly_chart(fig_periodo, use_container_width=True)
+    
+    st.caption(
+        f"Consumo y saldo son de cada almacén; el consumo predicho y la compra son del SKU y "
+        f"aparecen en el almacén {SIN_ALMACEN}. "
+        f"Cubo de {len(cubo):,} celdas ({cubo.nbytes / 1e6:.1f} MB); consultas en {milisegundos:.1f} ms"
+    )
@@ -1,45 +1,217 @@
 import streamlit as st
 import pandas as pd
 import os
+from concurrent.futures import ProcessPoolExecutor
+from utils.almacen_resultados import (
+    ARCHIVOS_RESULTADOS, cargar_resultados, existen_resultados, huella_dataset, leer_version_modelo
+)
 
-@st.cache_data
-def cargar_datos_automaticamente():
-    """Cargar datos automáticamente desde la carpeta dataset"""
+# Columnas del kardex que necesita la agregación mensual
+COLUMNAS_MENSUALES = ['id_insumo', 'fecha', 'tipo_transac', 'canti salida', 'saldo final']
+
+# Columnas numéricas del kardex que se tipan al cargar
+COLUMNAS_NUMERICAS = ['canti entrada', 'canti salida', 'saldo final', 'cantidad_fin', 'promedio_fin']
+
+EXTENSIONES_DATASET = ('.xlsx', '.xls', '.csv')
+
+# Archivos de bloqueo de Office (~$), LibreOffice (.~lock) y temporales
+PREFIJOS_TEMPORALES = ('~$', '.~lock', '.')
+SUFIJOS_TEMPORALES = ('.tmp', '~', '#')
+
+RUTA_DATASET = "dataset"
+RUTA_MODELO = "modelo_compras/"
+
+@st.cache_data(max_entries=2)
+def cargar_datos_automaticamente(huella):
+    """Cargar datos automáticamente desde la carpeta dataset.
+    
+    `huella` (huella_dataset de los archivos) es la clave de la caché: si los
+    archivos cambian, se vuelven a leer en vez de servir el kardex anterior.
+    """
     try:
-        dataset_path = "dataset"
-        archivos = os.listdir(dataset_path)
-        
-        archivos_excel = [f for f in archivos if f.endswith(('.xlsx', '.xls'))]
-        archivos_csv = [f for f in archivos if f.endswith('.csv')]
+        dataset_path = RUTA_DATASET
+        df, archivos = cargar_dataset(dataset_path)
         
-        if archivos_excel:
-            archivo = archivos_excel[0]
-            df = pd.read_excel(f"{dataset_path}/{archivo}")
-            st.success(f"✅ Datos cargados automáticamente desde: {archivo}")
-            return df
-        elif archivos_csv:
-            archivo = archivos_csv[0]
-            df = pd.read_csv(f"{dataset_path}/{archivo}")
-            st.success(f"✅ Datos cargados automáticamente desde: {archivo}")
-            return df
-        else:
+        if df is None:
             st.error("❌ No se encontraron archivos en la carpeta 'dataset'")
             return None
+        
+        nombres = ", ".join(os.path.basename(a) for a in archivos)
+        st.success(f"✅ Datos cargados automáticamente desde: {nombres}")
+        return df
             
     except Exception as e:
         st.error(f"❌ Error al cargar datos automáticamente: {str(e)}")
         return None
 
+def cargar_dataset(dataset_path="dataset"):
+    """Leer y concatenar todos los archivos del dataset (sin depender de la interfaz)"""
+    archivos = listar_archivos_dataset(dataset_path)
+    if not archivos:
+        return None, []
+    
+    if len(archivos) == 1:
+        partes = [leer_archivo_almacen(archivos[0])]
+    else:
+        # Un proceso por archivo: cada almacén se exporta en su propio libro
+        max_workers = min(len(archivos), os.cpu_count() or 1)
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            partes = list(pool.map(leer_archivo_almacen, archivos))
+    
+    return tipar_kardex(pd.concat(partes, ignore_index=True)), archivos
+
+def listar_archivos_dataset(dataset_path="dataset"):
+    """Listar los libros y CSV válidos, omitiendo archivos de bloqueo y temporales"""
+    archivos = []
+    for f in sorted(os.listdir(dataset_path)):
+        if f.startswith(PREFIJOS_TEMPORALES) or f.endswith(SUFIJOS_TEMPORALES):
+            continue
+        if f.endswith(EXTENSIONES_DATASET):
+            archivos.append(os.path.join(dataset_path, f))
+    return archivos
+
+def leer_archivo_almacen(ruta):
+    """Leer un archivo del dataset y etiquetar cada fila con su almacén de origen"""
+    if ruta.endswith('.csv'):
+        df = pd.read_csv(ruta)
+    else:
+        df = pd.read_excel(ruta)
+    df['almacen'] = os.path.splitext(os.path.basename(ruta))[0]
+    return df
+
+def tipar_kardex(df):
+    """Convertir las columnas numéricas y el almacén a tipos compactos"""
+    for col in COLUMNAS_NUMERICAS:
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], errors='coerce')
+    if 'almacen' in df.columns:
+        df['almacen'] = df['almacen'].astype('category')
+    return df
+
+def leer_kardex_por_bloques(ruta, tamano_bloque=100_000, columnas=COLUMNAS_MENSUALES):
+    """Leer el kardex por bloques para archivos que no caben en memoria.
+    
+    Cada bloque se etiqueta con el almacén del archivo, como en leer_archivo_almacen:
+    la agregación mensual toma el saldo de cada almacén por separado.
+    """
+    almacen = os.path.splitext(os.path.basename(ruta))[0]
+    for bloque in _leer_bloques(ruta, tamano_bloque, columnas):
+        bloque['almacen'] = almacen
+        yield bloque
+
+def _leer_bloques(ruta, tamano_bloque, columnas):
+    if ruta.endswith('.csv'):
+        yield from pd.read_csv(ruta, chunksize=tamano_bloque, usecols=lambda c: c in columnas)
+        return
+    
+    if ruta.endswith('.xls'):
+        # openpyxl no lee el formato antiguo: se carga completo como un único bloque
+        df = pd.read_excel(ruta)
+        yield df[[c for c in columnas if c in df.columns]].copy()
+        return
+    
+    from openpyxl import load_workbook
+    libro = load_workbook(ruta, read_only=True, data_only=True)
+    try:
+        filas = libro.active.iter_rows(values_only=True)
+        encabezado = next(filas, None)
+        if encabezado is None:
+            return
+        
+        posiciones = [i for i, c in enumerate(encabezado) if c in columnas]
+        nombres = [encabezado[i] for i in posiciones]
+        
+        buffer = []
+        for fila in filas:
+            buffer.append([fila[i] if i < len(fila) else None for i in posiciones])
+            if len(buffer) >= tamano_bloque:
+                yield pd.DataFrame(buffer, columns=nombres)
+                buffer = []
+        if buffer:
+            yield pd.DataFrame(buffer, columns=nombres)
+    finally:
+        libro.close()
+
 def inicializar_sistema():
-    """Inicializar el sistema con datos y modelo"""
+    """Inicializar el sistema con los datos del dataset"""
     
     if 'datos_cargados' not in st.session_state:
         with st.spinner("🔄 Cargando datos automáticamente..."):
-            datos = cargar_datos_automaticamente()
+            # La huella se calcula antes de leer: así los datos en caché corresponden a ella
+            try:
+                huella = huella_dataset(listar_archivos_dataset(RUTA_DATASET))
+            except OSError:
+                huella = None  # Sin carpeta dataset: el cargador informa el error
+            datos = cargar_datos_automaticamente(huella)
             if datos is not None:
                 st.session_state.datos_cargados = datos
                 st.session_state.datos_automaticos = True
+                st.session_state.huella_dataset = huella
+
+@st.cache_resource(max_entries=4)
+def cargar_resultados_compartidos(huella, version):
+    """Leer una vez por proceso los resultados del almacén; todas las sesiones comparten la copia"""
+    return cargar_resultados(huella, version)
+
+def inicializar_resultados():
+    """Cargar del almacén las predicciones del dataset y el modelo vigentes, si ya se calcularon"""
+    
+    huella = st.session_state.get('huella_dataset')
+    if st.session_state.get('resultados') is not None or huella is None:
+        return
+    
+    version = leer_version_modelo(RUTA_MODELO)
+    predictor = st.session_state.get('predictor')
+    if predictor is not None and version is not None:
+        # Las opciones de inferencia de la sesión (p. ej. el motor intermitente) también son parte de la clave
+        version = predictor.clave_resultados(predictor.version_modelo or version)
+    # Solo se cachean lecturas de entradas existentes (un None cacheado ocultaría las nuevas)
+    if version is None or not existen_resultados(huella, version):
+        return
+    
+    guardados = cargar_resultados_compartidos(huella, version)
+    for clave in ARCHIVOS_RESULTADOS:
+        st.session_state[clave] = guardados.get(clave)
+    aplicar_politica_compra()
+
+def aplicar_politica_compra():
+    """Recalcular los resultados de la sesión con su política de compra, sin volver a predecir"""
+    
+    base = st.session_state.get('base_politica')
+    politica = st.session_state.get('politica_compra')
+    if base is None or politica is None:
+        return False
+    inicializar_predictor()
+    st.session_state.update(st.session_state.predictor.aplicar_politica(base, **politica))
+    return True
+
+def inicializar_predictor():
+    """Crear el predictor (importa scikit-learn solo cuando se necesita)"""
     
     if 'predictor' not in st.session_state:
         from utils.predictor import PredictorComprasMejorado
-        st.session_state.predictor = PredictorComprasMejorado(use_log_transform=True)
\ No newline at end of file
+        st.session_state.predictor = PredictorComprasMejorado(use_log_transform=True)
+
+def obtener_dataset_mensual(por_almacen=False):
+    """Dataset mensual (crear_dataset_mensual) de los datos cargados, calculado una vez por dataset.
+    
+    Se guarda el agregado por almacén y de él sale el de cada SKU (sumar_almacenes);
+    `por_almacen` devuelve el primero.
+    """
+    datos = st.session_state.get('datos_cargados')
+    guardado = st.session_state.get('dataset_mensual')
+    if guardado is None or guardado[0] is not datos:
+        from utils.predictor import sumar_almacenes
+        
+        almacenes = pd.DataFrame()
+        if datos is not None and len(datos) > 0:
+            inicializar_predictor()
+            almacenes = st.session_state.predictor.crear_dataset_mensual(datos, por_almacen=True)
+        if len(almacenes) == 0:
+            almacenes = pd.DataFrame({'id_insumo': [], 'almacen': [], 'mes': [], 'consumo': [], 'saldo final': []})
+            mensual = almacenes.drop(columns='almacen')
+        else:
+            mensual = sumar_almacenes(almacenes)
+        guardado = (datos, almacenes, mensual)
+        st.session_state.dataset_mensual = guardado
+    return guardado[1] if por_almacen else guardado[2]
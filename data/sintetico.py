@@ -0,0 +1,89 @@
+import pandas as pd
+import numpy as np
+
+DESCRIPCIONES = [
+    'LLANTA', 'FILTRO ACEITE', 'FILTRO AIRE', 'PERNO', 'TUERCA', 'GUANTE NITRILO',
+    'CABLE ELECTRICO', 'RODAMIENTO', 'MANGUERA', 'CORREA', 'LUBRICANTE', 'EMPAQUETADURA'
+]
+
+
+def generar_kardex_sintetico(n_skus=500, n_meses=24, movimientos_por_mes=4,
+                             fraccion_intermitente=0.4, inicio='2023-01-01',
+                             sufijo_milisegundos=False, semilla=42):
+    """Generar un kardex sintético con el mismo formato que las exportaciones reales.
+
+    Cada SKU tiene un volumen de consumo log-normal; una fracción de ellos es
+    intermitente (la mayoría de meses sin salidas). Se incluye un SALDO INICIAL
+    por SKU, salidas y entradas de reposición, y el saldo final acumulado.
+    Con sufijo_milisegundos=True las fechas imitan el formato 'HH:MM:SS:mmm'
+    de algunas exportaciones.
+    """
+    rng = np.random.default_rng(semilla)
+
+    ids = 501000000 + np.arange(n_skus) * 7 + rng.integers(0, 7, n_skus)
+    consumo_medio = rng.lognormal(mean=2.5, sigma=1.2, size=n_skus)
+    prob_consumo = np.where(rng.random(n_skus) < fraccion_intermitente,
+                            rng.uniform(0.05, 0.3, n_skus), 1.0)
+    costo_unitario = np.round(rng.lognormal(mean=3, sigma=1, size=n_skus), 2)
+    descripciones = rng.choice(DESCRIPCIONES, n_skus)
+
+    # Movimientos por (SKU, mes)
+    movimientos = rng.poisson(movimientos_por_mes, size=(n_skus, n_meses)) + 1
+    sku_mov = np.repeat(np.arange(n_skus), movimientos.sum(axis=1))
+    mes_mov = np.concatenate([np.repeat(np.arange(n_meses), fila) for fila in movimientos])
+    n = len(sku_mov)
+
+    es_salida = rng.random(n) < 0.7
+    activo = rng.random(n) < prob_consumo[sku_mov]
+    media_mov = consumo_medio[sku_mov] / movimientos_por_mes
+    canti_salida = np.where(es_salida & activo, rng.poisson(media_mov) + 1, 0)
+    canti_entrada = np.where(~es_salida, rng.poisson(media_mov * 2.5) + 1, 0)
+
+    # Fechas dentro de cada mes, ordenadas por SKU y fecha
+    base = pd.Timestamp(inicio)
+    inicio_mes = (base + pd.to_timedelta(mes_mov * 30.44, unit='D')).normalize()
+    fechas = inicio_mes + pd.to_timedelta(rng.integers(0, 28 * 86400, n), unit='s')
+    orden = np.lexsort((fechas.to_numpy(), sku_mov))
+    sku_mov, fechas = sku_mov[orden], fechas[orden]
+    canti_salida, canti_entrada, es_salida = canti_salida[orden], canti_entrada[orden], es_salida[orden]
+
+    # Saldo acumulado por SKU; el saldo inicial evita saldos negativos
+    neto = pd.Series(canti_entrada - canti_salida)
+    acumulado = neto.groupby(sku_mov).cumsum().to_numpy()
+    saldo_inicial = np.maximum(-pd.Series(acumulado).groupby(sku_mov).min().to_numpy(), 0)
+    saldo_inicial = saldo_inicial + rng.integers(0, 50, n_skus)
+    saldo = acumulado + saldo_inicial[sku_mov]
+
+    fecha_texto = fechas.strftime('%d/%m/%Y %H:%M:%S').to_numpy().astype(object)
+    fecha_inicial = base.strftime('%d/%m/%Y 00:00:00')
+    if sufijo_milisegundos:
+        fecha_texto = fecha_texto + ':' + rng.integers(0, 1000, n).astype(str).astype(object)
+        fecha_inicial += ':0'
+
+    kardex = pd.DataFrame({
+        'id_insumo': ids[sku_mov],
+        'descripcion': descripciones[sku_mov],
+        'fecha': fecha_texto,
+        'tipo_transac': np.where(es_salida, 'SALIDAS', 'ENTRADAS'),
+        'canti entrada': canti_entrada,
+        'canti salida': canti_salida,
+        'saldo final': saldo,
+        'cantidad_fin': saldo,
+        'promedio_fin': costo_unitario[sku_mov]
+    })
+
+    saldos_iniciales = pd.DataFrame({
+        'id_insumo': ids,
+        'descripcion': descripciones,
+        'fecha': fecha_inicial,
+        'tipo_transac': 'SALDO INICIAL',
+        'canti entrada': 0,
+        'canti salida': 0,
+        'saldo final': saldo_inicial,
+        'cantidad_fin': saldo_inicial,
+        'promedio_fin': costo_unitario
+    })
+
+    kardex = pd.concat([saldos_iniciales, kardex], ignore_index=True)
+    kardex['_orden_sku'] = np.concatenate([np.arange(n_skus), sku_mov])
+    return kardex.sort_values('_orden_sku', kind='stable').drop(columns='_orden_sku').reset_index(drop=True)
@@ -0,0 +1,135 @@
+"""Ejecución batch (sin interfaz) del pipeline de predicción de compras.
+
+Carga el dataset, reutiliza o entrena el modelo y escribe las recomendaciones
+mensuales, trimestrales y anuales en el almacén de resultados (Parquet), donde
+el dashboard las encuentra sin recalcular. Si el dataset y el modelo no han
+cambiado desde la última corrida no se recalcula nada. Pensado para programarse
+con cron, por ejemplo cada noche:
+
+    0 2 * * * cd /ruta/al/proyecto && python prediccion_batch.py >> batch.log 2>&1
+"""
+import argparse
+import logging
+import os
+import sys
+import time
+from itertools import chain
+
+from data.loader import cargar_dataset, listar_archivos_dataset, leer_kardex_por_bloques
+from utils.almacen_resultados import RUTA_ALMACEN, huella_dataset, ruta_entrada
+from utils.motores import MOTORES_INTERMITENTES
+from utils.pipeline import buscar_resultados, ejecutar_pipeline
+from utils.predictor import BACKENDS_GB, FUENTES_VARIABILIDAD, PredictorComprasMejorado
+
+log = logging.getLogger("prediccion_batch")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--dataset', default='dataset', help='Carpeta con los archivos del kardex')
+    parser.add_argument('--salida', default=RUTA_ALMACEN, help='Carpeta del almacén de resultados')
+    parser.add_argument('--modelo', default='modelo_compras/', help='Carpeta del modelo guardado')
+    parser.add_argument('--reentrenar', action='store_true', help='Entrenar aunque exista un modelo guardado')
+    parser.add_argument('--incremental', action='store_true',
+                        help='Actualizar el modelo guardado con los meses nuevos (reentrena desde cero si hay deriva)')
+    parser.add_argument('--segmentado', action='store_true',
+                        help='Usar un modelo por segmento de demanda (reentrena si el guardado no lo es)')
+    parser.add_argument('--ajustar', action='store_true',
+                        help='Buscar hiperparámetros por halving sucesivo antes de reentrenar')
+    parser.add_argument('--backend-gb', choices=BACKENDS_GB, default='gb',
+                        help="Boosting con cortes exactos ('gb') o por histogramas ('hist', multihilo, admite lags vacíos)")
+    parser.add_argument('--variabilidad', choices=FUENTES_VARIABILIDAD, default='historica',
+                        help="Stock de seguridad con la desviación histórica o con el intervalo P10-P90 de los árboles")
+    parser.add_argument('--motor-intermitente', choices=MOTORES_INTERMITENTES,
+                        help='Pronosticar los SKUs intermitentes con Croston, SBA o TSB en vez del ensemble')
+    parser.add_argument('--por-bloques', type=int, default=0, metavar='FILAS',
+                        help='Agregar el kardex por bloques de FILAS filas (archivos más grandes que la RAM)')
+    args = parser.parse_args(argv)
+    args.reentrenar = args.reentrenar or args.ajustar
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    inicio = time.perf_counter()
+
+    archivos = listar_archivos_dataset(args.dataset)
+    if not archivos:
+        log.error("No se encontraron archivos en la carpeta '%s'", args.dataset)
+        return 1
+    log.info("Archivos: %s", ", ".join(os.path.basename(a) for a in archivos))
+    huella = huella_dataset(archivos)
+
+    predictor = PredictorComprasMejorado(
+        use_log_transform=True, segmentado=args.segmentado, motor_intermitente=args.motor_intermitente,
+        backend_gb=args.backend_gb, variabilidad=args.variabilidad
+    )
+    if not args.reentrenar and predictor.cargar_modelo(args.modelo):
+        if predictor.segmentado != args.segmentado:
+            log.info("El modelo guardado %s segmentado: se reentrenará", "es" if predictor.segmentado else "no es")
+            args.reentrenar = True
+        if predictor.backend_gb != args.backend_gb:
+            log.info("El modelo guardado usa el backend '%s': se reentrenará", predictor.backend_gb)
+            args.reentrenar = True
+        predictor.segmentado = args.segmentado
+        predictor.backend_gb = args.backend_gb
+    
+    if not args.reentrenar and predictor.model is not None:
+        log.info("Modelo reutilizado desde %s (versión %s)", args.modelo, predictor.version_modelo)
+        if buscar_resultados(predictor, huella, args.modelo, args.salida) is not None:
+            log.info("Resultados vigentes en %s: nada que recalcular",
+                     ruta_entrada(huella, predictor.clave_resultados(), args.salida))
+            return 0
+        if args.incremental:
+            log.info("Se actualizará el modelo con los meses nuevos")
+            args.reentrenar = True
+    else:
+        log.info("Se entrenará un modelo nuevo")
+
+    datos, df_mensual, filas_kardex = None, None, None
+    try:
+        with predictor.trazador.ejecucion("prediccion_batch"):
+            if args.por_bloques:
+                bloques = chain.from_iterable(leer_kardex_por_bloques(a, args.por_bloques) for a in archivos)
+                df_mensual = predictor.crear_dataset_mensual_por_bloques(bloques)
+            else:
+                datos, _ = cargar_dataset(args.dataset)
+                filas_kardex = len(datos)
+
+            salida = ejecutar_pipeline(
+                predictor,
+                datos=datos,
+                df_mensual=df_mensual,
+                ruta_modelo=args.modelo,
+                reentrenar=args.reentrenar,
+                ajustar_hiperparametros=args.ajustar,
+                incremental=args.incremental,
+                huella=huella,
+                metadatos={
+                    'origen': 'batch',
+                    'archivos': [os.path.basename(a) for a in archivos],
+                    'filas_kardex': filas_kardex
+                },
+                ruta_almacen=args.salida
+            )
+    except ValueError as e:
+        log.error(str(e))
+        return 1
+
+    for etapa in predictor.trazador.ultima_ejecucion()['etapas']:
+        if etapa['nivel'] == 0:
+            log.info("etapa %-28s %7.2f s", etapa['etapa'], etapa['tiempo_s'])
+    if predictor.ultima_actualizacion is not None:
+        actualizacion = predictor.ultima_actualizacion
+        log.info("actualización %s: %d filas nuevas, deriva %.2f%s", actualizacion['modo'],
+                 actualizacion['filas_nuevas'], actualizacion['deriva'],
+                 f" ({actualizacion['motivo']})" if actualizacion['motivo'] else "")
+    if args.ajustar:
+        for nombre, parametros in predictor.parametros.items():
+            log.info("hiperparámetros %s: %s", nombre, parametros)
+
+    log.info("%d SKUs -> %s", salida['resultados']['id_insumo'].nunique(),
+             ruta_entrada(huella, predictor.clave_resultados(), args.salida))
+    log.info("Listo en %.1f s", time.perf_counter() - inicio)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,100 @@
+import time
+
+import numpy as np
+from sklearn.ensemble import RandomForestRegressor, GradientBoostingRegressor, HistGradientBoostingRegressor
+from sklearn.experimental import enable_halving_search_cv  # noqa: F401 (habilita HalvingRandomSearchCV)
+from sklearn.model_selection import HalvingRandomSearchCV, TimeSeriesSplit
+
+# Espacios acotados a modelos del tamaño del actual o menores (100 árboles, profundidad 10 / 6)
+ESPACIO_RF = {
+    'n_estimators': [30, 50, 100],
+    'max_depth': [6, 8, 10, 12],
+    'min_samples_leaf': [1, 3, 10],
+    'max_features': [1.0, 0.6, 0.3]
+}
+
+# El número de etapas lo decide la parada temprana; n_estimators es solo el tope
+ESPACIO_GB = {
+    'learning_rate': [0.05, 0.1, 0.2],
+    'max_depth': [3, 4, 6],
+    'subsample': [0.7, 0.85, 1.0],
+    'min_samples_leaf': [1, 5, 20]
+}
+PARADA_TEMPRANA_GB = {'n_estimators': 300, 'n_iter_no_change': 10, 'validation_fraction': 0.1}
+
+ESPACIO_HGB = {
+    'learning_rate': [0.05, 0.1, 0.2],
+    'max_depth': [3, 4, 6, None],
+    'min_samples_leaf': [5, 20, 50],
+    'l2_regularization': [0.0, 0.1, 1.0]
+}
+PARADA_TEMPRANA_HGB = {'max_iter': 300, 'early_stopping': True, 'n_iter_no_change': 10, 'validation_fraction': 0.1}
+
+# Candidatos con un error hasta 5% peor que el mejor se consideran empatados: gana el más rápido
+TOLERANCIA_EMPATE = 0.05
+
+
+def elegir_mas_rapido(busqueda, tolerancia=TOLERANCIA_EMPATE):
+    """Entre los candidatos de la última ronda que empatan con el mejor, el de menor tiempo"""
+    resultados = busqueda.cv_results_
+    ultima_ronda = resultados['iter'] == resultados['iter'].max()
+    puntajes = resultados['mean_test_score']
+    # Un candidato que falló en algún pliegue queda con puntaje NaN y no compite
+    mejor = np.nanmax(puntajes[ultima_ronda])
+    # Los puntajes son -MAE: empatan los que no superan el MAE del mejor en más de la tolerancia
+    empatados = ultima_ronda & (puntajes >= mejor - abs(mejor) * tolerancia)
+    tiempo = resultados['mean_fit_time'] + resultados['mean_score_time']
+    indice = np.flatnonzero(empatados)[np.argmin(tiempo[empatados])]
+    return resultados['params'][indice], -puntajes[indice], tiempo[indice]
+
+
+def buscar_hiperparametros(X, y, n_candidatos=24, n_pliegues=3, n_jobs=-1, semilla=42, backend_gb='gb'):
+    """Búsqueda por halving sucesivo de los hiperparámetros de RF y GB.
+
+    X e y deben venir ordenados por mes: los pliegues de TimeSeriesSplit
+    validan siempre con meses posteriores a los de entrenamiento. Cada ronda
+    descarta dos tercios de los candidatos y triplica las filas de los que siguen;
+    la última ronda usa todas las filas. Con backend_gb='hist' se busca el
+    HistGradientBoostingRegressor y el bosque se ajusta solo con las filas sin NaN.
+    """
+    completas = ~np.isnan(X).any(axis=1)
+    if completas.any() and not completas.all():
+        # Los primeros meses no tienen lags: el primer pliegue debe llegar a filas completas,
+        # porque el boosting por histogramas no entrena con una columna solo de NaN
+        n_pliegues = max(2, min(n_pliegues, len(X) // (np.argmax(completas) + 1) - 1))
+    cv = TimeSeriesSplit(n_splits=n_pliegues)
+    ajuste = {'parametros': {}, 'detalle': {}}
+    inicio_total = time.perf_counter()
+
+    busquedas = {'rf': (RandomForestRegressor(random_state=42), ESPACIO_RF, {}, completas)}
+    if backend_gb == 'hist':
+        busquedas['hgb'] = (
+            HistGradientBoostingRegressor(random_state=42, **PARADA_TEMPRANA_HGB), ESPACIO_HGB, PARADA_TEMPRANA_HGB, None
+        )
+    else:
+        busquedas['gb'] = (
+            GradientBoostingRegressor(random_state=42, **PARADA_TEMPRANA_GB), ESPACIO_GB, PARADA_TEMPRANA_GB, None
+        )
+    for nombre, (estimador, espacio, fijos, filas) in busquedas.items():
+        inicio = time.perf_counter()
+        busqueda = HalvingRandomSearchCV(
+            estimador, espacio, n_candidates=n_candidatos, factor=3, cv=cv,
+            scoring='neg_mean_absolute_error', n_jobs=n_jobs, random_state=semilla,
+            min_resources='exhaust', refit=False
+        )
+        if filas is None or filas.all():
+            busqueda.fit(X, y)
+        else:
+            busqueda.fit(X[filas], y[filas])
+        parametros, mae, tiempo_candidato = elegir_mas_rapido(busqueda)
+        ajuste['parametros'][nombre] = dict(fijos, **parametros)
+        ajuste['detalle'][nombre] = {
+            'mae_validacion': float(mae),
+            'tiempo_candidato_s': float(tiempo_candidato),
+            'candidatos': int(len(busqueda.cv_results_['params'])),
+            'rondas': int(busqueda.n_iterations_),
+            'tiempo_busqueda_s': time.perf_counter() - inicio
+        }
+
+    ajuste['tiempo_total_s'] = time.perf_counter() - inicio_total
+    return ajuste
@@ -0,0 +1,106 @@
+import hashlib
+import json
+import os
+import shutil
+from datetime import datetime
+
+import pandas as pd
+
+RUTA_ALMACEN = "resultados"
+
+# Entradas (dataset, modelo) que se conservan; las más antiguas se eliminan
+MAXIMO_ENTRADAS = 10
+
+# Archivo Parquet por horizonte de predicción, más la base por fila (consumo predicho,
+# variabilidad y saldo) con la que se recalcula otra política de compra sin el modelo
+ARCHIVOS_RESULTADOS = {
+    'resultados': 'mensual.parquet',
+    'resultados_trimestrales': 'trimestral.parquet',
+    'resultados_anuales': 'anual.parquet',
+    'base_politica': 'base_politica.parquet'
+}
+
+ARCHIVO_METADATOS = 'metadata.json'
+ARCHIVO_VERSION_MODELO = 'version.txt'
+
+
+def huella_dataset(archivos):
+    """Huella del dataset a partir del nombre, tamaño y fecha de modificación de cada archivo"""
+    # Se usa os.stat en vez del contenido: leer libros de cientos de MB en cada
+    # sesión costaría más que la propia consulta al almacén
+    h = hashlib.sha256()
+    for ruta in sorted(archivos):
+        info = os.stat(ruta)
+        h.update(f"{os.path.basename(ruta)}|{info.st_size}|{info.st_mtime_ns}\n".encode())
+    return h.hexdigest()[:16]
+
+
+def leer_version_modelo(ruta_modelo='modelo_compras/'):
+    """Versión del modelo guardado en disco (None si no hay modelo entrenado)"""
+    ruta_ensemble = os.path.join(ruta_modelo, 'modelo_ensemble.pkl')
+    if not os.path.exists(ruta_ensemble):
+        return None
+    try:
+        with open(os.path.join(ruta_modelo, ARCHIVO_VERSION_MODELO)) as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        # Modelos guardados antes de versionar: la fecha del archivo identifica el entrenamiento
+        return f"legado-{os.stat(ruta_ensemble).st_mtime_ns:x}"
+
+
+def ruta_entrada(huella, version, ruta_almacen=RUTA_ALMACEN):
+    return os.path.join(ruta_almacen, f"{huella}_{version}")
+
+
+def existen_resultados(huella, version, ruta_almacen=RUTA_ALMACEN):
+    """El metadata.json se escribe al final: su presencia marca una entrada completa"""
+    return os.path.exists(os.path.join(ruta_entrada(huella, version, ruta_almacen), ARCHIVO_METADATOS))
+
+
+def guardar_resultados(salida, huella, version, metadatos=None, ruta_almacen=RUTA_ALMACEN):
+    """Escribir los tres horizontes y la base de la política en Parquet bajo la clave (dataset, modelo)"""
+    carpeta = ruta_entrada(huella, version, ruta_almacen)
+    os.makedirs(carpeta, exist_ok=True)
+    for clave, archivo in ARCHIVOS_RESULTADOS.items():
+        # Se escribe a un temporal y se reemplaza: ningún lector ve un archivo a medias
+        ruta = os.path.join(carpeta, archivo)
+        salida[clave].to_parquet(f"{ruta}.tmp", index=False)
+        os.replace(f"{ruta}.tmp", ruta)
+
+    metadatos = dict(metadatos or {}, huella_dataset=huella, version_modelo=version)
+    metadatos.setdefault('fecha', datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+    metadatos.setdefault('skus', int(salida['resultados']['id_insumo'].nunique()))
+    ruta_metadatos = os.path.join(carpeta, ARCHIVO_METADATOS)
+    with open(f"{ruta_metadatos}.tmp", 'w') as f:
+        json.dump(metadatos, f, indent=2)
+    os.replace(f"{ruta_metadatos}.tmp", ruta_metadatos)
+
+    podar_almacen(ruta_almacen)
+    return carpeta
+
+
+def cargar_resultados(huella, version, ruta_almacen=RUTA_ALMACEN):
+    """Leer los resultados guardados para (dataset, modelo), o None si no existen"""
+    if not existen_resultados(huella, version, ruta_almacen):
+        return None
+    carpeta = ruta_entrada(huella, version, ruta_almacen)
+    # Las entradas anteriores a la base de la política no la tienen
+    salida = {
+        clave: pd.read_parquet(os.path.join(carpeta, archivo), memory_map=True)
+        for clave, archivo in ARCHIVOS_RESULTADOS.items()
+        if os.path.exists(os.path.join(carpeta, archivo))
+    }
+    with open(os.path.join(carpeta, ARCHIVO_METADATOS)) as f:
+        salida['metadatos'] = json.load(f)
+    return salida
+
+
+def podar_almacen(ruta_almacen=RUTA_ALMACEN, maximo=MAXIMO_ENTRADAS):
+    """Eliminar las entradas más antiguas cuando se supera el máximo"""
+    entradas = [
+        os.path.join(ruta_almacen, nombre) for nombre in os.listdir(ruta_almacen)
+        if os.path.isdir(os.path.join(ruta_almacen, nombre))
+    ]
+    entradas.sort(key=os.path.getmtime, reverse=True)
+    for carpeta in entradas[maximo:]:
+        shutil.rmtree(carpeta, ignore_errors=True)
@@ -0,0 +1,103 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from utils.predictor import PredictorComprasMejorado, calcular_metricas
+
+
+def generar_origenes(meses, n_pliegues=4, horizonte=1, min_meses_entrenamiento=6):
+    """Meses de origen de cada pliegue y los meses que evalúa, del más antiguo al más reciente.
+
+    Cada origen deja al menos `min_meses_entrenamiento` meses de historia antes
+    y un horizonte completo después; los pliegues avanzan de a un mes.
+    """
+    meses = np.unique(meses)
+    ultimo = len(meses) - horizonte
+    primero = max(min_meses_entrenamiento, ultimo - n_pliegues + 1)
+    return [(int(meses[i]), meses[i:i + horizonte]) for i in range(primero, ultimo + 1)]
+
+
+def evaluar_pliegue(pliegue, origen, df_train, df_contexto, opciones, feature_columns):
+    """Entrenar con los meses anteriores al origen y medir el error en el horizonte.
+
+    Función de módulo para poder ejecutarse en otro proceso. `df_contexto` trae
+    los meses evaluados y, si hay motor intermitente, la historia previa de esos
+    SKUs (Croston necesita la serie, no solo el mes a pronosticar).
+    """
+    predictor = PredictorComprasMejorado(**opciones)
+    predictor.trazador = None
+    predictor.feature_columns = feature_columns
+    predictor.max_procesos = 1  # El pool ya reparte los pliegues entre los núcleos
+
+    inicio = time.perf_counter()
+    predictor.ajustar_modelo(df_train)
+    tiempo_entrenamiento = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    prediccion = predictor.pronosticar_consumo(df_contexto)
+    tiempo_prediccion = time.perf_counter() - inicio
+
+    evaluadas = df_contexto['mes'].to_numpy() >= origen
+    metricas = calcular_metricas(df_contexto['consumo'].to_numpy()[evaluadas], prediccion[evaluadas])
+    return dict(
+        metricas,
+        pliegue=pliegue,
+        origen=origen,
+        filas_entrenamiento=len(df_train),
+        tiempo_entrenamiento_s=tiempo_entrenamiento,
+        tiempo_prediccion_s=tiempo_prediccion
+    )
+
+
+def ejecutar_backtesting(predictor, df_preparado, n_pliegues=4, horizonte=1, max_procesos=None):
+    """Validación con origen móvil: cada pliegue entrena solo con el pasado y evalúa los meses siguientes.
+
+    Reutiliza las features ya calculadas en df_preparado y reparte los pliegues
+    en un pool de procesos. Devuelve las métricas por pliegue y el promedio.
+    """
+    opciones = {
+        'use_log_transform': predictor.use_log_transform,
+        'segmentado': predictor.segmentado,
+        'motor_intermitente': predictor.motor_intermitente,
+        'parametros': predictor.parametros,
+        'backend_gb': predictor.backend_gb
+    }
+    origenes = generar_origenes(df_preparado['mes'], n_pliegues, horizonte)
+    if not origenes:
+        raise ValueError("No hay meses suficientes para el backtesting")
+
+    meses = df_preparado['mes'].to_numpy()
+    trabajos = []
+    for pliegue, (origen, meses_prueba) in enumerate(origenes, start=1):
+        df_prueba = df_preparado[np.isin(meses, meses_prueba)]
+        if predictor.motor_intermitente:
+            df_contexto = df_preparado[
+                (meses <= meses_prueba[-1]) & df_preparado['id_insumo'].isin(df_prueba['id_insumo']).to_numpy()
+            ]
+        else:
+            df_contexto = df_prueba
+        trabajos.append((pliegue, origen, df_preparado[meses < origen], df_contexto))
+
+    inicio = time.perf_counter()
+    max_workers = min(len(trabajos), max_procesos or os.cpu_count() or 1)
+    argumentos = list(zip(*trabajos)) + [[opciones] * len(trabajos), [predictor.feature_columns] * len(trabajos)]
+    if max_workers == 1:
+        pliegues = list(map(evaluar_pliegue, *argumentos))
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            pliegues = list(pool.map(evaluar_pliegue, *argumentos))
+
+    pliegues = pd.DataFrame(pliegues)[[
+        'pliegue', 'origen', 'filas_entrenamiento', 'filas', 'mae', 'rmse', 'sesgo',
+        'mape', 'dentro_20pct', 'tiempo_entrenamiento_s', 'tiempo_prediccion_s'
+    ]]
+    return {
+        'pliegues': pliegues,
+        'promedio': pliegues[['mae', 'rmse', 'sesgo', 'mape', 'dentro_20pct']].mean().to_dict(),
+        'horizonte': horizonte,
+        'procesos': max_workers,
+        'tiempo_total_s': time.perf_counter() - inicio
+    }
@@ -0,0 +1,226 @@
+import numpy as np
+import pandas as pd
+
+# Niveles de la jerarquía de familias: largo del prefijo de id_insumo en cada nivel
+NIVELES_FAMILIA = (3, 5, 7)
+
+DIMENSIONES_CUBO = ('familia', 'almacen', 'periodo', 'prioridad')
+MEDIDAS_CUBO = ('consumo', 'saldo', 'consumo_predicho', 'cantidad_comprar', 'costo_compra')
+
+# Los stocks no se suman entre períodos: sin agrupar por período se usa el saldo de cierre de
+# cada SKU y almacén (el del último mes con movimientos del SKU), guardado en la celda de ese mes
+MEDIDAS_CIERRE = {'saldo': 'saldo_cierre'}
+COLUMNAS_CUBO = MEDIDAS_CUBO + tuple(MEDIDAS_CIERRE.values())
+
+# Almacén de las medidas que son del SKU y no de un almacén (predicción y compra), y de un kardex sin almacenes
+SIN_ALMACEN = 'TODOS'
+SIN_PRIORIDAD = 'SIN PREDICCIÓN'
+
+
+def atributos_kardex(datos):
+    """Último precio promedio de cada SKU"""
+    atributos = pd.DataFrame(index=pd.Index(datos['id_insumo'].dropna().unique(), name='id_insumo'))
+    if 'promedio_fin' in datos.columns:
+        atributos['precio'] = datos.groupby('id_insumo')['promedio_fin'].last()
+    return atributos
+
+
+class CuboAgregado:
+    """Medidas sumadas por familia, almacén, período y prioridad, solo en las celdas con datos.
+
+    Hay un cubo por nivel de NIVELES_FAMILIA, cada uno sumado desde el más fino,
+    y cada consulta lee el nivel más grueso que le alcanza: recorrer todas las
+    familias del primer nivel no toca las celdas del último. Las coordenadas de
+    cada celda son códigos enteros pequeños y las medidas, float32; una consulta
+    filtra celdas con máscaras y suma por grupo con np.bincount, sin volver al
+    kardex ni a los resultados.
+    """
+
+    def __init__(self, niveles, etiquetas, niveles_familia=NIVELES_FAMILIA):
+        # Por nivel: {'familias': Index, 'coordenadas': {dimensión: códigos}, 'valores': (celdas, medidas)}
+        self.niveles = niveles
+        self.etiquetas = etiquetas
+        self.niveles_familia = niveles_familia
+
+    def __len__(self):
+        return len(self.niveles[-1]['valores'])
+
+    @property
+    def nbytes(self):
+        return sum(
+            nivel['valores'].nbytes + sum(codigos.nbytes for codigos in nivel['coordenadas'].values())
+            for nivel in self.niveles
+        )
+
+    def familias(self, nivel=0, padre=None):
+        """Familias de un nivel, opcionalmente solo las de `padre` (una familia del nivel anterior)"""
+        familias = self.niveles[nivel]['familias']
+        if padre is None or nivel == 0:
+            return list(familias)
+        return list(familias[familias.str[:self.niveles_familia[nivel - 1]] == padre])
+
+    def consultar(self, agrupar_por=('familia',), nivel_familia=0, filtros=None, nivel_filtro=0):
+        """Medidas agrupadas por las dimensiones pedidas, con filtros {dimensión: valores}.
+
+        El filtro de familia es una familia del nivel `nivel_filtro`; el nivel no se
+        deduce del largo, porque los id_insumo más cortos que el prefijo dan
+        familias más cortas. Sin dimensiones se obtiene el total de la selección.
+        """
+        filtros = filtros or {}
+        nivel = nivel_familia if 'familia' in agrupar_por else 0
+        if 'familia' in filtros:
+            nivel = max(nivel, nivel_filtro)
+        cubo = self.niveles[nivel]
+        coordenadas, etiquetas = cubo['coordenadas'], dict(self.etiquetas, familia=cubo['familias'])
+
+        seleccion = np.ones(len(cubo['valores']), dtype=bool)
+        for dimension, valores in filtros.items():
+            if dimension == 'familia':
+                largo = self.niveles_familia[nivel_filtro]
+                dentro = np.asarray(etiquetas['familia'].str[:largo] == valores, dtype=bool)
+                seleccion &= dentro[coordenadas['familia']]
+            else:
+                codigos_validos = etiquetas[dimension].get_indexer(list(valores))
+                seleccion &= np.isin(coordenadas[dimension], codigos_validos[codigos_validos >= 0])
+
+        # Código de grupo de cada celda seleccionada: las dimensiones agrupadas en un solo entero
+        agrupadas = [d for d in DIMENSIONES_CUBO if d in agrupar_por]
+        forma = tuple(len(etiquetas[d]) for d in agrupadas)
+        if agrupadas:
+            grupo = np.ravel_multi_index([coordenadas[d][seleccion] for d in agrupadas], forma)
+        else:
+            grupo = np.zeros(np.count_nonzero(seleccion), dtype=int)
+        n_grupos = int(np.prod(forma))
+
+        valores = cubo['valores'][seleccion]
+        medidas = {}
+        for medida in MEDIDAS_CUBO:
+            columna = medida
+            if medida in MEDIDAS_CIERRE and 'periodo' not in agrupar_por:
+                columna = MEDIDAS_CIERRE[medida]
+            medidas[medida] = np.bincount(grupo, weights=valores[:, COLUMNAS_CUBO.index(columna)],
+                                          minlength=n_grupos)
+
+        presentes = np.flatnonzero(np.bincount(grupo, minlength=n_grupos))
+        tabla = pd.DataFrame({medida: valores_grupo[presentes] for medida, valores_grupo in medidas.items()})
+        if agrupadas:
+            for dimension, posicion in zip(agrupadas[::-1], np.unravel_index(presentes, forma)[::-1]):
+                tabla.insert(0, dimension, etiquetas[dimension][posicion])
+        return tabla
+
+
+def _sumar_celdas(codigos, pesos, forma):
+    """Celdas con datos de `forma` y la suma de cada columna de `pesos` en ellas.
+
+    `codigos` son las coordenadas de cada fila; devuelve (coordenadas, valores) de
+    las celdas presentes, ordenadas por su posición en el cubo denso.
+    """
+    celdas, posicion = np.unique(np.ravel_multi_index(codigos, forma), return_inverse=True)
+    valores = np.empty((len(celdas), len(pesos)), dtype=np.float32)
+    for m, (indices, peso) in enumerate(pesos):
+        valores[:, m] = np.bincount(posicion[indices], weights=peso, minlength=len(celdas))
+    coordenadas = {
+        dimension: codigos_celda.astype(np.min_scalar_type(max(tamano - 1, 0)))
+        for dimension, codigos_celda, tamano in zip(DIMENSIONES_CUBO, np.unravel_index(celdas, forma), forma)
+    }
+    return coordenadas, valores
+
+
+def _completar_saldos(mensual):
+    """Filas (SKU, almacén, mes) de cada almacén en todos los meses del SKU desde su primer mes.
+
+    Como en sumar_almacenes, un almacén sin movimientos en un mes del SKU conserva
+    su último saldo (y no consume): así el saldo de un período sumado entre
+    almacenes es el del SKU.
+    """
+    meses_sku = mensual[['id_insumo', 'mes']].drop_duplicates()
+    inicio = mensual.groupby(['id_insumo', 'almacen'], observed=True)['mes'].min().rename('inicio').reset_index()
+    completo = meses_sku.merge(inicio, on='id_insumo')
+    completo = completo[completo['mes'] >= completo['inicio']].drop(columns='inicio')
+    completo = completo.merge(mensual, on=['id_insumo', 'almacen', 'mes'], how='left')
+    completo = completo.sort_values(['id_insumo', 'almacen', 'mes'], kind='stable').reset_index(drop=True)
+    completo['consumo'] = completo['consumo'].fillna(0)
+    completo['saldo final'] = completo.groupby(['id_insumo', 'almacen'], observed=True)['saldo final'].ffill()
+    return completo
+
+
+def construir_cubo(simulador, cantidades, resultados, mensual, atributos=None, niveles_familia=NIVELES_FAMILIA):
+    """Construir el cubo desde la base de la política y el dataset mensual.
+
+    `simulador` (SimuladorPoliticas) y `cantidades` (su cantidad a comprar por
+    fila con la política vigente) aportan el consumo predicho, la compra y su
+    costo de cada SKU y mes, en el almacén SIN_ALMACEN porque son del SKU;
+    `mensual` (crear_dataset_mensual con por_almacen) el consumo y el saldo
+    reales de cada almacén; `resultados`, la prioridad de cada SKU, y
+    `atributos` (atributos_kardex), el precio.
+    """
+    atributos = atributos if atributos is not None else pd.DataFrame()
+    if 'almacen' in mensual.columns:
+        mensual = _completar_saldos(mensual)
+    else:
+        mensual = mensual.assign(almacen=SIN_ALMACEN)
+    filas_base = np.repeat(simulador.ids, simulador.filas_por_sku)
+    skus = pd.Index(pd.unique(np.concatenate([mensual['id_insumo'].to_numpy(), simulador.ids])))
+
+    # Atributos de cada SKU como códigos enteros
+    codigo_familia = skus.astype(str).str[:max(niveles_familia)]
+    familias = pd.Index(np.sort(codigo_familia.unique()))
+    familia_sku = familias.get_indexer(codigo_familia)
+
+    prioridad_sku = resultados.set_index('id_insumo')['prioridad'].reindex(skus).fillna(SIN_PRIORIDAD).to_numpy()
+    prioridades = pd.Index([p for p in ('ALTA', 'MEDIA', 'BAJA', SIN_PRIORIDAD) if p in set(prioridad_sku)])
+    prioridad_sku = prioridades.get_indexer(prioridad_sku)
+
+    precio = atributos['precio'] if 'precio' in atributos.columns else pd.Series(dtype=float)
+    precio_sku = precio.reindex(skus).fillna(0).to_numpy(dtype=float)
+
+    # El almacén es de cada fila del dataset mensual; un kardex sin almacenes agrega con almacen ''
+    almacen_mensual = mensual['almacen'].astype(str).replace('', SIN_ALMACEN)
+    almacenes = pd.Index(np.union1d(almacen_mensual.unique(), [SIN_ALMACEN]))
+    almacen_mensual = almacenes.get_indexer(almacen_mensual)
+
+    periodos = pd.Index(np.union1d(mensual['mes'].to_numpy(), simulador.meses).astype(int))
+
+    # Una fila por SKU (y almacén) y mes de cada fuente: primero las del dataset mensual, después las de la base
+    sku_mensual = skus.get_indexer(mensual['id_insumo'].to_numpy())
+    sku_base = skus.get_indexer(filas_base)
+    sku = np.concatenate([sku_mensual, sku_base])
+    codigos = (
+        familia_sku[sku], np.r_[almacen_mensual, np.full(len(sku_base), almacenes.get_loc(SIN_ALMACEN))],
+        periodos.get_indexer(np.concatenate([mensual['mes'].to_numpy(), simulador.meses])), prioridad_sku[sku]
+    )
+    filas_mensual = slice(0, len(sku_mensual))
+    filas_base = slice(len(sku_mensual), len(sku))
+    saldo = mensual['saldo final'].to_numpy(dtype=float)
+    # El dataset mensual solo trae los meses con movimientos del SKU: cada SKU cierra, en todos sus
+    # almacenes, en su propio último mes
+    ultimo_mes = mensual['mes'].to_numpy() == mensual.groupby('id_insumo')['mes'].transform('max').to_numpy()
+    pesos = [
+        (filas_mensual, mensual['consumo'].to_numpy(dtype=float)),
+        (filas_mensual, saldo),
+        (filas_base, simulador.consumo_predicho),
+        (filas_base, cantidades),
+        (filas_base, cantidades * precio_sku[sku_base]),
+        (filas_mensual, np.where(ultimo_mes, saldo, 0))
+    ]
+    forma = (len(familias), len(almacenes), len(periodos), len(prioridades))
+    coordenadas, valores = _sumar_celdas(codigos, pesos, forma)
+
+    # Los niveles superiores se suman desde las celdas del más fino, no desde las filas
+    niveles = []
+    for largo in niveles_familia[:-1]:
+        prefijos = familias.str[:largo]
+        familias_nivel = pd.Index(np.sort(prefijos.unique()))
+        traduccion = familias_nivel.get_indexer(prefijos)
+        todas = slice(None)
+        coordenadas_nivel, valores_nivel = _sumar_celdas(
+            (traduccion[coordenadas['familia']], coordenadas['almacen'], coordenadas['periodo'],
+             coordenadas['prioridad']),
+            [(todas, valores[:, m]) for m in range(len(COLUMNAS_CUBO))],
+            (len(familias_nivel),) + forma[1:]
+        )
+        niveles.append({'familias': familias_nivel, 'coordenadas': coordenadas_nivel, 'valores': valores_nivel})
+    niveles.append({'familias': familias, 'coordenadas': coordenadas, 'valores': valores})
+
+    etiquetas = {'almacen': almacenes, 'periodo': periodos, 'prioridad': prioridades}
+    return CuboAgregado(niveles, etiquetas, niveles_familia)
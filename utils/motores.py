@@ -0,0 +1,98 @@
+import numpy as np
+import pandas as pd
+
+# SKUs con esta fracción de meses sin consumo (o más) se pronostican con el motor intermitente
+UMBRAL_INTERMITENCIA = 0.5
+
+MOTORES_INTERMITENTES = ('sba', 'croston', 'tsb')
+
+# Meses de historia previa que df_preparado conserva como lags de la primera fila
+COLUMNAS_LAG = ['consumo_lag_3', 'consumo_lag_2', 'consumo_lag_1']
+
+
+def fraccion_meses_sin_consumo(df):
+    """Fracción de meses sin consumo del SKU de cada fila"""
+    sin_consumo = (df['consumo'].to_numpy() == 0).astype(float)
+    return pd.Series(sin_consumo, index=df.index).groupby(df['id_insumo'].to_numpy()).transform('mean').to_numpy()
+
+
+def pronosticar_intermitente(historia, metodo='sba', alfa=0.1, beta=0.1):
+    """Pronóstico un paso adelante de Croston, SBA o TSB para todos los SKUs a la vez.
+
+    `historia` es una matriz (SKUs × meses) alineada a la izquierda, con NaN
+    después del último mes de cada SKU. Se recorre mes a mes y cada paso
+    actualiza los estados de todos los SKUs con operaciones vectorizadas.
+    Devuelve, para cada celda, el pronóstico hecho antes de observarla
+    (0 mientras el SKU no haya tenido demanda).
+    """
+    n, total_meses = historia.shape
+    tamano = np.full(n, np.nan)         # Tamaño medio de la demanda cuando ocurre
+    intervalo = np.full(n, np.nan)      # Croston/SBA: meses medios entre demandas
+    probabilidad = np.full(n, np.nan)   # TSB: probabilidad de demanda en un mes
+    desde_ultima = np.ones(n)
+    pronostico = np.empty((n, total_meses))
+
+    for t in range(total_meses):
+        if metodo == 'tsb':
+            pronostico[:, t] = probabilidad * tamano
+        else:
+            pronostico[:, t] = tamano / intervalo
+
+        demanda = historia[:, t]
+        observado = ~np.isnan(demanda)
+        hay_demanda = observado & (demanda > 0)
+        primera = hay_demanda & np.isnan(tamano)
+
+        tamano = np.where(primera, demanda, np.where(hay_demanda, tamano + alfa * (demanda - tamano), tamano))
+        if metodo == 'tsb':
+            # La probabilidad se actualiza todos los meses, haya o no demanda
+            probabilidad = np.where(
+                observado & np.isnan(probabilidad), hay_demanda,
+                np.where(observado, probabilidad + beta * (hay_demanda - probabilidad), probabilidad)
+            )
+        else:
+            intervalo = np.where(
+                primera, desde_ultima,
+                np.where(hay_demanda, intervalo + alfa * (desde_ultima - intervalo), intervalo)
+            )
+        desde_ultima = np.where(hay_demanda, 1, np.where(observado, desde_ultima + 1, desde_ultima))
+
+    if metodo == 'sba':
+        # Corrección de Syntetos-Boylan del sesgo positivo de Croston
+        pronostico *= 1 - alfa / 2
+    return np.nan_to_num(pronostico, nan=0.0)
+
+
+class MotorIntermitente:
+    """Croston, SBA o TSB sobre la serie mensual de consumo de cada SKU"""
+
+    def __init__(self, metodo='sba', alfa=0.1, beta=0.1):
+        if metodo not in MOTORES_INTERMITENTES:
+            raise ValueError(f"Método intermitente desconocido: {metodo}")
+        self.nombre = metodo
+        self.alfa = alfa
+        self.beta = beta
+
+    def predecir(self, df):
+        """Pronóstico de cada fila usando solo los meses anteriores de su SKU"""
+        if len(df) == 0:
+            return np.empty(0)
+
+        # Posición de cada fila en la matriz (SKU, mes) sin reordenar df
+        orden = np.lexsort((df['mes'].to_numpy(), df['id_insumo'].to_numpy()))
+        ids = df['id_insumo'].to_numpy()[orden]
+        inicio_sku = np.r_[True, ids[1:] != ids[:-1]]
+        fila_sku = np.cumsum(inicio_sku) - 1
+        posicion = np.arange(len(ids)) - np.flatnonzero(inicio_sku)[fila_sku]
+
+        # Los lags de la primera fila devuelven los meses que preparar_features descartó
+        previos = len(COLUMNAS_LAG) if all(c in df.columns for c in COLUMNAS_LAG) else 0
+        historia = np.full((fila_sku[-1] + 1, previos + posicion.max() + 1), np.nan)
+        if previos:
+            historia[:, :previos] = df[COLUMNAS_LAG].to_numpy(dtype=float)[orden][inicio_sku]
+        historia[fila_sku, previos + posicion] = df['consumo'].to_numpy(dtype=float)[orden]
+
+        pronostico = pronosticar_intermitente(historia, self.nombre, self.alfa, self.beta)
+        resultado = np.empty(len(df))
+        resultado[orden] = pronostico[fila_sku, previos + posicion]
+        return resultado
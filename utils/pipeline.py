@@ -0,0 +1,88 @@
+from utils.almacen_resultados import RUTA_ALMACEN, cargar_resultados, guardar_resultados, leer_version_modelo
+
+
+def buscar_resultados(predictor, huella, ruta_modelo='modelo_compras/', ruta_almacen=RUTA_ALMACEN):
+    """Devolver los resultados ya calculados para el dataset y el modelo vigentes (o None).
+
+    El modelo vigente es el del predictor si ya tiene uno; si no, el guardado en disco,
+    que es el que usaría el pipeline sin reentrenar.
+    """
+    version = getattr(predictor, 'version_modelo', None) or leer_version_modelo(ruta_modelo)
+    if huella is None or version is None:
+        return None
+    return cargar_resultados(huella, predictor.clave_resultados(version), ruta_almacen)
+
+
+def ejecutar_pipeline(predictor, datos=None, df_mensual=None, ruta_modelo='modelo_compras/',
+                      reentrenar=False, progreso=None, huella=None, metadatos=None,
+                      ruta_almacen=RUTA_ALMACEN, ajustar_hiperparametros=False, incremental=False,
+                      politica=None):
+    """Ejecutar el pipeline completo de predicción sin depender de la interfaz.
+
+    Recibe el kardex (datos) o un dataset mensual ya agregado (df_mensual).
+    `progreso(porcentaje, mensaje)` permite mostrar el avance en el dashboard.
+    Con la huella del dataset, los resultados se buscan primero en el almacén y,
+    si hay que calcularlos, se guardan allí para las demás sesiones y procesos.
+    Con ajustar_hiperparametros se buscan los hiperparámetros antes de reentrenar.
+    Con incremental, un modelo existente se actualiza con los meses nuevos en vez
+    de reentrenarse desde cero (salvo que detecte deriva).
+    `politica` (argumentos de predictor.aplicar_politica) se aplica sobre las
+    predicciones; el almacén guarda la política por defecto y la base por fila,
+    así que cambiar de política no obliga a volver a predecir.
+    Devuelve df_preparado (None si vienen del almacén) y los resultados
+    mensual, trimestral y anual.
+    """
+    avisar = progreso or (lambda porcentaje, mensaje: None)
+    reentrenar = reentrenar or ajustar_hiperparametros
+
+    if huella is not None and not reentrenar:
+        guardados = buscar_resultados(predictor, huella, ruta_modelo, ruta_almacen)
+        if guardados is not None and (politica is None or 'base_politica' in guardados):
+            avisar(90, "📦 Recuperando predicciones ya calculadas...")
+            if politica is not None:
+                guardados.update(predictor.aplicar_politica(guardados['base_politica'], **politica))
+            return dict(guardados, df_preparado=None)
+
+    if df_mensual is None:
+        avisar(25, "🔄 Transformando datos a formato mensual...")
+        df_mensual = predictor.crear_dataset_mensual(datos)
+
+    if len(df_mensual) == 0:
+        raise ValueError("No se pudieron crear datos mensuales")
+
+    avisar(50, "🎯 Creando características para el modelo...")
+    df_preparado = predictor.preparar_features(df_mensual)
+
+    if len(df_preparado) == 0:
+        raise ValueError("No hay datos suficientes después de la preparación")
+
+    if ajustar_hiperparametros:
+        avisar(60, "🔎 Buscando hiperparámetros (halving sucesivo)...")
+        predictor.ajustar_hiperparametros(df_preparado)
+    
+    incremental = incremental and not ajustar_hiperparametros
+    if incremental and predictor.model is None:
+        # Se actualiza el modelo guardado, conservando la configuración pedida para detectar cambios
+        segmentado, backend_gb = predictor.segmentado, predictor.backend_gb
+        if predictor.cargar_modelo(ruta_modelo):
+            predictor.segmentado, predictor.backend_gb = segmentado, backend_gb
+    
+    if predictor.model is None or reentrenar:
+        if incremental and predictor.model is not None:
+            avisar(75, "🤖 Actualizando modelo con los meses nuevos...")
+            predictor.actualizar_modelo(df_preparado)
+        else:
+            avisar(75, "🤖 Entrenando modelo...")
+            predictor.entrenar_modelo(df_preparado)
+        predictor.guardar_modelo(ruta_modelo)
+
+    avisar(90, "📊 Generando recomendaciones de compra...")
+    # Una sola predicción por fila: los tres horizontes salen de la misma base
+    base = predictor.preparar_base_politica(df_preparado)
+    salida = dict(predictor.aplicar_politica(base), df_preparado=df_preparado, base_politica=base)
+
+    if huella is not None and getattr(predictor, 'version_modelo', None):
+        guardar_resultados(salida, huella, predictor.clave_resultados(), metadatos, ruta_almacen)
+    if politica is not None:
+        salida.update(predictor.aplicar_politica(base, **politica))
+    return salida
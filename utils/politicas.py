@@ -0,0 +1,178 @@
+import os
+
+import numpy as np
+import pandas as pd
+from scipy.special import ndtri
+
+# Parámetros de la política de compra; cada uno puede ser un valor general o uno por SKU
+COLUMNAS_POLITICA = ['lead_time_dias', 'nivel_servicio', 'moq', 'multiplo']
+
+# La política que aplicaba calcular_cantidad_comprar: 30 días de reposición y 95% de servicio
+POLITICA_POR_DEFECTO = {'lead_time_dias': 30, 'nivel_servicio': 0.95, 'moq': 0, 'multiplo': 1}
+
+
+def variabilidad_demanda(consumo_mean, consumo_std):
+    """Desviación mensual de la demanda para el stock de seguridad.
+
+    Sin desviación (un solo mes) se asume el 30% de la media; con desviación
+    cero, el 10%, para no dejar al SKU sin stock de seguridad.
+    """
+    consumo_mean = np.asarray(consumo_mean, dtype=float)
+    demanda_std = np.asarray(consumo_std, dtype=float)
+    demanda_std = np.where(np.isnan(demanda_std), consumo_mean * 0.3, demanda_std)
+    return np.where(demanda_std == 0, consumo_mean * 0.1, demanda_std)
+
+
+def variabilidad_cuantiles(p_inferior, p_superior, cobertura=0.8):
+    """Desviación de una normal cuyo intervalo central de `cobertura` es [p_inferior, p_superior] (P10–P90: 80%)"""
+    return (np.asarray(p_superior, dtype=float) - np.asarray(p_inferior, dtype=float)) / (2 * ndtri(0.5 + cobertura / 2))
+
+
+def factor_seguridad(lead_time_dias=30, nivel_servicio=0.95):
+    """Desviaciones de demanda que cubre el stock de seguridad: z del nivel de servicio × √(lead time en meses)"""
+    nivel_servicio = np.asarray(nivel_servicio, dtype=float)
+    if np.any((nivel_servicio <= 0) | (nivel_servicio >= 1)):
+        raise ValueError("El nivel de servicio debe estar entre 0 y 1")
+    return ndtri(nivel_servicio) * np.sqrt(np.asarray(lead_time_dias, dtype=float) / 30)
+
+
+def redondear_compra(necesidad, moq=0, multiplo=1):
+    """Llevar la necesidad al MOQ (solo si hay que comprar) y al múltiplo de empaque superior"""
+    # Operaciones en el lugar: con millones de filas, cada temporal cuesta tanto como la operación
+    necesidad = np.ceil(necesidad)
+    np.maximum(necesidad, 0, out=necesidad)
+    if np.any(np.asarray(moq) > 0):
+        np.maximum(necesidad, moq, out=necesidad, where=necesidad > 0)
+    multiplo = np.maximum(np.asarray(multiplo, dtype=float), 1)
+    if np.any(multiplo > 1):
+        np.divide(necesidad, multiplo, out=necesidad)
+        np.ceil(necesidad, out=necesidad)
+        np.multiply(necesidad, multiplo, out=necesidad)
+    return necesidad
+
+
+def calcular_cantidades(consumo_predicho, demanda_std, saldo, lead_time_dias=30, nivel_servicio=0.95,
+                        moq=0, multiplo=1):
+    """Cantidad a comprar de cada fila en una sola pasada vectorizada.
+
+    Los parámetros de política aceptan un escalar o un arreglo con un valor por
+    fila. El z del nivel de servicio sale de la inversa de la normal; la
+    necesidad se lleva al MOQ (solo si hay que comprar) y se redondea hacia
+    arriba al múltiplo de empaque.
+    """
+    stock_seguridad = factor_seguridad(lead_time_dias, nivel_servicio) * demanda_std
+    return redondear_compra(consumo_predicho + stock_seguridad - saldo, moq, multiplo)
+
+
+def politica_por_fila(ids, politicas=None, **por_defecto):
+    """Arreglos de política alineados a las filas de `ids`.
+
+    `politicas` es una tabla con id_insumo y alguna de COLUMNAS_POLITICA; los
+    SKUs que no figuran, o las celdas vacías, toman el valor general.
+    """
+    generales = dict(POLITICA_POR_DEFECTO, **por_defecto)
+    if politicas is None or len(politicas) == 0:
+        return generales
+
+    tabla = politicas.drop_duplicates('id_insumo', keep='last').set_index('id_insumo')
+    ids = pd.Index(ids)
+    if tabla.index.dtype != ids.dtype:
+        # Los archivos de políticas suelen traer los códigos como texto
+        tabla.index = tabla.index.astype(str)
+        ids = ids.astype(str)
+    posiciones = tabla.index.get_indexer(ids)
+    encontrados = posiciones >= 0
+
+    arreglos = {}
+    for columna, valor in generales.items():
+        if columna not in tabla.columns:
+            arreglos[columna] = valor
+            continue
+        valores = np.full(len(ids), valor, dtype=float)
+        valores[encontrados] = tabla[columna].to_numpy(dtype=float)[posiciones[encontrados]]
+        arreglos[columna] = np.where(np.isnan(valores), valor, valores)
+    return arreglos
+
+
+class SimuladorPoliticas:
+    """Base de la política agrupada por SKU una sola vez, para evaluar políticas sin volver a agrupar.
+
+    La base llega ordenada por SKU y mes desde preparar_features; si no, se
+    ordena aquí. Cada evaluación calcula la cantidad de todas las filas en una
+    pasada y la suma por SKU con reduceat.
+    """
+
+    def __init__(self, base):
+        ids = base['id_insumo'].to_numpy()
+        meses = base['mes'].to_numpy()
+        mismo_sku = ids[1:] == ids[:-1]
+        ordenada = base['id_insumo'].is_monotonic_increasing and bool(np.all(~mismo_sku | (meses[1:] > meses[:-1])))
+        if not ordenada:
+            base = base.sort_values(['id_insumo', 'mes'], kind='stable')
+            ids = base['id_insumo'].to_numpy()
+            meses = base['mes'].to_numpy()
+            mismo_sku = ids[1:] == ids[:-1]
+
+        self.meses = meses
+        self.inicios = np.flatnonzero(np.r_[True, ~mismo_sku])
+        self.ultimas = np.r_[self.inicios[1:] - 1, len(ids) - 1]
+        self.filas_por_sku = np.diff(np.r_[self.inicios, len(ids)])
+        self.ids = ids[self.inicios]
+        self.consumo_predicho = base['consumo_predicho'].to_numpy(dtype=float)
+        self.demanda_std = base['demanda_std'].to_numpy(dtype=float)
+        self.saldo = base['saldo final'].to_numpy(dtype=float)
+        # Lo que no depende de la política se calcula una vez
+        self.saldo_final = base['saldo final'].to_numpy()[self.ultimas]
+        self.consumo_medio = np.add.reduceat(self.consumo_predicho, self.inicios) / self.filas_por_sku
+        self.faltante = self.consumo_predicho - self.saldo
+        # Intervalo de la predicción (consumo_p10, ...) si la base lo trae: promedio por SKU de las filas con valor
+        self.intervalos = {}
+        for columna in (c for c in base.columns if c.startswith('consumo_p') and c[len('consumo_p'):].isdigit()):
+            valores = base[columna].to_numpy(dtype=float)
+            con_valor = ~np.isnan(valores)
+            with np.errstate(invalid='ignore'):
+                self.intervalos[columna] = (
+                    np.add.reduceat(np.where(con_valor, valores, 0), self.inicios)
+                    / np.add.reduceat(con_valor.astype(float), self.inicios)
+                )
+
+    def __len__(self):
+        return len(self.ids)
+
+    def cantidades(self, politicas=None, **por_defecto):
+        """Cantidad a comprar de cada fila con la política dada (tabla por SKU y valores generales)"""
+        # La política se resuelve por SKU (el z, una vez por SKU) y recién después se repite a sus filas
+        politica = politica_por_fila(self.ids, politicas, **por_defecto)
+        factor = factor_seguridad(politica['lead_time_dias'], politica['nivel_servicio'])
+        por_fila = {
+            'factor': factor, 'moq': politica['moq'], 'multiplo': politica['multiplo']
+        }
+        por_fila = {
+            clave: np.repeat(valor, self.filas_por_sku) if np.ndim(valor) else valor
+            for clave, valor in por_fila.items()
+        }
+        necesidad = por_fila['factor'] * self.demanda_std
+        necesidad += self.faltante
+        return redondear_compra(necesidad, por_fila['moq'], por_fila['multiplo'])
+
+    def sumar_por_sku(self, por_fila):
+        return np.add.reduceat(por_fila, self.inicios)
+
+
+def leer_politicas(archivo):
+    """Leer una tabla de políticas por SKU desde CSV o Excel (ruta o archivo subido)"""
+    nombre = getattr(archivo, 'name', archivo)
+    if os.path.splitext(str(nombre))[1].lower() in ('.xlsx', '.xls'):
+        politicas = pd.read_excel(archivo)
+    else:
+        politicas = pd.read_csv(archivo)
+    politicas.columns = [str(c).strip().lower() for c in politicas.columns]
+
+    columnas = [c for c in COLUMNAS_POLITICA if c in politicas.columns]
+    if 'id_insumo' not in politicas.columns or not columnas:
+        raise ValueError(
+            f"La tabla de políticas necesita id_insumo y al menos una de: {', '.join(COLUMNAS_POLITICA)}"
+        )
+    politicas = politicas[['id_insumo'] + columnas]
+    politicas[columnas] = politicas[columnas].apply(pd.to_numeric, errors='coerce')
+    return politicas
@@ -1,93 +1,376 @@
 import pandas as pd
 import numpy as np
-from sklearn.ensemble import RandomForestRegressor, GradientBoostingRegressor
+from sklearn.ensemble import RandomForestRegressor, GradientBoostingRegressor, HistGradientBoostingRegressor
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import mean_absolute_error, mean_squared_error
 from sklearn.preprocessing import StandardScaler
 import joblib
 import os
+import uuid
 import warnings
+from concurrent.futures import ProcessPoolExecutor
 warnings.filterwarnings('ignore')
 from datetime import datetime
+from utils.trazas import TrazadorEtapas, trazar_etapa
+from utils.almacen_resultados import ARCHIVO_VERSION_MODELO, leer_version_modelo
+from utils.motores import MotorIntermitente, UMBRAL_INTERMITENCIA, fraccion_meses_sin_consumo
+from utils.politicas import SimuladorPoliticas, variabilidad_cuantiles, variabilidad_demanda
+
+# Clasificación de Syntetos-Boylan: intervalo medio entre meses con demanda (ADI)
+# y variabilidad del tamaño de la demanda (CV²)
+UMBRAL_ADI = 1.32
+UMBRAL_CV2 = 0.49
+
+# Segmentos con menos filas de entrenamiento se entrenan junto al segmento más grande
+MIN_FILAS_SEGMENTO = 200
+
+
+# Hiperparámetros del ensemble cuando no hay un ajuste guardado
+PARAMETROS_ENSEMBLE = {
+    'rf': {'n_estimators': 100, 'max_depth': 10},
+    'gb': {'n_estimators': 100, 'max_depth': 6},
+    'hgb': {'max_iter': 100, 'max_depth': 6}
+}
+
+# Reentrenamiento incremental: árboles y etapas que agrega cada actualización, cuánto puede
+# crecer el error en los meses nuevos (sobre el de referencia) antes de reentrenar desde cero
+# y cuántas actualizaciones seguidas se permiten antes de un reentrenamiento completo
+ARBOLES_POR_ACTUALIZACION = 20
+ETAPAS_POR_ACTUALIZACION = 20
+MESES_VENTANA_ACTUALIZACION = 6
+UMBRAL_DERIVA = 1.5
+MAX_ACTUALIZACIONES = 6
+
+# Backend del miembro de boosting: 'gb' (cortes exactos) o 'hist' (histogramas, multihilo, admite NaN)
+BACKENDS_GB = ('gb', 'hist')
+
+# Variabilidad para el stock de seguridad: la histórica del SKU (consumo_std) o la del intervalo
+# P10–P90 de los árboles del bosque en cada predicción
+FUENTES_VARIABILIDAD = ('historica', 'cuantiles')
+CUANTILES_INTERVALO = (0.1, 0.5, 0.9)
+
+# Lags que faltan en los primeros meses de cada SKU; solo el backend 'hist' los acepta vacíos
+COLUMNAS_LAG_OPCIONALES = [
+    'consumo_lag_1', 'consumo_lag_2', 'consumo_lag_3',
+    'saldo_lag_1', 'saldo_lag_2', 'saldo_lag_3'
+]
+
+
+def crear_boosting(parametros=None, backend_gb='gb'):
+    """Miembro de boosting del ensemble según el backend"""
+    parametros = parametros or {}
+    if backend_gb == 'hist':
+        return HistGradientBoostingRegressor(random_state=42, **parametros.get('hgb', PARAMETROS_ENSEMBLE['hgb']))
+    return GradientBoostingRegressor(random_state=42, **parametros.get('gb', PARAMETROS_ENSEMBLE['gb']))
+
+
+def ajustar_ensemble(X, y, parametros=None, backend_gb='gb'):
+    """Ajustar el par RF + GB (función de módulo para poder ejecutarse en otro proceso)"""
+    parametros = parametros or {}
+    rf_model = RandomForestRegressor(random_state=42, **parametros.get('rf', PARAMETROS_ENSEMBLE['rf']))
+    gb_model = crear_boosting(parametros, backend_gb)
+    
+    # El bosque no admite NaN: se entrena con las filas que tienen todos los lags
+    completas = ~np.isnan(X).any(axis=1)
+    if completas.all():
+        rf_model.fit(X, y)
+    else:
+        rf_model.fit(X[completas], y[completas])
+    gb_model.fit(X, y)
+    return {'rf': rf_model, 'gb': gb_model}
+
+
+def actualizar_ensemble(modelo, X, y, nuevas, backend_gb='gb'):
+    """Continuar un ensemble ya ajustado con las filas nuevas (máscara `nuevas` sobre X).
+
+    El bosque agrega árboles entrenados solo con las filas nuevas y el boosting
+    clásico sigue agregando etapas desde su estado guardado. El warm_start de
+    HistGradientBoosting solo es válido con los mismos datos (vuelve a calcular
+    los histogramas), así que ese backend se reajusta con todas las filas.
+    """
+    rf_model = modelo['rf']
+    completas = nuevas & ~np.isnan(X).any(axis=1)
+    if completas.any():
+        rf_model.set_params(warm_start=True, n_estimators=len(rf_model.estimators_) + ARBOLES_POR_ACTUALIZACION)
+        rf_model.fit(X[completas], y[completas])
+    
+    gb_model = modelo['gb']
+    if backend_gb == 'hist':
+        gb_model.fit(X, y)
+    else:
+        gb_model.set_params(warm_start=True, n_estimators=gb_model.n_estimators_ + ETAPAS_POR_ACTUALIZACION)
+        gb_model.fit(X[nuevas], y[nuevas])
+    return modelo
+
+
+def backend_del_modelo(modelo):
+    """Backend de boosting con el que se entrenó un modelo guardado"""
+    if 'segmentos' in modelo:
+        modelo = next(iter(modelo['segmentos'].values()))
+    return 'hist' if isinstance(modelo['gb'], HistGradientBoostingRegressor) else 'gb'
+
+
+def predecir_arboles(rf_model, X):
+    """Predicción de cada árbol del bosque en una matriz (árboles × filas) reservada de una vez.
+
+    X se convierte a float32 una sola vez, como hace el bosque por dentro, y
+    cada árbol escribe su fila; el promedio de la matriz es la predicción del bosque.
+    """
+    X = np.ascontiguousarray(X, dtype=np.float32)
+    arboles = np.empty((len(rf_model.estimators_), len(X)))
+    for i, arbol in enumerate(rf_model.estimators_):
+        arboles[i] = arbol.tree_.predict(X).ravel()
+    return arboles
+
+
+def cuantiles_arboles(arboles, cuantiles=CUANTILES_INTERVALO):
+    """Cuantiles de cada columna de la matriz de árboles (interpolación lineal, como np.quantile).
+
+    Ordena la matriz en el lugar: ordenar y leer las posiciones es varias veces
+    más rápido que np.quantile sobre el eje de los árboles.
+    """
+    arboles.sort(axis=0)
+    posiciones = np.asarray(cuantiles) * (len(arboles) - 1)
+    inferiores = np.floor(posiciones).astype(int)
+    superiores = np.minimum(inferiores + 1, len(arboles) - 1)
+    fraccion = (posiciones - inferiores)[:, None]
+    return arboles[inferiores] + fraccion * (arboles[superiores] - arboles[inferiores])
+
+
+def predecir_ensemble(modelo, X, cuantiles=None):
+    """Promedio RF + GB; las filas con lags vacíos (backend 'hist') usan solo el boosting.
+
+    Con `cuantiles` devuelve además esos cuantiles de los árboles (cuantiles ×
+    filas), corridos para quedar centrados en la predicción del ensemble; el
+    bosque sale de la misma matriz, sin predecir dos veces. Las filas que el
+    bosque no predice quedan en NaN.
+    """
+    prediccion = modelo['gb'].predict(X)
+    completas = ~np.isnan(X).any(axis=1)
+    if cuantiles is None:
+        if completas.all():
+            return (modelo['rf'].predict(X) + prediccion) / 2
+        if completas.any():
+            prediccion[completas] = (modelo['rf'].predict(X[completas]) + prediccion[completas]) / 2
+        return prediccion
+    
+    intervalos = np.full((len(cuantiles), len(X)), np.nan)
+    if completas.any():
+        arboles = predecir_arboles(modelo['rf'], X if completas.all() else X[completas])
+        prediccion_rf = arboles.mean(axis=0)
+        ensemble = (prediccion_rf + prediccion[completas]) / 2
+        prediccion[completas] = ensemble
+        intervalos[:, completas] = cuantiles_arboles(arboles, cuantiles) + (ensemble - prediccion_rf)
+    return prediccion, intervalos
+
+
+def calcular_metricas(y_real, y_pred):
+    """MAE, RMSE y sesgo sobre todas las filas; MAPE y % dentro de ±20% solo donde hubo consumo"""
+    y_real = np.asarray(y_real, dtype=float)
+    y_pred = np.asarray(y_pred, dtype=float)
+    metricas = {
+        'filas': len(y_real),
+        'mae': mean_absolute_error(y_real, y_pred) if len(y_real) else np.nan,
+        'rmse': np.sqrt(mean_squared_error(y_real, y_pred)) if len(y_real) else np.nan,
+        'sesgo': float(np.mean(y_pred - y_real)) if len(y_real) else np.nan,
+        'mape': np.nan,
+        'dentro_20pct': np.nan
+    }
+    con_consumo = y_real != 0
+    if con_consumo.any():
+        error_relativo = np.abs((y_real[con_consumo] - y_pred[con_consumo]) / y_real[con_consumo])
+        metricas['mape'] = np.mean(error_relativo) * 100
+        metricas['dentro_20pct'] = np.mean(error_relativo <= 0.20) * 100
+    return metricas
+
+
+def sumar_almacenes(df_almacen):
+    """Dataset mensual por SKU a partir del agregado por (id_insumo, almacen, mes).
+
+    El consumo se suma entre almacenes. El saldo es un stock: en cada mes del
+    SKU vale la suma del último saldo conocido de cada almacén, también de los
+    que no tuvieron movimientos ese mes. Se suma la variación del saldo de cada
+    almacén y se acumula por SKU, sin expandir todos los meses de todos los almacenes.
+    """
+    if len(df_almacen) == 0:
+        return pd.DataFrame()
+    df_almacen = df_almacen.sort_values(['id_insumo', 'almacen', 'mes'], kind='stable')
+    saldo = df_almacen['saldo final']
+    anterior = saldo.groupby(
+        [df_almacen['id_insumo'], df_almacen['almacen']], observed=True, sort=False
+    ).shift(fill_value=0)
+    mensual = df_almacen[['id_insumo', 'mes', 'consumo']].assign(variacion=saldo - anterior).groupby(
+        ['id_insumo', 'mes']
+    ).agg({'consumo': 'sum', 'variacion': 'sum'}).reset_index()
+    mensual['saldo final'] = mensual.groupby('id_insumo')['variacion'].cumsum()
+    return mensual.drop(columns='variacion')
+
+
+def clasificar_segmentos(df):
+    """Segmento de demanda de cada SKU: 'suave', 'erratico', 'intermitente' o 'irregular'"""
+    consumo = df['consumo'].to_numpy(dtype=float)
+    historia = pd.DataFrame({
+        'id_insumo': df['id_insumo'].to_numpy(),
+        'con_demanda': consumo > 0,
+        'demanda': np.where(consumo > 0, consumo, np.nan)
+    })
+    stats = historia.groupby('id_insumo').agg(
+        meses=('con_demanda', 'size'),
+        meses_con_demanda=('con_demanda', 'sum'),
+        demanda_media=('demanda', 'mean'),
+        demanda_std=('demanda', 'std')
+    )
+    
+    # Sin ninguna salida el intervalo entre demandas es infinito: cae en intermitente
+    adi = stats['meses'] / stats['meses_con_demanda'].replace(0, np.nan)
+    adi = adi.fillna(np.inf).to_numpy()
+    cv2 = ((stats['demanda_std'] / stats['demanda_media']) ** 2).fillna(0).to_numpy()
+    
+    segmento = np.select(
+        [(adi < UMBRAL_ADI) & (cv2 < UMBRAL_CV2), adi < UMBRAL_ADI, cv2 < UMBRAL_CV2],
+        ['suave', 'erratico', 'intermitente'],
+        default='irregular'
+    )
+    return pd.Series(segmento, index=stats.index, name='segmento')
     
 
 class PredictorComprasMejorado:
-    def __init__(self, use_log_transform=True):
+    def __init__(self, use_log_transform=True, segmentado=False, motor_intermitente=None, parametros=None,
+                 backend_gb='gb', variabilidad='historica'):
+        if backend_gb not in BACKENDS_GB:
+            raise ValueError(f"Backend de boosting desconocido: {backend_gb}")
+        if variabilidad not in FUENTES_VARIABILIDAD:
+            raise ValueError(f"Fuente de variabilidad desconocida: {variabilidad}")
         self.model = None
+        # Hiperparámetros {'rf': {...}, 'gb' o 'hgb': {...}}; lo que falte usa PARAMETROS_ENSEMBLE
+        self.parametros = parametros
+        self.backend_gb = backend_gb
+        self.ajuste = None
+        self.segmentado = segmentado
+        # 'sba', 'croston' o 'tsb': los SKUs intermitentes no pasan por los árboles
+        self.motor_intermitente = motor_intermitente
+        # 'cuantiles': el stock de seguridad usa el intervalo P10–P90 de los árboles (ver preparar_base_politica)
+        self.variabilidad = variabilidad
         self.feature_scaler = StandardScaler()
         self.target_scaler = StandardScaler()
         self.use_log_transform = use_log_transform
         self.feature_columns = []
+        self.version_modelo = None
+        self.metricas_entrenamiento = None
+        self.ultima_actualizacion = None
+        # Procesos para entrenar segmentos en paralelo (None = todos los núcleos)
+        self.max_procesos = None
+        self.trazador = TrazadorEtapas()
+        
+    @trazar_etapa()
+    def crear_dataset_mensual(self, df_original, por_almacen=False):
+        """Crear dataset mensual a partir del dataset original.
+        
+        Con `por_almacen` devuelve el agregado por (id_insumo, almacen, mes), de
+        los mismos SKUs; sumar_almacenes lo lleva al dataset por SKU.
+        """
+        df_almacen, _ = self._agregar_bloque_mensual(df_original)
+        return self._filtrar_skus_validos(df_almacen, por_almacen)
+    
+    @trazar_etapa()
+    def crear_dataset_mensual_por_bloques(self, bloques):
+        """Crear dataset mensual plegando el kardex bloque a bloque (memoria acotada)"""
+        df_mensual = None
+        meses_sin_fecha = 0
+        for bloque in bloques:
+            parcial, meses_sin_fecha = self._agregar_bloque_mensual(bloque, meses_sin_fecha)
+            if len(parcial) == 0:
+                continue
+            if df_mensual is None:
+                df_mensual = parcial
+            else:
+                # Los bloques de un almacén llegan en orden de archivo: 'last' conserva su saldo más reciente
+                df_mensual = pd.concat([df_mensual, parcial], ignore_index=True).groupby(
+                    ['id_insumo', 'almacen', 'mes'], observed=True
+                ).agg({
+                    'consumo': 'sum',
+                    'saldo final': 'last'
+                }).reset_index()
         
-    def crear_dataset_mensual(self, df_original):
-        """Crear dataset mensual a partir del dataset original - CORREGIDO"""
-        df = df_original.copy()
+        if df_mensual is None:
+            return pd.DataFrame()
+        return self._filtrar_skus_validos(df_mensual)
+    
+    def _agregar_bloque_mensual(self, df, meses_sin_fecha=0):
+        """Agregar un bloque del kardex por (id_insumo, almacen, mes) sin copiar el bloque completo.
         
+        El saldo final se toma por almacén (cada archivo lleva su propio saldo);
+        sin columna almacen, todo el bloque es un solo almacén. Devuelve el bloque
+        agregado y el contador de registros sin fecha, que se arrastra al
+        siguiente bloque para asignar meses correlativos desde 2023-01.
+        """
         if 'tipo_transac' in df.columns:
             df = df[df['tipo_transac'] != 'SALDO INICIAL']
         
         if len(df) == 0:
-            return pd.DataFrame()
+            return pd.DataFrame(), meses_sin_fecha
         
-        df['consumo'] = 0
+        n = len(df)
+        consumo = np.zeros(n, dtype=int)
         if 'canti salida' in df.columns and 'tipo_transac' in df.columns:
-            mask_salidas = df['tipo_transac'] == 'SALIDAS'
-            df.loc[mask_salidas, 'consumo'] = pd.to_numeric(
-                df.loc[mask_salidas, 'canti salida'], errors='coerce'
-            ).fillna(0)
+            mask_salidas = (df['tipo_transac'] == 'SALIDAS').to_numpy()
+            salidas = pd.to_numeric(df['canti salida'], errors='coerce').fillna(0).to_numpy()
+            consumo = np.where(mask_salidas, salidas, 0)
         
         if 'fecha' in df.columns:
-            df['fecha_dt'] = pd.to_datetime(df['fecha'], errors='coerce', dayfirst=True)
-            df.loc[df['fecha_dt'].notna(), 'mes'] = (
-                df.loc[df['fecha_dt'].notna(), 'fecha_dt'].dt.year * 100 + 
-                df.loc[df['fecha_dt'].notna(), 'fecha_dt'].dt.month
-            ).astype(int)
-            
-            if df['mes'].isna().any():
-                df_sin_fecha = df[df['mes'].isna()].copy()
-                start_year = 2023
-                start_month = 1
-                for i, idx in enumerate(df_sin_fecha.index):
-                    year = start_year + (start_month + i - 1) // 12
-                    month = (start_month + i - 1) % 12 + 1
-                    df_sin_fecha.loc[idx, 'mes'] = year * 100 + month
-                df.update(df_sin_fecha[['mes']])
+            fecha_dt = pd.to_datetime(df['fecha'], errors='coerce', dayfirst=True)
+            mes = (fecha_dt.dt.year * 100 + fecha_dt.dt.month).to_numpy(dtype=float, copy=True)
         else:
-            df = df.reset_index(drop=True)
-            start_year = 2023
-            start_month = 1
-            for i in range(len(df)):
-                year = start_year + (start_month + i - 1) // 12
-                month = (start_month + i - 1) % 12 + 1
-                df.loc[i, 'mes'] = year * 100 + month
-        
-        if 'mes' not in df.columns:
-            return pd.DataFrame()
+            mes = np.full(n, np.nan)
         
-        df['mes'] = pd.to_numeric(df['mes'], errors='coerce').fillna(202301).astype(int)
+        sin_fecha = np.isnan(mes)
+        total_sin_fecha = int(sin_fecha.sum())
+        if total_sin_fecha > 0:
+            correlativo = meses_sin_fecha + np.arange(total_sin_fecha)
+            mes[sin_fecha] = (2023 + correlativo // 12) * 100 + correlativo % 12 + 1
+            meses_sin_fecha += total_sin_fecha
         
         if 'saldo final' in df.columns:
-            df['saldo final'] = pd.to_numeric(df['saldo final'], errors='coerce').fillna(0)
+            saldo = pd.to_numeric(df['saldo final'], errors='coerce').fillna(0).to_numpy()
         else:
-            df['saldo final'] = 0
+            saldo = np.zeros(n, dtype=int)
         
-        df = df[df['id_insumo'].notna()]
-        if len(df) == 0:
-            return pd.DataFrame()
+        validos = df['id_insumo'].notna().to_numpy()
+        if not validos.any():
+            return pd.DataFrame(), meses_sin_fecha
+        
+        almacen = df['almacen'][validos].astype(str).to_numpy() if 'almacen' in df.columns else ''
+        bloque = pd.DataFrame({
+            'id_insumo': df['id_insumo'][validos],
+            'almacen': almacen,
+            'mes': mes[validos].astype(int),
+            'consumo': consumo[validos],
+            'saldo final': saldo[validos]
+        })
         
-        df_mensual = df.groupby(['id_insumo', 'mes']).agg({
+        df_mensual = bloque.groupby(['id_insumo', 'almacen', 'mes']).agg({
             'consumo': 'sum',
             'saldo final': 'last'
         }).reset_index()
+        return df_mensual, meses_sin_fecha
+    
+    def _filtrar_skus_validos(self, df_almacen, por_almacen=False):
+        """Sumar los almacenes y conservar solo los SKUs con al menos dos meses de historia"""
+        df_mensual = sumar_almacenes(df_almacen)
+        if len(df_mensual) == 0:
+            return pd.DataFrame()
         
         sku_counts = df_mensual['id_insumo'].value_counts()
         skus_validos = sku_counts[sku_counts >= 2].index
         if len(skus_validos) == 0:
             return pd.DataFrame()
         
+        if por_almacen:
+            return df_almacen[df_almacen['id_insumo'].isin(skus_validos)].reset_index(drop=True)
         df_mensual = df_mensual[df_mensual['id_insumo'].isin(skus_validos)]
         return df_mensual
             
+    @trazar_etapa()
     def preparar_features(self, df_mensual):
         """Preparar características para el modelo"""
         if len(df_mensual) == 0:
@@ -132,7 +415,14 @@ class PredictorComprasMejorado:
         ]
         
         self.feature_columns = [col for col in self.feature_columns if col in df.columns]
-        df_clean = df.dropna(subset=self.feature_columns)
+        obligatorias = self.feature_columns
+        if self.backend_gb == 'hist':
+            # Los primeros meses de cada SKU se conservan con los lags vacíos (no un lag sin ningún valor)
+            obligatorias = [
+                col for col in self.feature_columns
+                if col not in COLUMNAS_LAG_OPCIONALES or df[col].isna().all()
+            ]
+        df_clean = df.dropna(subset=obligatorias)
         return df_clean
     
     def transformar_target(self, y):
@@ -147,139 +437,368 @@ class PredictorComprasMejorado:
         else:
             return self.target_scaler.inverse_transform(y_transformed.reshape(-1, 1)).flatten()
     
+    @trazar_etapa()
     def entrenar_modelo(self, df_preparado):
         if len(df_preparado) == 0:
             raise ValueError("No hay datos suficientes")
-            
-        X = df_preparado[self.feature_columns]
-        y_original = df_preparado['consumo']
-        y_transformed = self.transformar_target(y_original)
-        
-        if len(X) < 10:
-            X_train, X_test = X, X
-            y_train, y_test_original = y_transformed, y_original
-            y_test = y_original
+        
+        if len(df_preparado) < 10:
+            indices_train, indices_test = df_preparado.index, df_preparado.index
         else:
-            indices = df_preparado.index
-            X_train, X_test, y_train, y_test, indices_train, indices_test = train_test_split(
-                X, y_original, indices, test_size=0.2, random_state=42
+            indices_train, indices_test = train_test_split(
+                df_preparado.index, test_size=0.2, random_state=42
             )
-            y_train_transformed = self.transformar_target(y_train)
-            y_test_original = y_test
-        
-        X_train_scaled = self.feature_scaler.fit_transform(X_train)
-        rf_model = RandomForestRegressor(n_estimators=100, random_state=42, max_depth=10)
-        gb_model = GradientBoostingRegressor(n_estimators=100, random_state=42, max_depth=6)
-        
-        rf_model.fit(X_train_scaled, y_train_transformed)
-        gb_model.fit(X_train_scaled, y_train_transformed)
-        self.model = {'rf': rf_model, 'gb': gb_model}
-        
-        if len(X_test) > 0:
-            X_test_scaled = self.feature_scaler.transform(X_test)
-            y_pred_rf_transformed = rf_model.predict(X_test_scaled)
-            y_pred_gb_transformed = gb_model.predict(X_test_scaled)
-            y_pred_ensemble_transformed = (y_pred_rf_transformed + y_pred_gb_transformed) / 2
-            y_pred_ensemble_original = self.revertir_target(y_pred_ensemble_transformed)
-            mae = mean_absolute_error(y_test_original, y_pred_ensemble_original)
-            rmse = np.sqrt(mean_squared_error(y_test_original, y_pred_ensemble_original))
-            mask = y_test_original != 0
-            y_real_nonzero = y_test_original[mask]
-            y_pred_nonzero = y_pred_ensemble_original[mask]
-            if len(y_real_nonzero) > 0:
-                mape = np.mean(np.abs((y_real_nonzero - y_pred_nonzero) / y_real_nonzero)) * 100
-                within_20pct = np.mean(np.abs((y_real_nonzero - y_pred_nonzero) / y_real_nonzero) <= 0.20) * 100
+        
+        # El segmento se calcula con toda la historia del SKU, igual que al predecir
+        self.ajustar_modelo(df_preparado.loc[indices_train], df_historia=df_preparado)
+        
+        df_test = df_preparado.loc[indices_test]
+        X_test_scaled = self.feature_scaler.transform(df_test[self.feature_columns])
+        y_pred = self.revertir_target(self._predecir_transformado(X_test_scaled, df_test))
+        self.metricas_entrenamiento = calcular_metricas(df_test['consumo'].to_numpy(), y_pred)
+        # Estado para las actualizaciones incrementales: hasta qué mes se entrenó y con qué error
+        self.model['entrenamiento'] = {
+            'ultimo_mes': int(df_preparado['mes'].max()),
+            'mae_referencia': self.metricas_entrenamiento['mae'],
+            'actualizaciones': 0
+        }
+        return self.model
+    
+    @trazar_etapa()
+    def actualizar_modelo(self, df_preparado):
+        """Reentrenamiento incremental con los meses posteriores al último entrenamiento.
+        
+        Antes de actualizar se mide el error del modelo en los meses nuevos; si
+        supera UMBRAL_DERIVA veces el error de referencia, si el modelo ya acumula
+        MAX_ACTUALIZACIONES o si cambió la configuración, se reentrena desde cero.
+        """
+        inicio = datetime.now()
+        estado = self.model.get('entrenamiento') if self.model is not None else None
+        resumen = {'modo': 'completo', 'motivo': None, 'filas_nuevas': 0, 'deriva': np.nan}
+        nuevas = None
+        
+        if estado is None:
+            resumen['motivo'] = "el modelo no guarda su estado de entrenamiento"
+        elif self.segmentado != ('segmentos' in self.model) or self.backend_gb != backend_del_modelo(self.model):
+            resumen['motivo'] = "cambió la configuración del modelo"
+        else:
+            nuevas = df_preparado['mes'].to_numpy() > estado['ultimo_mes']
+            resumen['filas_nuevas'] = int(nuevas.sum())
+            if not nuevas.any():
+                resumen.update(modo='sin_cambios', motivo="no hay meses nuevos")
+                self.ultima_actualizacion = resumen
+                return resumen
+            
+            # Deriva: error en los meses nuevos, que el modelo todavía no vio
+            X_scaled = self.feature_scaler.transform(df_preparado[self.feature_columns])
+            df_nuevo = df_preparado[nuevas]
+            y_pred = self.revertir_target(self._predecir_transformado(X_scaled[nuevas], df_nuevo))
+            mae_nuevo = calcular_metricas(df_nuevo['consumo'].to_numpy(), y_pred)['mae']
+            resumen['deriva'] = mae_nuevo / estado['mae_referencia'] if estado['mae_referencia'] > 0 else np.inf
+            if resumen['deriva'] > UMBRAL_DERIVA:
+                resumen['motivo'] = f"el error en los meses nuevos es {resumen['deriva']:.2f} veces el de referencia"
+            elif estado['actualizaciones'] >= MAX_ACTUALIZACIONES:
+                resumen['motivo'] = f"el modelo ya acumula {MAX_ACTUALIZACIONES} actualizaciones"
             else:
-                mape = np.nan
-                within_20pct = np.nan
-            errores = np.abs(y_test_original - y_pred_ensemble_original)
+                resumen['modo'] = 'incremental'
         
+        if resumen['modo'] == 'completo':
+            self.entrenar_modelo(df_preparado)
+        else:
+            # Los árboles y etapas nuevos se ajustan con los meses nuevos y los inmediatamente anteriores:
+            # un solo mes es muy poca muestra y los árboles agregados quedan con mucha varianza
+            meses = df_preparado['mes'].to_numpy()
+            meses_nuevos = np.unique(meses[nuevas])
+            ventana = np.unique(meses)[-max(MESES_VENTANA_ACTUALIZACION, len(meses_nuevos)):]
+            recientes = np.isin(meses, ventana)
+            
+            # El escalador y la transformación del objetivo quedan fijos: no se reajustan con los meses nuevos
+            consumo = df_preparado['consumo'].to_numpy(dtype=float)
+            if self.use_log_transform:
+                y = np.log1p(consumo)
+            else:
+                y = self.target_scaler.transform(consumo.reshape(-1, 1)).flatten()
+            if 'segmentos' in self.model:
+                destino_filas = self._destino_filas(df_preparado)
+                for nombre, modelo in self.model['segmentos'].items():
+                    filas = destino_filas == nombre
+                    if (filas & nuevas).any():
+                        actualizar_ensemble(modelo, X_scaled[filas], y[filas], recientes[filas], self.backend_gb)
+            else:
+                actualizar_ensemble(self.model, X_scaled, y, recientes, self.backend_gb)
+            estado['ultimo_mes'] = int(df_preparado['mes'].max())
+            estado['actualizaciones'] += 1
+            self.version_modelo = uuid.uuid4().hex[:12]
+        
+        resumen['tiempo_s'] = (datetime.now() - inicio).total_seconds()
+        self.ultima_actualizacion = resumen
+        return resumen
+    
+    def ajustar_modelo(self, df_train, df_historia=None):
+        """Ajustar el escalador y el ensemble (global o por segmento) con las filas de entrenamiento"""
+        inicio = datetime.now()
+        X_train_scaled = self.feature_scaler.fit_transform(df_train[self.feature_columns])
+        y_train = np.asarray(self.transformar_target(df_train['consumo']))
+        if self.segmentado:
+            segmento_sku = clasificar_segmentos(df_historia if df_historia is not None else df_train)
+            self.model = self._entrenar_segmentado(X_train_scaled, y_train, segmento_sku, df_train['id_insumo'])
+        else:
+            self.model = ajustar_ensemble(X_train_scaled, y_train, self.parametros, self.backend_gb)
+        # Identifica este entrenamiento en el almacén de resultados
+        self.version_modelo = uuid.uuid4().hex[:12]
+        if self.ajuste is not None:
+            self.ajuste['tiempo_entrenamiento_s'] = (datetime.now() - inicio).total_seconds()
         return self.model
     
+    def _entrenar_segmentado(self, X_train_scaled, y_train, segmento_sku, ids_train):
+        """Entrenar un ensemble por segmento de demanda, en paralelo en un pool de procesos"""
+        segmento_filas = segmento_sku.reindex(ids_train).to_numpy()
+        nombres, filas = np.unique(segmento_filas, return_counts=True)
+        
+        # Los segmentos pequeños se entrenan con el más grande en lugar de sobreajustar un modelo propio
+        principal = nombres[np.argmax(filas)]
+        mapa_segmentos = {
+            nombre: nombre if total >= MIN_FILAS_SEGMENTO else principal
+            for nombre, total in zip(nombres, filas)
+        }
+        destino_filas = pd.Series(segmento_filas).map(mapa_segmentos).to_numpy()
+        entrenables = sorted(set(mapa_segmentos.values()))
+        
+        trabajos = [
+            (X_train_scaled[destino_filas == nombre], y_train[destino_filas == nombre])
+            for nombre in entrenables
+        ]
+        max_workers = min(len(trabajos), self.max_procesos or os.cpu_count() or 1)
+        parametros = [self.parametros] * len(trabajos)
+        backends = [self.backend_gb] * len(trabajos)
+        if max_workers == 1:
+            modelos = list(map(ajustar_ensemble, *zip(*trabajos), parametros, backends))
+        else:
+            with ProcessPoolExecutor(max_workers=max_workers) as pool:
+                modelos = list(pool.map(ajustar_ensemble, *zip(*trabajos), parametros, backends))
+        
+        return {
+            'segmentos': dict(zip(entrenables, modelos)),
+            'mapa_segmentos': mapa_segmentos,
+            'segmento_sku': segmento_sku,
+            # Un SKU de un segmento no visto al entrenar usa el modelo principal
+            'segmento_principal': principal
+        }
+    
+    @trazar_etapa()
+    def ajustar_hiperparametros(self, df_preparado, n_candidatos=24):
+        """Buscar hiperparámetros por halving sucesivo; se usan en los siguientes entrenamientos"""
+        from utils.ajuste import buscar_hiperparametros
+        
+        # Orden temporal para que la validación cruzada nunca mire meses futuros
+        df_ordenado = df_preparado.sort_values('mes', kind='stable')
+        X = self.feature_scaler.fit_transform(df_ordenado[self.feature_columns])
+        y = np.asarray(self.transformar_target(df_ordenado['consumo']))
+        
+        self.ajuste = buscar_hiperparametros(X, y, n_candidatos=n_candidatos, backend_gb=self.backend_gb)
+        self.parametros = self.ajuste['parametros']
+        return self.ajuste
+    
+    def _predecir_transformado(self, X_scaled, df, cuantiles=None):
+        """Promedio RF + GB en escala transformada; con segmentos, una llamada por modelo.
+        
+        Con `cuantiles` devuelve también los cuantiles de los árboles (ver predecir_ensemble).
+        """
+        if 'segmentos' not in self.model:
+            return predecir_ensemble(self.model, X_scaled, cuantiles)
+        
+        destino_filas = self._destino_filas(df)
+        prediccion = np.empty(len(X_scaled))
+        intervalos = None if cuantiles is None else np.full((len(cuantiles), len(X_scaled)), np.nan)
+        for nombre, modelo in self.model['segmentos'].items():
+            filas = destino_filas == nombre
+            if not filas.any():
+                continue
+            if cuantiles is None:
+                prediccion[filas] = predecir_ensemble(modelo, X_scaled[filas])
+            else:
+                prediccion[filas], intervalos[:, filas] = predecir_ensemble(modelo, X_scaled[filas], cuantiles)
+        return prediccion if cuantiles is None else (prediccion, intervalos)
+    
+    def _destino_filas(self, df):
+        """Modelo de segmento que atiende cada fila"""
+        # El segmento de cada SKU se fija al entrenar; los SKUs nuevos se clasifican con los datos recibidos
+        segmento_sku = self.model.get('segmento_sku')
+        if segmento_sku is None or not df['id_insumo'].isin(segmento_sku.index).all():
+            nuevos = clasificar_segmentos(df)
+            segmento_sku = nuevos if segmento_sku is None else segmento_sku.combine_first(nuevos)
+        return segmento_sku.reindex(df['id_insumo']).map(self.model['mapa_segmentos']).fillna(
+            self.model['segmento_principal']
+        ).to_numpy()
+    
+    @trazar_etapa()
     def predecir_trimestral(self, df_preparado):
+        """Recomendación de los próximos 3 meses (el pronóstico mensual acumulado)"""
         try:
-            resultados_mensuales = []
-            for mes in range(1, 4):
-                resultado_mes = self.calcular_cantidad_comprar(df_preparado)
-                resultado_mes['mes_del_trimestre'] = mes
-                resultados_mensuales.append(resultado_mes)
-            df_trimestral = pd.concat(resultados_mensuales, ignore_index=True)
-            resultados_agrupados = df_trimestral.groupby('id_insumo').agg({
-                'consumo_predicho': 'sum',
-                'cantidad_comprar': 'sum',
-                'saldo final': 'last',
-                'prioridad': 'first'
-            }).reset_index()
-            resultados_agrupados['consumo_trimestral_predicho'] = resultados_agrupados['consumo_predicho']
-            resultados_agrupados['cantidad_comprar_trimestral'] = resultados_agrupados['cantidad_comprar']
-            return resultados_agrupados
+            return self._acumular_horizonte(self.calcular_cantidad_comprar(df_preparado), 3, 'trimestral')
         except Exception as e:
             return pd.DataFrame()
 
+    @trazar_etapa()
     def predecir_anual(self, df_preparado):
+        """Recomendación de los próximos 12 meses (el pronóstico mensual acumulado)"""
         try:
-            resultados_mensuales = []
-            for mes in range(1, 13):
-                resultado_mes = self.calcular_cantidad_comprar(df_preparado)
-                resultado_mes['mes_del_año'] = mes
-                resultados_mensuales.append(resultado_mes)
-            df_anual = pd.concat(resultados_mensuales, ignore_index=True)
-            resultados_agrupados = df_anual.groupby('id_insumo').agg({
-                'consumo_predicho': 'sum',
-                'cantidad_comprar': 'sum',
-                'saldo final': 'last',
-                'prioridad': 'first'
-            }).reset_index()
-            resultados_agrupados['consumo_anual_predicho'] = resultados_agrupados['consumo_predicho']
-            resultados_agrupados['cantidad_comprar_anual'] = resultados_agrupados['cantidad_comprar']
-            return resultados_agrupados
+            return self._acumular_horizonte(self.calcular_cantidad_comprar(df_preparado), 12, 'anual')
         except Exception as e:
             return pd.DataFrame()
     
-    def calcular_cantidad_comprar(self, df_preparado, lead_time_dias=30, nivel_servicio=0.95):
+    def _acumular_horizonte(self, mensual, meses, nombre):
+        """Resultados de un horizonte de varios meses a partir de los mensuales"""
+        acumulado = mensual[['id_insumo', 'consumo_predicho', 'cantidad_comprar', 'saldo final', 'prioridad']].copy()
+        acumulado['consumo_predicho'] *= meses
+        acumulado['cantidad_comprar'] *= meses
+        acumulado[f'consumo_{nombre}_predicho'] = acumulado['consumo_predicho']
+        acumulado[f'cantidad_comprar_{nombre}'] = acumulado['cantidad_comprar']
+        return acumulado
+    
+    @trazar_etapa()
+    def calcular_cantidad_comprar(self, df_preparado, lead_time_dias=30, nivel_servicio=0.95, politicas=None):
+        base = self.preparar_base_politica(df_preparado)
+        return self.aplicar_politica(
+            base, politicas, lead_time_dias=lead_time_dias, nivel_servicio=nivel_servicio
+        )['resultados']
+    
+    @trazar_etapa()
+    def preparar_base_politica(self, df_preparado):
+        """Lo que la política de compra necesita de cada fila; es la única parte que usa el modelo.
+        
+        Con variabilidad='cuantiles' la base trae el intervalo P10/P50/P90 de cada
+        predicción y demanda_std sale de ese intervalo; las filas sin intervalo
+        (motor intermitente o lags vacíos) conservan la variabilidad histórica.
+        """
         if self.model is None:
             raise ValueError("El modelo debe ser entrenado primero")
         
-        df_resultados = df_preparado.copy()
-        X = df_resultados[self.feature_columns]
-        X_scaled = self.feature_scaler.transform(X)
-        pred_rf = self.model['rf'].predict(X_scaled)
-        pred_gb = self.model['gb'].predict(X_scaled)
-        consumo_predicho_transformed = (pred_rf + pred_gb) / 2
-        consumo_predicho = self.revertir_target(consumo_predicho_transformed)
-        df_resultados['consumo_predicho'] = consumo_predicho
-        df_resultados['cantidad_comprar'] = self._calcular_recomendacion_compra(
-            df_resultados, lead_time_dias, nivel_servicio
-        )
-        df_resultados = self._generar_recomendaciones(df_resultados)
-        df_agrupado = df_resultados.groupby('id_insumo').agg({
-            'consumo_predicho': 'mean',
-            'cantidad_comprar': 'sum',
-            'saldo final': 'last',
-            'recomendacion': lambda x: x.iloc[-1],
-            'prioridad': lambda x: x.iloc[-1]
-        }).reset_index()
-        return df_agrupado
-        
-    def _calcular_recomendacion_compra(self, df, lead_time, nivel_servicio):
-        z_score = 1.645 if nivel_servicio == 0.95 else 1.282
-        demanda_std = df['consumo_std'].fillna(df['consumo_mean'] * 0.3)
-        demanda_std = np.where(demanda_std == 0, df['consumo_mean'] * 0.1, demanda_std)
-        stock_seguridad = z_score * demanda_std * np.sqrt(lead_time / 30)
-        inventario_objetivo = df['consumo_predicho'] + stock_seguridad
-        cantidad_comprar = inventario_objetivo - df['saldo final']
-        cantidad_comprar = np.where(cantidad_comprar < 0, 0, cantidad_comprar)
-        cantidad_comprar = np.maximum(cantidad_comprar, 0)
-        cantidad_comprar = np.ceil(cantidad_comprar)
-        return cantidad_comprar
+        demanda_std = variabilidad_demanda(df_preparado['consumo_mean'], df_preparado['consumo_std'])
+        if self.variabilidad != 'cuantiles':
+            consumo_predicho = self.pronosticar_consumo(df_preparado)
+            intervalos = {}
+        else:
+            consumo_predicho, cuantiles = self.pronosticar_consumo(df_preparado, CUANTILES_INTERVALO)
+            intervalos = {f'consumo_p{round(q * 100)}': valores for q, valores in zip(CUANTILES_INTERVALO, cuantiles)}
+            desde_intervalo = variabilidad_cuantiles(cuantiles[0], cuantiles[-1])
+            demanda_std = np.where(np.isnan(desde_intervalo), demanda_std, desde_intervalo)
+        
+        return pd.DataFrame({
+            'id_insumo': df_preparado['id_insumo'].to_numpy(),
+            'mes': df_preparado['mes'].to_numpy(),
+            'consumo_predicho': consumo_predicho,
+            'demanda_std': demanda_std,
+            'saldo final': df_preparado['saldo final'].to_numpy(),
+            **intervalos
+        })
+    
+    @trazar_etapa()
+    def aplicar_politica(self, base, politicas=None, **por_defecto):
+        """Resultados mensual, trimestral y anual de una política de compra, sin volver a predecir.
+        
+        `base` es la salida de preparar_base_politica o un SimuladorPoliticas ya
+        agrupado (para evaluar varias políticas sobre la misma base). `politicas`
+        es una tabla por SKU (ver utils.politicas); lead_time_dias, nivel_servicio,
+        moq y multiplo son los valores para los SKUs sin fila propia.
+        """
+        simulador = base if isinstance(base, SimuladorPoliticas) else SimuladorPoliticas(base)
+        por_fila = simulador.cantidades(politicas, **por_defecto)
+        
+        # La recomendación y la prioridad de cada SKU son las de su último mes: solo se calculan ahí
+        ultimas = simulador.ultimas
+        df_ultimas = self._generar_recomendaciones(pd.DataFrame({
+            'consumo_predicho': simulador.consumo_predicho[ultimas],
+            'saldo final': simulador.saldo[ultimas],
+            'cantidad_comprar': por_fila[ultimas]
+        }))
+        df_agrupado = pd.DataFrame({
+            'id_insumo': simulador.ids,
+            'consumo_predicho': simulador.consumo_medio,
+            'cantidad_comprar': simulador.sumar_por_sku(por_fila),
+            'saldo final': simulador.saldo_final,
+            'recomendacion': df_ultimas['recomendacion'].to_numpy(),
+            'prioridad': df_ultimas['prioridad'].to_numpy(),
+            **simulador.intervalos
+        })
+        return {
+            'resultados': df_agrupado,
+            'resultados_trimestrales': self._acumular_horizonte(df_agrupado, 3, 'trimestral'),
+            'resultados_anuales': self._acumular_horizonte(df_agrupado, 12, 'anual')
+        }
+        
+    def pronosticar_consumo(self, df, cuantiles=None):
+        """Consumo predicho de cada fila, eligiendo el motor por SKU según su fracción de meses sin consumo.
+        
+        Con `cuantiles` (p. ej. CUANTILES_INTERVALO) devuelve también el intervalo de
+        los árboles en unidades de consumo (cuantiles × filas, NaN donde no hay bosque).
+        """
+        consumo_predicho = np.empty(len(df))
+        intervalos = None if cuantiles is None else np.full((len(cuantiles), len(df)), np.nan)
+        intermitentes = np.zeros(len(df), dtype=bool)
+        if self.motor_intermitente:
+            intermitentes = fraccion_meses_sin_consumo(df) >= UMBRAL_INTERMITENCIA
+            if intermitentes.any():
+                consumo_predicho[intermitentes] = MotorIntermitente(self.motor_intermitente).predecir(df[intermitentes])
+        
+        if not intermitentes.all():
+            resto = df[~intermitentes]
+            X_scaled = self.feature_scaler.transform(resto[self.feature_columns])
+            if cuantiles is None:
+                consumo_predicho[~intermitentes] = self.revertir_target(self._predecir_transformado(X_scaled, resto))
+            else:
+                prediccion, cuantiles_resto = self._predecir_transformado(X_scaled, resto, cuantiles)
+                consumo_predicho[~intermitentes] = self.revertir_target(prediccion)
+                # La transformación es monótona: los cuantiles se revierten directamente
+                intervalos[:, ~intermitentes] = self.revertir_target(cuantiles_resto.ravel()).reshape(cuantiles_resto.shape)
+        return consumo_predicho if cuantiles is None else (consumo_predicho, intervalos)
+
+    def dispersion_arboles(self, df):
+        """Desviación entre los árboles del bosque en cada fila, en unidades de consumo.
+
+        Es la incertidumbre del propio modelo; las filas que el bosque no predice
+        (lags vacíos con el backend 'hist') quedan en 0.
+        """
+        X_scaled = self.feature_scaler.transform(df[self.feature_columns])
+        if 'segmentos' not in self.model:
+            return self._dispersion_bosque(self.model['rf'], X_scaled)
+
+        destino_filas = self._destino_filas(df)
+        dispersion = np.zeros(len(X_scaled))
+        for nombre, modelo in self.model['segmentos'].items():
+            filas = destino_filas == nombre
+            if filas.any():
+                dispersion[filas] = self._dispersion_bosque(modelo['rf'], X_scaled[filas])
+        return dispersion
+
+    def _dispersion_bosque(self, rf_model, X_scaled):
+        dispersion = np.zeros(len(X_scaled))
+        completas = ~np.isnan(X_scaled).any(axis=1)
+        if completas.any():
+            # Cada árbol se revierte a unidades de consumo antes de medir la dispersión
+            arboles = predecir_arboles(rf_model, X_scaled[completas])
+            dispersion[completas] = self.revertir_target(arboles.ravel()).reshape(arboles.shape).std(axis=0)
+        return dispersion
+
+    def clave_resultados(self, version=None):
+        """Versión bajo la que se guardan los resultados: modelo más opciones de inferencia"""
+        version = version or self.version_modelo
+        if version and self.motor_intermitente:
+            version = f"{version}-{self.motor_intermitente}"
+        if version and self.variabilidad != 'historica':
+            version = f"{version}-{self.variabilidad}"
+        return version
     
     def _generar_recomendaciones(self, df):
+        cantidad = df['cantidad_comprar'].to_numpy()
+        consumo = df['consumo_predicho'].to_numpy()
+        saldo = df['saldo final'].to_numpy()
         condiciones = [
-            (df['cantidad_comprar'] == 0) & (df['saldo final'] > df['consumo_predicho'] * 2),
-            (df['cantidad_comprar'] == 0) & (df['saldo final'] > df['consumo_predicho']),
-            (df['cantidad_comprar'] > 0) & (df['cantidad_comprar'] <= df['consumo_predicho'] * 0.5),
-            (df['cantidad_comprar'] > df['consumo_predicho'] * 0.5) & (df['cantidad_comprar'] <= df['consumo_predicho'] * 1.5),
-            (df['cantidad_comprar'] > df['consumo_predicho'] * 1.5)
+            (cantidad == 0) & (saldo > consumo * 2),
+            (cantidad == 0) & (saldo > consumo),
+            (cantidad > 0) & (cantidad <= consumo * 0.5),
+            (cantidad > consumo * 0.5) & (cantidad <= consumo * 1.5),
+            (cantidad > consumo * 1.5)
         ]
         opciones = [
             'NO COMPRAR - Exceso de stock',
@@ -288,16 +807,14 @@ class PredictorComprasMejorado:
             'COMPRAR NORMAL - Demanda esperada',
             'COMPRAR EXTRA - Alta demanda/stock bajo'
         ]
-        df['recomendacion'] = np.select(condiciones, opciones, default='REVISAR')
-        df['prioridad'] = np.where(
-            (df['saldo final'] < df['consumo_predicho'] * 0.3) & (df['consumo_predicho'] > 0),
-            'ALTA',
-            np.where(
-                df['saldo final'] > df['consumo_predicho'] * 3,
-                'BAJA',
-                'MEDIA'
-            )
-        )
+        # Se elige sobre arreglos de enteros y se traduce al final: np.select con textos es mucho más lento
+        eleccion = np.select(condiciones, np.arange(len(opciones)), default=len(opciones))
+        df['recomendacion'] = np.array(opciones + ['REVISAR'], dtype=object)[eleccion]
+        df['prioridad'] = np.array(['ALTA', 'BAJA', 'MEDIA'], dtype=object)[np.where(
+            (saldo < consumo * 0.3) & (consumo > 0),
+            0,
+            np.where(saldo > consumo * 3, 1, 2)
+        )]
         return df
 
     def guardar_modelo(self, ruta='modelo_compras/'):
@@ -307,6 +824,12 @@ class PredictorComprasMejorado:
         joblib.dump(self.target_scaler, f'{ruta}target_scaler.pkl')
         joblib.dump(self.feature_columns, f'{ruta}feature_columns.pkl')
         joblib.dump(self.use_log_transform, f'{ruta}config.pkl')
+        with open(f'{ruta}{ARCHIVO_VERSION_MODELO}', 'w') as f:
+            f.write(self.version_modelo or '')
+        if self.ajuste is not None:
+            joblib.dump(self.ajuste, f'{ruta}ajuste.pkl')
+        elif os.path.exists(f'{ruta}ajuste.pkl'):
+            os.remove(f'{ruta}ajuste.pkl')
     
     def cargar_modelo(self, ruta='modelo_compras/'):
         try:
@@ -315,6 +838,16 @@ class PredictorComprasMejorado:
             self.target_scaler = joblib.load(f'{ruta}target_scaler.pkl')
             self.feature_columns = joblib.load(f'{ruta}feature_columns.pkl')
             self.use_log_transform = joblib.load(f'{ruta}config.pkl')
+            self.version_modelo = leer_version_modelo(ruta)
+            self.segmentado = 'segmentos' in self.model
+            self.backend_gb = backend_del_modelo(self.model)
+            if os.path.exists(f'{ruta}ajuste.pkl'):
+                self.ajuste = joblib.load(f'{ruta}ajuste.pkl')
+                self.parametros = self.ajuste['parametros']
+            else:
+                # Modelo guardado sin ajuste: no arrastrar el del modelo anterior
+                self.ajuste = None
+                self.parametros = None
             return True
         except FileNotFoundError:
             return False
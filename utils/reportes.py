@@ -0,0 +1,90 @@
+import pandas as pd
+import numpy as np
+
+# Umbrales por defecto de días de inventario
+DIAS_SOBRE_STOCK = 90
+DIAS_RIESGO_QUIEBRE = 15
+
+
+def calcular_datos_reporte(resultados):
+    """Construir el frame de reportes con columnas derivadas sin modificar resultados"""
+    columnas = ['id_insumo', 'saldo final', 'consumo_predicho', 'cantidad_comprar', 'recomendacion', 'prioridad']
+    datos = pd.DataFrame({col: resultados[col].to_numpy() for col in columnas if col in resultados.columns})
+
+    consumo = datos['consumo_predicho'].to_numpy(dtype=float)
+    saldo = datos['saldo final'].to_numpy(dtype=float)
+    datos['dias_inventario'] = np.where(
+        consumo > 0,
+        saldo / np.where(consumo > 0, consumo, 1) * 30,
+        0
+    )
+    return datos
+
+
+def binear_histograma(valores, nbins=20):
+    """Agrupar los valores en intervalos en el servidor para graficar solo los conteos"""
+    valores = np.asarray(valores, dtype=float)
+    valores = valores[np.isfinite(valores)]
+    if len(valores) == 0:
+        return pd.DataFrame({'inicio': [], 'fin': [], 'centro': [], 'conteo': []})
+
+    conteo, bordes = np.histogram(valores, bins=nbins)
+    return pd.DataFrame({
+        'inicio': bordes[:-1],
+        'fin': bordes[1:],
+        'centro': (bordes[:-1] + bordes[1:]) / 2,
+        'conteo': conteo
+    })
+
+
+def muestrear_estratificado(datos, max_puntos, columna_estrato='prioridad', semilla=42):
+    """Reducir los puntos del gráfico conservando la proporción de cada estrato"""
+    if len(datos) <= max_puntos:
+        return datos
+
+    if columna_estrato not in datos.columns:
+        return datos.sample(n=max_puntos, random_state=semilla)
+
+    rng = np.random.default_rng(semilla)
+    estratos = datos[columna_estrato].to_numpy()
+    posiciones = []
+    for valor in pd.unique(estratos):
+        pos_estrato = np.flatnonzero(estratos == valor)
+        # Cada estrato conserva al menos un punto para no desaparecer del gráfico
+        cupo = max(1, int(round(max_puntos * len(pos_estrato) / len(datos))))
+        if cupo < len(pos_estrato):
+            pos_estrato = rng.choice(pos_estrato, size=cupo, replace=False)
+        posiciones.append(pos_estrato)
+
+    return datos.iloc[np.sort(np.concatenate(posiciones))]
+
+
+def construir_indice_riesgo(dias_inventario):
+    """Ordenar una sola vez los días de inventario para clasificar por umbrales sin reescanear"""
+    dias = np.asarray(dias_inventario, dtype=float)
+    orden = np.argsort(dias, kind='stable')
+    dias_ordenados = dias[orden]
+    return {
+        'orden': orden,
+        'dias_ordenados': dias_ordenados,
+        # np.argsort deja los NaN al final: no pertenecen a ningún grupo de riesgo
+        'total_validos': int(np.isfinite(dias_ordenados).sum())
+    }
+
+
+def clasificar_riesgo(indice, dias_quiebre=DIAS_RIESGO_QUIEBRE, dias_sobre_stock=DIAS_SOBRE_STOCK):
+    """Asignar cada SKU a su grupo de riesgo con dos búsquedas binarias sobre el índice.
+    
+    Devuelve posiciones ordenadas por urgencia: riesgo de quiebre de menos a más
+    días de inventario y sobre stock de más a menos, listas para consultas top-N.
+    """
+    orden = indice['orden']
+    dias_ordenados = indice['dias_ordenados'][:indice['total_validos']]
+
+    corte_quiebre = int(np.searchsorted(dias_ordenados, dias_quiebre, side='left'))
+    corte_sobre = max(corte_quiebre, int(np.searchsorted(dias_ordenados, dias_sobre_stock, side='right')))
+    return {
+        'riesgo_quiebre': orden[:corte_quiebre],
+        'optimo': np.concatenate([orden[corte_quiebre:corte_sobre], orden[indice['total_validos']:]]),
+        'sobre_stock': orden[corte_sobre:indice['total_validos']][::-1]
+    }
@@ -0,0 +1,62 @@
+import numpy as np
+import pandas as pd
+
+# Columnas de la historia mensual que guarda el almacén de series (salida de crear_dataset_mensual)
+COLUMNAS_HISTORIA = ('consumo', 'saldo final')
+
+
+class SeriesPorSku:
+    """Series mensuales de todos los SKUs en arreglos contiguos, al estilo CSR.
+
+    Las filas quedan ordenadas por SKU y mes; `offsets[i]:offsets[i + 1]` son
+    las filas del SKU i, y un diccionario lleva de id_insumo a i. Obtener la
+    serie de un SKU es cortar los arreglos (vistas, sin copiar) en vez de
+    filtrar el dataset completo.
+    """
+
+    def __init__(self, df, columnas=COLUMNAS_HISTORIA):
+        columnas = [c for c in columnas if c in df.columns]
+        ids = df['id_insumo'].to_numpy()
+        meses = df['mes'].to_numpy()
+        mismo_sku = ids[1:] == ids[:-1]
+        ordenada = df['id_insumo'].is_monotonic_increasing and bool(np.all(~mismo_sku | (meses[1:] > meses[:-1])))
+        if not ordenada:
+            df = df.sort_values(['id_insumo', 'mes'], kind='stable')
+            ids = df['id_insumo'].to_numpy()
+            meses = df['mes'].to_numpy()
+            mismo_sku = ids[1:] == ids[:-1]
+
+        inicios = np.flatnonzero(np.r_[len(ids) > 0, ~mismo_sku])
+        self.offsets = np.r_[inicios, len(ids)]
+        self.ids = ids[inicios]
+        self.posiciones = dict(zip(self.ids.tolist(), range(len(self.ids))))
+        self.meses = np.ascontiguousarray(meses, dtype=np.int32)
+        self.valores = {c: np.ascontiguousarray(df[c].to_numpy(dtype=float), dtype=np.float32) for c in columnas}
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, id_insumo):
+        return id_insumo in self.posiciones
+
+    @property
+    def nbytes(self):
+        return self.offsets.nbytes + self.meses.nbytes + sum(v.nbytes for v in self.valores.values())
+
+    def tramo(self, id_insumo):
+        """Filas (slice) del SKU en los arreglos contiguos; vacío si el SKU no está"""
+        i = self.posiciones.get(id_insumo)
+        if i is None:
+            return slice(0, 0)
+        return slice(self.offsets[i], self.offsets[i + 1])
+
+    def serie(self, id_insumo):
+        """Meses y valores del SKU como DataFrame (construido desde vistas de los arreglos)"""
+        filas = self.tramo(id_insumo)
+        return pd.DataFrame(dict({'mes': self.meses[filas]}, **{c: v[filas] for c, v in self.valores.items()}))
+
+
+def mes_siguiente(mes):
+    """Mes siguiente en formato AAAAMM"""
+    mes = int(mes)
+    return mes + 89 if mes % 100 == 12 else mes + 1
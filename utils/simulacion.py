@@ -0,0 +1,137 @@
+import numpy as np
+import pandas as pd
+
+from utils.motores import UMBRAL_INTERMITENCIA, fraccion_meses_sin_consumo
+from utils.politicas import SimuladorPoliticas, variabilidad_demanda
+
+# Horizontes en meses, los mismos de las recomendaciones mensual, trimestral y anual
+HORIZONTES_SIMULACION = {'mensual': 1, 'trimestral': 3, 'anual': 12}
+N_TRAYECTORIAS = 2000
+
+# Tope de celdas (SKUs × trayectorias) de cada bloque: 2M float32 son 8 MB por arreglo
+CELDAS_POR_BLOQUE = 2_000_000
+
+
+def simular_quiebres(media, desviacion_demanda, desviacion_modelo, stock, reposicion=None, horizontes=None,
+                     n_trayectorias=N_TRAYECTORIAS, semilla=42, celdas_por_bloque=CELDAS_POR_BLOQUE):
+    """Probabilidad de quiebre y faltante esperado de cada SKU por Monte Carlo.
+
+    Cada trayectoria suma la demanda de los meses del horizonte: un error de
+    nivel del modelo (desviacion_modelo, el mismo en todos los meses de la
+    trayectoria) más una variación mensual independiente (desviacion_demanda),
+    sin demandas negativas. Hay quiebre si la demanda acumulada supera el stock
+    más `reposicion` × meses (lo comprado llega al inicio). Devuelve
+    {horizonte: (probabilidad, faltante esperado)}.
+
+    Los SKUs se procesan por bloques para acotar la memoria, y los SKUs de un
+    bloque comparten las mismas normales estándar (números aleatorios comunes),
+    cada uno escalado con su media y desviaciones: generar las normales cuesta
+    mucho más que todo el resto de la simulación.
+    """
+    horizontes = horizontes or HORIZONTES_SIMULACION
+    media = np.asarray(media, dtype=np.float32)
+    desviacion_demanda = np.asarray(desviacion_demanda, dtype=np.float32)
+    desviacion_modelo = np.asarray(desviacion_modelo, dtype=np.float32)
+    stock = np.asarray(stock, dtype=np.float32)
+    reposicion = np.zeros_like(stock) if reposicion is None else np.asarray(reposicion, dtype=np.float32)
+
+    n_skus = len(media)
+    meses = max(horizontes.values())
+    salida = {nombre: (np.empty(n_skus), np.empty(n_skus)) for nombre in horizontes}
+    rng = np.random.default_rng(semilla)
+    tamano_bloque = max(1, min(n_skus, celdas_por_bloque // n_trayectorias))
+
+    # Arreglos (SKU, trayectoria) reutilizados en todos los bloques
+    nivel = np.empty((tamano_bloque, n_trayectorias), dtype=np.float32)
+    demanda_mes = np.empty_like(nivel)
+    acumulada = np.empty_like(nivel)
+
+    for inicio in range(0, n_skus, tamano_bloque):
+        bloque = slice(inicio, min(inicio + tamano_bloque, n_skus))
+        n_bloque = bloque.stop - bloque.start
+        z_nivel = rng.standard_normal(n_trayectorias, dtype=np.float32)
+        z_meses = rng.standard_normal((meses, n_trayectorias), dtype=np.float32)
+
+        np.multiply(desviacion_modelo[bloque, None], z_nivel, out=nivel[:n_bloque])
+        nivel[:n_bloque] += media[bloque, None]
+        acumulada[:n_bloque] = 0
+        for mes in range(1, meses + 1):
+            np.multiply(desviacion_demanda[bloque, None], z_meses[mes - 1], out=demanda_mes[:n_bloque])
+            demanda_mes[:n_bloque] += nivel[:n_bloque]
+            np.maximum(demanda_mes[:n_bloque], 0, out=demanda_mes[:n_bloque])
+            acumulada[:n_bloque] += demanda_mes[:n_bloque]
+
+            # Sin reposición intermedia, hay quiebre en el horizonte si la demanda acumulada supera lo disponible
+            for nombre, n_meses in horizontes.items():
+                if n_meses != mes:
+                    continue
+                disponible = stock[bloque] + reposicion[bloque] * n_meses
+                faltante = np.subtract(acumulada[:n_bloque], disponible[:, None], out=demanda_mes[:n_bloque])
+                probabilidad, esperado = salida[nombre]
+                probabilidad[bloque] = np.count_nonzero(faltante > 0, axis=1) / n_trayectorias
+                np.maximum(faltante, 0, out=faltante)
+                esperado[bloque] = faltante.mean(axis=1)
+    return salida
+
+
+def simular_riesgo_quiebre(predictor, df_preparado, base=None, politica=None, horizontes=None,
+                           n_trayectorias=N_TRAYECTORIAS, semilla=42):
+    """Riesgo de quiebre por SKU a partir de las predicciones del modelo.
+
+    La demanda media es el consumo predicho de los resultados; la variación
+    mensual, la histórica del SKU (variabilidad_demanda) aunque la política use
+    la de los cuantiles, que ya incluye el error del modelo, y el error de nivel,
+    solo la dispersión de los árboles del bosque en el último mes de cada SKU. Los
+    SKUs que pronostica el motor intermitente no tienen error de nivel: el
+    bosque no hizo su pronóstico.
+    `base` (preparar_base_politica o un SimuladorPoliticas) evita volver a
+    predecir. Con `politica` (argumentos de aplicar_politica) se simula el
+    riesgo después de comprar: la compra del último mes se repite cada mes.
+    """
+    horizontes = horizontes or HORIZONTES_SIMULACION
+    if base is None:
+        base = predictor.preparar_base_politica(df_preparado)
+    simulador = base if isinstance(base, SimuladorPoliticas) else SimuladorPoliticas(base)
+
+    ultimas = df_preparado.groupby('id_insumo', sort=False).tail(1)
+    del_bosque = np.ones(len(ultimas), dtype=bool)
+    if predictor.motor_intermitente:
+        # El mismo criterio de pronosticar_consumo, sobre toda la historia de cada SKU
+        fraccion = pd.Series(fraccion_meses_sin_consumo(df_preparado), index=df_preparado.index)
+        del_bosque = fraccion.loc[ultimas.index].to_numpy() < UMBRAL_INTERMITENCIA
+    dispersion = np.zeros(len(ultimas))
+    if del_bosque.any():
+        dispersion[del_bosque] = predictor.dispersion_arboles(ultimas[del_bosque])
+    desviacion_modelo = pd.Series(
+        dispersion, index=ultimas['id_insumo'].to_numpy()
+    ).reindex(simulador.ids).fillna(0).to_numpy()
+    desviacion_demanda = pd.Series(
+        variabilidad_demanda(ultimas['consumo_mean'], ultimas['consumo_std']), index=ultimas['id_insumo'].to_numpy()
+    ).reindex(simulador.ids).fillna(0).to_numpy()
+    reposicion = np.zeros(len(simulador))
+    if politica is not None:
+        politica = dict(politica)
+        reposicion = simulador.cantidades(politica.pop('politicas', None), **politica)[simulador.ultimas]
+
+    simulacion = simular_quiebres(
+        simulador.consumo_medio,
+        desviacion_demanda,
+        desviacion_modelo,
+        simulador.saldo_final.astype(float),
+        reposicion=reposicion,
+        horizontes=horizontes,
+        n_trayectorias=n_trayectorias,
+        semilla=semilla
+    )
+
+    riesgo = pd.DataFrame({
+        'id_insumo': simulador.ids,
+        'consumo_predicho': simulador.consumo_medio,
+        'saldo final': simulador.saldo_final,
+        'dispersion_modelo': desviacion_modelo,
+        'compra_mensual': reposicion
+    })
+    for nombre, (probabilidad, faltante) in simulacion.items():
+        riesgo[f'prob_quiebre_{nombre}'] = probabilidad
+        riesgo[f'faltante_esperado_{nombre}'] = faltante
+    return riesgo
@@ -0,0 +1,124 @@
+import sys
+import time
+import tracemalloc
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+from functools import wraps
+
+try:
+    import resource
+except ImportError:  # Windows: sin getrusage, solo se reporta tracemalloc
+    resource = None
+
+HISTORIAL_MAXIMO = 20
+
+
+def leer_rss_maximo_mb():
+    """RSS máximo del proceso en MB (None si la plataforma no lo expone)"""
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reporta KB; macOS reporta bytes
+    return rss / 1024 ** 2 if sys.platform == 'darwin' else rss / 1024
+
+
+class TrazadorEtapas:
+    """Registrar tiempo, CPU, memoria y filas de cada etapa del pipeline de predicción"""
+
+    def __init__(self, maximo=HISTORIAL_MAXIMO, medir_memoria=False):
+        # tracemalloc duplica el tiempo del pipeline: se activa solo bajo demanda
+        self.historial = deque(maxlen=maximo)
+        self.medir_memoria = medir_memoria
+        self.ejecucion_actual = None
+        self.pila = []
+
+    @contextmanager
+    def ejecucion(self, nombre):
+        """Agrupar las etapas de una corrida completa y guardarla en el historial"""
+        iniciar_tracemalloc = self.medir_memoria and not tracemalloc.is_tracing()
+        if iniciar_tracemalloc:
+            tracemalloc.start()
+
+        self.ejecucion_actual = {
+            'nombre': nombre,
+            'inicio': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            'etapas': [],
+            'estado': 'ok'
+        }
+        inicio_pared = time.perf_counter()
+        inicio_cpu = time.process_time()
+        try:
+            yield self.ejecucion_actual
+        except Exception:
+            self.ejecucion_actual['estado'] = 'error'
+            raise
+        finally:
+            self.ejecucion_actual['tiempo_s'] = time.perf_counter() - inicio_pared
+            self.ejecucion_actual['cpu_s'] = time.process_time() - inicio_cpu
+            self.ejecucion_actual['rss_max_mb'] = leer_rss_maximo_mb()
+            self.historial.append(self.ejecucion_actual)
+            self.ejecucion_actual = None
+            if iniciar_tracemalloc:
+                tracemalloc.stop()
+
+    @contextmanager
+    def etapa(self, nombre, filas_entrada=None):
+        """Medir una etapa; las etapas anidadas quedan con su nivel de profundidad"""
+        registro = {
+            'etapa': nombre,
+            'nivel': len(self.pila),
+            'filas_entrada': filas_entrada,
+            'filas_salida': None
+        }
+        midiendo = self.medir_memoria and tracemalloc.is_tracing()
+        if midiendo:
+            # El pico previo pertenece a la etapa padre: se conserva antes de reiniciarlo
+            if self.pila:
+                self.pila[-1]['_pico_hijos'] = max(
+                    self.pila[-1].get('_pico_hijos', 0), tracemalloc.get_traced_memory()[1]
+                )
+            memoria_inicio = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+
+        self.pila.append(registro)
+        if self.ejecucion_actual is not None:
+            # Se agrega al iniciar para que la etapa padre preceda a sus anidadas
+            self.ejecucion_actual['etapas'].append(registro)
+        inicio_pared = time.perf_counter()
+        inicio_cpu = time.process_time()
+        try:
+            yield registro
+        finally:
+            registro['tiempo_s'] = time.perf_counter() - inicio_pared
+            registro['cpu_s'] = time.process_time() - inicio_cpu
+            self.pila.pop()
+            if midiendo:
+                pico = max(tracemalloc.get_traced_memory()[1], registro.pop('_pico_hijos', 0))
+                registro['pico_memoria_mb'] = max(pico - memoria_inicio, 0) / 1024 ** 2
+                if self.pila:
+                    self.pila[-1]['_pico_hijos'] = max(self.pila[-1].get('_pico_hijos', 0), pico)
+            registro['rss_max_mb'] = leer_rss_maximo_mb()
+
+    def ultima_ejecucion(self):
+        """Devolver la corrida más reciente del historial"""
+        return self.historial[-1] if self.historial else None
+
+
+def trazar_etapa(nombre=None):
+    """Decorador para métodos del predictor: usa self.trazador si existe"""
+    def decorador(metodo):
+        @wraps(metodo)
+        def envoltura(self, *args, **kwargs):
+            trazador = getattr(self, 'trazador', None)
+            if trazador is None:
+                return metodo(self, *args, **kwargs)
+
+            filas_entrada = len(args[0]) if args and hasattr(args[0], '__len__') else None
+            with trazador.etapa(nombre or metodo.__name__, filas_entrada) as registro:
+                resultado = metodo(self, *args, **kwargs)
+                if hasattr(resultado, 'shape'):
+                    registro['filas_salida'] = len(resultado)
+            return resultado
+        return envoltura
+    return decorador